@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     binary.py
+#
+#     This file is part of the RoboEarth Cloud Engine framework.
+#
+#     This file was originally created for RoboEearth
+#     http://www.roboearth.org/
+#
+#     The research leading to these results has received funding from
+#     the European Union Seventh Framework Programme FP7/2007-2013 under
+#     grant agreement no248942 RoboEarth.
+#
+#     Copyright 2013 RoboEarth
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+#     \author/s: Dominique Hunziker
+#
+#
+
+""" Micro benchmark which compares the handling of the binary part of a
+    received message using copies (legacy) and using the zero-copy
+    rce.comm.binary.BinaryBuffer. Both variants end with the str which is
+    passed on to the internal protocol, i.e. the zero-copy variant still
+    copies an uncompressed binary once. The copies are counted at the copy
+    points of the variants.
+
+    Usage: python binary.py [size in bytes] [passes]
+"""
+
+# Python specific imports
+import os
+import sys
+import zlib
+from timeit import Timer
+
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from StringIO import StringIO
+
+# rce specific imports
+from rce.comm.binary import BinaryBuffer, getView
+
+
+URI_LEN = 32
+
+
+def _ignore(size):
+    """ Default for the callback which is called at the copy points.
+    """
+
+
+def legacy(frame, compressed, copied=_ignore):
+    """ Handling of a binary message as done before the binary buffer was
+        introduced: slice the URI off, copy the data into a StringIO and copy
+        it once more when it is read. The callback 'copied' is called with
+        the number of bytes of each copy.
+    """
+    data = frame[URI_LEN:]
+    copied(len(data))
+
+    binary = StringIO()
+    binary.write(data)
+    copied(len(data))
+
+    data = binary.getvalue()
+    copied(len(data))
+
+    if compressed:
+        return zlib.decompress(data)
+    else:
+        return data
+
+
+def zeroCopy(frame, compressed, copied=_ignore):
+    """ Handling of a binary message using the binary buffer. The callback
+        'copied' is called with the number of bytes of each copy.
+    """
+    binary = BinaryBuffer(frame, URI_LEN)
+
+    if compressed:
+        return zlib.decompress(getView(binary))
+    else:
+        # The internal protocol requires a str; this is the single copy made
+        # by rce.comm.deflate.Decompressor.decompress for uncompressed data
+        data = str(getView(binary))
+        copied(len(data))
+        return data
+
+
+def copy(frame):
+    """ Reference operation which copies the frame exactly once.
+    """
+    return frame[1:]
+
+
+def countCopies(fn, frame, compressed):
+    """ Count the copies and the bytes which are copied when a binary message
+        is handled once.
+
+        @return:            Number of copies and number of bytes copied.
+        @rtype:             (int, int)
+    """
+    copies = []
+    fn(frame, compressed, copies.append)
+    return len(copies), sum(copies)
+
+
+def main(size, passes):
+    data = os.urandom(size)
+    frames = {False: os.urandom(URI_LEN) + data,
+              True: os.urandom(URI_LEN) + zlib.compress(data, 1)}
+
+    ref = min(Timer(lambda: copy(frames[False])).repeat(3, passes)) / passes
+
+    print('Message size: {0} bytes, {1} passes'.format(size, passes))
+    print('Reference (one copy of the frame): {0:.1f} us'.format(ref * 1e6))
+
+    for compressed in (False, True):
+        frame = frames[compressed]
+        kind = 'compressed' if compressed else 'uncompressed'
+        assert str(legacy(frame, compressed)) == str(zeroCopy(frame,
+                                                              compressed))
+
+        for name, fn in (('legacy', legacy), ('zero-copy', zeroCopy)):
+            t = min(Timer(lambda: fn(frame, compressed)).repeat(3, passes))
+            t /= passes
+            copies, copiedBytes = countCopies(fn, frame, compressed)
+
+            print('{0:>10s} ({1}): {2:.1f} us, {3} copies ({4} bytes copied '
+                  'per message)'.format(name, kind, t * 1e6, copies,
+                                        copiedBytes))
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 2 * 1024 * 1024,
+         int(args[1]) if len(args) > 1 else 50)
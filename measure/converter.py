@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     converter.py
+#
+#     This file is part of the RoboEarth Cloud Engine framework.
+#
+#     This file was originally created for RoboEearth
+#     http://www.roboearth.org/
+#
+#     The research leading to these results has received funding from
+#     the European Union Seventh Framework Programme FP7/2007-2013 under
+#     grant agreement no248942 RoboEarth.
+#
+#     Copyright 2013 RoboEarth
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+#     \author/s: Dominique Hunziker
+#
+#
+
+""" Benchmark which compares the Converter using its compiled encode/decode
+    functions with the previous implementation which analyzes the message
+    definition for every message.
+
+    Usage: python converter.py [number of messages]
+"""
+
+# Python specific imports
+import sys
+import time
+import random
+from functools import partial
+
+# ROS specific imports
+from nav_msgs.msg import Odometry
+
+# rce specific imports
+from rce.util.loader import Loader
+from rce.util.converter import Converter, _stringify
+
+
+class _LegacyConverter(Converter):
+    """ Converter which analyzes the message definition for every message
+        (implementation previous to the compiled encode/decode functions).
+    """
+    def _encode(self, rosMsg, arrays=False):
+        data = {}
+
+        for (slotName, slotType) in zip(rosMsg.__slots__, rosMsg._slot_types):
+            slotType, listBool = self._splitType(slotType)
+
+            if slotType in self._BASE_TYPES:
+                convFunc = self._BASE_TYPES[slotType]
+            elif slotType in self._SPECIAL_TYPES:
+                convFunc = self._SPECIAL_TYPES[slotType]().encode
+            elif slotType in self._customTypes:
+                convFunc = self._customTypes[slotType][0]().encode
+            else:
+                convFunc = self._encode
+
+            if listBool:
+                convFunc = partial(map, convFunc)
+
+            data[slotName] = convFunc(getattr(rosMsg, slotName))
+
+        return data
+
+    def _decode(self, msgCls, data):
+        rosMsg = msgCls()
+
+        for (slotName, slotType) in zip(rosMsg.__slots__, rosMsg._slot_types):
+            if slotName not in data:
+                continue
+
+            slotType, listBool = self._splitType(slotType)
+            field = data[slotName]
+
+            if slotType == 'string':
+                convFunc = _stringify
+            elif slotType in self._BASE_TYPES:
+                convFunc = self._BASE_TYPES[slotType]
+            elif slotType in self._SPECIAL_TYPES:
+                convFunc = self._SPECIAL_TYPES[slotType]().decode
+            else:
+                convFunc = partial(self._decode,
+                                   self._loader.loadMsg(*slotType.split('/')))
+
+            if listBool:
+                convFunc = partial(map, convFunc)
+
+            setattr(rosMsg, slotName, convFunc(field))
+
+        return rosMsg
+
+
+def odometry(n):
+    for seq in xrange(n):
+        msg = Odometry()
+        msg.header.seq = seq
+        msg.header.frame_id = 'odom'
+        msg.child_frame_id = 'base_link'
+        msg.pose.pose.position.x = random.random()
+        msg.pose.pose.orientation.w = 1.0
+        msg.pose.covariance = tuple(random.random() for _ in xrange(36))
+        msg.twist.twist.linear.x = random.random()
+        msg.twist.covariance = tuple(random.random() for _ in xrange(36))
+        yield msg
+
+
+def run(name, converter, messages, arrays=False):
+    start = time.time()
+    data = [converter.encode(msg, arrays) for msg in messages]
+    encode = time.time() - start
+
+    start = time.time()
+    for d in data:
+        converter.decode(Odometry, d)
+    decode = time.time() - start
+
+    print('    {0:>8s}: encode {1:.3f} s, decode {2:.3f} s'.format(name, encode,
+                                                                 decode))
+    return encode + decode
+
+
+def main(n):
+    loader = Loader()
+    messages = list(odometry(n))
+
+    print('nav_msgs/Odometry ({0} messages):'.format(n))
+    legacy = run('legacy', _LegacyConverter(loader), messages)
+    compiled = run('compiled', Converter(loader), messages)
+    print('    speedup: {0:.1f}x'.format(legacy / compiled))
+    run('arrays', Converter(loader), messages, True)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 10000)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     deflate.py
+#
+#     This file is part of the RoboEarth Cloud Engine framework.
+#
+#     This file was originally created for RoboEearth
+#     http://www.roboearth.org/
+#
+#     The research leading to these results has received funding from
+#     the European Union Seventh Framework Programme FP7/2007-2013 under
+#     grant agreement no248942 RoboEarth.
+#
+#     Copyright 2013 RoboEarth
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+#     \author/s: Dominique Hunziker
+#
+#
+
+""" Benchmark which compares the compression modes of the Forwarders, i.e.
+    'none', 'stream' and 'gzip', with respect to the compression ratio and the
+    used CPU time.
+
+    Usage: python deflate.py [number of messages] [compression level]
+"""
+
+# Python specific imports
+import os
+import sys
+import struct
+import random
+
+# rce specific imports
+from rce.comm import types
+from rce.comm.deflate import COMPRESSIONS, Compressor, Decompressor
+
+
+def odometry(n):
+    """ Small messages with a fixed layout similar to nav_msgs/Odometry.
+    """
+    header = struct.Struct('!III')
+    frame = 'odom' * 2 + 'base_link'
+    pose = struct.Struct('!13d')
+
+    for seq in xrange(n):
+        yield (header.pack(seq, seq // 100, (seq % 100) * 10000000) + frame +
+               pose.pack(*[random.random() for _ in xrange(13)]) +
+               '\x00' * 36 * 8 * 2)
+
+
+def image(n):
+    """ Large messages which are already compressed, e.g. JPEG images.
+    """
+    for _ in xrange(n):
+        yield os.urandom(64 * 1024)
+
+
+def run(name, messages, level):
+    print('{0}:'.format(name))
+
+    for mode in COMPRESSIONS:
+        compressor = Compressor(mode, level)
+        decompressor = Decompressor(mode)
+
+        for msg in messages:
+            assert decompressor.decompress(compressor.compress(msg)) == msg
+
+        if mode == types.COMPRESSION_NONE:
+            print('    {0:>6s}: {1} bytes'.format(mode, sum(len(msg)
+                                                       for msg in messages)))
+        else:
+            print('    {0:>6s}: ratio {1:6.2f}, compress {2:.3f} s, '
+                  'decompress {3:.3f} s'.format(mode, compressor.ratio,
+                                                compressor.cpuTime,
+                                                decompressor.cpuTime))
+
+
+def main(n, level):
+    run('Odometry', list(odometry(n)), level)
+    run('Image', list(image(max(n // 100, 1))), level)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 10000,
+         int(args[1]) if len(args) > 1 else 9)
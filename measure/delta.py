@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     delta.py
+#
+#     This file is part of the RoboEarth Cloud Engine framework.
+#
+#     This file was originally created for RoboEearth
+#     http://www.roboearth.org/
+#
+#     The research leading to these results has received funding from
+#     the European Union Seventh Framework Programme FP7/2007-2013 under
+#     grant agreement no248942 RoboEarth.
+#
+#     Copyright 2013 RoboEarth
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+#     \author/s: Dominique Hunziker
+#
+#
+
+""" Benchmark which compares the size of the JSON encoded messages of a
+    Converter with and without delta mode for different keyframe intervals.
+
+    Usage: python delta.py [number of messages]
+"""
+
+# Python specific imports
+import sys
+import json
+import random
+
+# rce specific imports
+from rce.comm.delta import DeltaEncoder, DeltaDecoder
+
+
+def odometry(n):
+    """ Messages similar to a converted nav_msgs/Odometry of a robot which
+        mostly drives straight ahead.
+    """
+    for seq in xrange(n):
+        yield {'header':{'seq':seq, 'stamp':{'secs':seq // 100,
+                                             'nsecs':(seq % 100) * 10000000},
+                         'frame_id':'odom'},
+               'child_frame_id':'base_link',
+               'pose':{'pose':{'position':{'x':seq * 0.01, 'y':0.0, 'z':0.0},
+                               'orientation':{'x':0.0, 'y':0.0, 'z':0.0,
+                                              'w':1.0}},
+                       'covariance':[0.0] * 36},
+               'twist':{'twist':{'linear':{'x':random.random(), 'y':0.0,
+                                           'z':0.0},
+                                 'angular':{'x':0.0, 'y':0.0, 'z':0.0}},
+                        'covariance':[0.0] * 36}}
+
+
+def main(n):
+    messages = list(odometry(n))
+    full = sum(len(json.dumps(msg)) for msg in messages)
+    print('    none: {0} bytes'.format(full))
+
+    for interval in (1, 10, 100):
+        encoder = DeltaEncoder(interval)
+        decoder = DeltaDecoder()
+        size = 0
+
+        for msg in messages:
+            data = encoder.encode(msg)
+            size += len(json.dumps(data))
+            assert decoder.decode(json.loads(json.dumps(data))) == msg
+
+        print('    {0:>4d}: {1} bytes, ratio {2:6.2f}'.format(interval, size,
+                                                           float(full) / size))
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 10000)
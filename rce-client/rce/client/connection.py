@@ -61,7 +61,7 @@ class _Connection(object):
 
     INTERFACE_MAP = {}
 
-    def __init__(self, userID, robotID, password, reactor):
+    def __init__(self, userID, robotID, password, reactor, protocols=None):
         """ Initialize the Connection.
 
             @param userID:      User ID which will be used to authenticate the
@@ -79,11 +79,18 @@ class _Connection(object):
             @param reactor:     Reference to reactor which is used for this
                                 connection.
             @type  reactor:     twisted::reactor
+
+            @param protocols:   Subprotocols which are offered to the cloud
+                                engine in the order of preference; None
+                                (default) offers all available codecs
+                                (refer to rce.comm.client.RCE).
+            @type  protocols:   [str] / None
         """
         self._userID = userID
         self._robotID = robotID
         self._password = password
         self._reactor = reactor
+        self._protocols = protocols
 
         self._rce = None
         self._interfaces = {}
@@ -115,7 +122,7 @@ class _Connection(object):
             raise ConnectionError('There is already a connection registered.')
 
         self._rce = RCE(self, self._userID, self._robotID, self._password,
-                        self._reactor)
+                        self._reactor, self._protocols)
 
         # Connect
         self._rce.connect(masterUrl, deferred)
@@ -260,12 +267,15 @@ class _Connection(object):
 
     removeParameter.__doc__ = RCE.removeParameter.__doc__  #@UndefinedVariable
 
-    def addInterface(self, eTag, iTag, iType, iCls, addr=''):
+    def addInterface(self, eTag, iTag, iType, iCls, addr='', policy=None,
+                     compression=None, arrays=False, settings=None,
+                     delta=0):
         if not self._rce:
             raise ConnectionError('No connection to RCE.')
 
         iType = self.INTERFACE_MAP.get(iType, iType)
-        self._rce.addInterface(eTag, iTag, iType, iCls, addr)
+        self._rce.addInterface(eTag, iTag, iType, iCls, addr, policy,
+                               compression, arrays, settings, delta)
 
     addInterface.__doc__ = RCE.addInterface.__doc__  #@UndefinedVariable
 
@@ -414,7 +424,7 @@ if HAS_ROS:
             """ Reference to Loader. """
             return self._LOADER
 
-        def publisher(self, iTag, msgType, addr):
+        def publisher(self, iTag, msgType, addr, compression=None):
             """ Create a Publisher using ROS.
 
                 @param iTag:        Unique tag which will be used to identify
@@ -430,12 +440,17 @@ if HAS_ROS:
                                     cloud engine.
                 @type  addr:        str
 
+                @param compression: Compression mode of the binary messages;
+                                    has to match the mode used for the
+                                    forwarder in the cloud engine.
+                @type  compression: str / None
+
                 @return:            New Publisher instance.
                 @rtype:             rce.client.interface.ROSPublisher
             """
-            return ROSPublisher(self, iTag, msgType, addr)
+            return ROSPublisher(self, iTag, msgType, addr, compression)
 
-        def subscriber(self, iTag, msgType, addr):
+        def subscriber(self, iTag, msgType, addr, compression=None):
             """ Create a Subscriber using ROS.
 
                 @param iTag:        Unique tag which will be used to identify
@@ -450,12 +465,17 @@ if HAS_ROS:
                                     received messages from to the RCE.
                 @type  addr:        str
 
+                @param compression: Compression mode of the binary messages;
+                                    has to match the mode used for the
+                                    forwarder in the cloud engine.
+                @type  compression: str / None
+
                 @return:            New Subscriber instance.
                 @rtype:             rce.client.interface.ROSSubscriber
             """
-            return ROSSubscriber(self, iTag, msgType, addr)
+            return ROSSubscriber(self, iTag, msgType, addr, compression)
 
-        def serviceClient(self, iTag, srvType, addr):
+        def serviceClient(self, iTag, srvType, addr, compression=None):
             """ Create a Service Client using ROS.
 
                 @param iTag:        Unique tag which will be used to identify
@@ -467,12 +487,19 @@ if HAS_ROS:
 
                 @param addr:        Address where the service will be available.
 
+                @param compression: Compression mode of the binary messages;
+                                    has to match the mode used for the
+                                    forwarder in the cloud engine. The
+                                    mode 'stream' is not available for
+                                    services.
+                @type  compression: str / None
+
                 @return:            New Service Client instance.
                 @rtype:             rce.client.interface.ROSServiceClient
             """
-            return ROSServiceClient(self, iTag, srvType, addr)
+            return ROSServiceClient(self, iTag, srvType, addr, compression)
 
-        def serviceProvider(self, iTag, srvType, addr):
+        def serviceProvider(self, iTag, srvType, addr, compression=None):
             """ Create a Service Provider using ROS.
 
                 @param iTag:        Unique tag which will be used to identify
@@ -484,7 +511,14 @@ if HAS_ROS:
 
                 @param addr:        Address where the service will be available.
 
+                @param compression: Compression mode of the binary messages;
+                                    has to match the mode used for the
+                                    forwarder in the cloud engine. The
+                                    mode 'stream' is not available for
+                                    services.
+                @type  compression: str / None
+
                 @return:            New Service Provider instance.
                 @rtype:             rce.client.interface.ROSServiceProvider
             """
-            return ROSServiceProvider(self, iTag, srvType, addr)
+            return ROSServiceProvider(self, iTag, srvType, addr, compression)
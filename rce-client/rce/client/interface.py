@@ -35,11 +35,6 @@ import zlib
 from uuid import uuid4
 from threading import Condition, Lock
 
-try:
-    from cStringIO import StringIO
-except ImportError:
-    from StringIO import StringIO
-
 # ROS specific imports; if available
 try:
     import rospy
@@ -52,6 +47,11 @@ except ImportError:
 from twisted.internet.defer import Deferred
 from twisted.internet.threads import deferToThreadPool
 
+# rce specific imports
+from rce.comm import types
+from rce.comm.binary import BinaryBuffer, getView
+from rce.comm.deflate import Compressor, Decompressor
+
 
 # Compression level used for communication
 #     0:    use no compression
@@ -59,6 +59,29 @@ from twisted.internet.threads import deferToThreadPool
 _GZIP_LVL = 0
 
 
+def _createCompression(mode):
+    """ Create the compressor and decompressor for a ROS interface.
+
+        @param mode:        Compression mode which has to match the mode
+                            which has been selected for the cloud-side
+                            forwarder. If None, 'gzip' is used if _GZIP_LVL is
+                            set and 'none' otherwise.
+        @type  mode:        str / None
+
+        @return:            Compressor and decompressor.
+        @rtype:             (rce.comm.deflate.Compressor,
+                             rce.comm.deflate.Decompressor)
+    """
+    if not mode:
+        if _GZIP_LVL:
+            mode = types.COMPRESSION_GZIP
+        else:
+            mode = types.COMPRESSION_NONE
+
+    return (Compressor(mode, _GZIP_LVL or zlib.Z_DEFAULT_COMPRESSION),
+            Decompressor(mode))
+
+
 class InterfaceDisabledError(Exception):
     """ Exception is raised when an interface is called even though the
         interface is disabled.
@@ -414,23 +437,22 @@ if HAS_ROS:
     class ROSPublisher(_Publisher):
         """ Representation of a Publisher Interface using ROS.
         """
-        def __init__(self, conn, iTag, msgType, addr):
+        def __init__(self, conn, iTag, msgType, addr, compression=None):
             """ Initialize the Publisher.
             """
             self._sub = None
             self._addr = addr
+            self._compressor, _ = _createCompression(compression)
 
             super(ROSPublisher, self).__init__(conn, iTag, msgType)
 
         def _rosCB(self, msg):
             """ Internally used callback for ROS Subscriber.
             """
-            if _GZIP_LVL:
-                self.publish(StringIO(zlib.compress(msg._buff, _GZIP_LVL)))
-            else:
-                self.publish(StringIO(msg._buff))
+            self.publish(BinaryBuffer(self._compressor.compress(msg._buff)))
 
         def _start(self):
+            self._compressor.reset()
             self._sub = rospy.Subscriber(self._addr, rospy.AnyMsg, self._rosCB)
             print("Local ROS Subscriber on topic '{0}' is "
                   'up.'.format(self._addr))
@@ -453,11 +475,12 @@ if HAS_ROS:
     class ROSSubscriber(_Subscriber):
         """ Representation of a Subscriber Interface using ROS.
         """
-        def __init__(self, conn, iTag, msgType, addr):
+        def __init__(self, conn, iTag, msgType, addr, compression=None):
             """ Initialize the Subscriber.
             """
             self._pub = None
             self._addr = addr
+            _, self._decompressor = _createCompression(compression)
             self._args = msgType.split('/')
 
             if len(self._args) != 2:
@@ -472,15 +495,11 @@ if HAS_ROS:
                 Publisher.
             """
             rosMsg = rospy.AnyMsg()
-
-            if _GZIP_LVL:
-                rosMsg._buff = zlib.decompress(msg.getvalue())
-            else:
-                rosMsg._buff = msg.getvalue()
-
+            rosMsg._buff = self._decompressor.decompress(getView(msg))
             self._pub.publish(rosMsg)
 
         def _start(self):
+            self._decompressor.reset()
             self._pub = rospy.Publisher(self._addr,
                                         self._conn.loader.loadMsg(*self._args))
             print("Local ROS Publisher on topic '{0}' is "
@@ -504,13 +523,19 @@ if HAS_ROS:
     class ROSServiceClient(_ServiceClient):
         """ Representation of a Service Client Interface using ROS.
         """
-        def __init__(self, conn, iTag, srvType, addr):
+        def __init__(self, conn, iTag, srvType, addr, compression=None):
             """ Initialize the Service Client.
             """
+            if compression == types.COMPRESSION_STREAM:
+                raise ValueError("Compression mode 'stream' can only be used "
+                                 'for topics.')
+
             self._service = None
             self._addr = addr
             self._lock = Lock()
             self._pending = set()
+            self._compressor, self._decompressor = \
+                _createCompression(compression)
 
             args = srvType.split('/')
 
@@ -529,10 +554,7 @@ if HAS_ROS:
             """
             event = _EventRef()
 
-            if _GZIP_LVL:
-                req = StringIO(zlib.compress(rosReq._buff, _GZIP_LVL))
-            else:
-                req = StringIO(rosReq._buff)
+            req = BinaryBuffer(self._compressor.compress(rosReq._buff))
 
             with self._lock:
                 self._pending.add(event)
@@ -554,12 +576,7 @@ if HAS_ROS:
                 Service as response.
             """
             rosResp = rospy.AnyMsg()
-
-            if _GZIP_LVL:
-                rosResp._buff = zlib.decompress(resp.getvalue())
-            else:
-                rosResp._buff = resp.getvalue()
-
+            rosResp._buff = self._decompressor.decompress(getView(resp))
             event.set(rosResp)
 
         def _start(self):
@@ -591,10 +608,16 @@ if HAS_ROS:
     class ROSServiceProvider(_ServiceProvider):
         """ Representation of a Service Provider Interface using ROS.
         """
-        def __init__(self, conn, iTag, srvType, addr):
+        def __init__(self, conn, iTag, srvType, addr, compression=None):
             """ Initialize the Service Client.
             """
+            if compression == types.COMPRESSION_STREAM:
+                raise ValueError("Compression mode 'stream' can only be used "
+                                 'for topics.')
+
             self._addr = addr
+            self._compressor, self._decompressor = \
+                _createCompression(compression)
 
             args = srvType.split('/')
 
@@ -614,19 +637,10 @@ if HAS_ROS:
                 Service as request.
             """
             rosReq = rospy.AnyMsg()
-
-            if _GZIP_LVL:
-                rosReq._buff = zlib.decompress(req.getvalue())
-            else:
-                rosReq._buff = req.getvalue()
+            rosReq._buff = self._decompressor.decompress(getView(req))
 
             rospy.wait_for_service(self._addr, timeout=5)
             serviceFunc = rospy.ServiceProxy(self._addr, self._srvCls)
             rosResp = serviceFunc(rosReq)
 
-            if _GZIP_LVL:
-                resp = StringIO(zlib.compress(rosResp._buff, _GZIP_LVL))
-            else:
-                resp = StringIO(rosResp._buff)
-
-            return resp
+            return BinaryBuffer(self._compressor.compress(rosResp._buff))
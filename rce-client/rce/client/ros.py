@@ -90,11 +90,10 @@ class Environment(object):
                 iType = ros['iType']
 
                 if iType in _MAP:
-                    self._ifs.append(
-                        getattr(self._conn, _MAP[iType])(ros['iTag'],
-                                                         ros['iCls'],
-                                                         ros['addr'])
-                    )
+                    create = getattr(self._conn, _MAP[iType])
+                    self._ifs.append(create(ros['iTag'], ros['iCls'],
+                                            ros['addr'],
+                                            ros.get('compression')))
         except Exception as e:
             import traceback
             print(''.join(traceback.format_exception_only(type(e), e)))
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     rce-comm/rce/comm/arrays.py
+#
+#     This file is part of the RoboEarth Cloud Engine framework.
+#
+#     This file was originally created for RoboEearth
+#     http://www.roboearth.org/
+#
+#     The research leading to these results has received funding from
+#     the European Union Seventh Framework Programme FP7/2007-2013 under
+#     grant agreement no248942 RoboEarth.
+#
+#     Copyright 2013 RoboEarth
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+#     \author/s: Dominique Hunziker
+#
+#
+
+""" Numeric arrays of ROS messages can be sent as typed binary blobs instead of
+    lists of numbers (array mode). A blob is a dictionary of the form
+
+        { 'dtype' : str, 'shape' : [int], 'data' : binary }
+
+    where 'dtype' is the little-endian numpy type string of the elements,
+    'shape' the shape of the array and 'data' the raw bytes of the elements,
+    which is sent using the binary reference mechanism.
+"""
+
+# Python specific imports
+import struct
+from operator import mul
+
+try:
+    from cStringIO import InputType, OutputType
+    from StringIO import StringIO as pyStringIO
+
+    def _checkIsStringIO(obj):
+        return isinstance(obj, (InputType, OutputType, pyStringIO))
+except ImportError:
+    from StringIO import StringIO
+
+    def _checkIsStringIO(obj):
+        return isinstance(obj, StringIO)
+
+# numpy specific imports; if available
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# rce specific imports
+from rce.comm.binary import BinaryBuffer, getView
+
+
+# Mapping from ROS primitive types to the numpy type strings of the blobs
+DTYPES = { 'int8'    : '|i1',
+           'uint16'  : '<u2',
+           'int16'   : '<i2',
+           'uint32'  : '<u4',
+           'int32'   : '<i4',
+           'uint64'  : '<u8',
+           'int64'   : '<i8',
+           'float32' : '<f4',
+           'float64' : '<f8' }
+
+# struct format characters which are used if numpy is not available
+_FORMATS = { '|i1' : 'b', '<u2' : 'H', '<i2' : 'h', '<u4' : 'I', '<i4' : 'i',
+             '<u8' : 'Q', '<i8' : 'q', '<f4' : 'f', '<f8' : 'd' }
+
+_KEYS = frozenset(('dtype', 'shape', 'data'))
+
+
+def packArray(dtype, values):
+    """ Pack a numeric array into a typed binary blob.
+
+        @param dtype:           numpy type string of the elements; one of the
+                                values in DTYPES.
+        @type  dtype:           str
+
+        @param values:          Elements of the array.
+        @type  values:          tuple / list / numpy.ndarray
+
+        @return:                Typed binary blob.
+        @rtype:                 dict
+    """
+    if numpy and isinstance(values, numpy.ndarray):
+        shape = list(values.shape)
+    else:
+        shape = [len(values)]
+
+    return {'dtype':dtype, 'shape':shape,
+            'data':BinaryBuffer(packValues(dtype, values))}
+
+
+def packBuffer(dtype, data, offset, count):
+    """ Pack a numeric array which is stored in serialized form into a typed
+        binary blob without copying the data.
+
+        @param dtype:           numpy type string of the elements; one of the
+                                values in DTYPES.
+        @type  dtype:           str
+
+        @param data:            Buffer which contains the elements.
+        @type  data:            str / buffer
+
+        @param offset:          Offset in bytes where the elements start.
+        @type  offset:          int
+
+        @param count:           Number of elements.
+        @type  count:           int
+
+        @return:                Typed binary blob.
+        @rtype:                 dict
+    """
+    size = count * struct.calcsize(_FORMATS[dtype])
+
+    if offset + size > len(data):
+        raise ValueError('Buffer is too short for the array.')
+
+    return {'dtype':dtype, 'shape':[count],
+            'data':BinaryBuffer(data, offset, size)}
+
+
+def packValues(dtype, values):
+    """ Get the raw bytes of a numeric array.
+
+        @param dtype:           numpy type string of the elements; one of the
+                                values in DTYPES.
+        @type  dtype:           str
+
+        @param values:          Elements of the array.
+        @type  values:          tuple / list / numpy.ndarray
+
+        @return:                Raw bytes of the elements.
+        @rtype:                 str
+    """
+    if numpy and isinstance(values, numpy.ndarray):
+        return values.astype(dtype, copy=False).tostring()
+
+    # struct is faster than numpy for the tuples deserialized by genpy
+    return struct.pack('<{0}{1}'.format(len(values), _FORMATS[dtype]),
+                       *values)
+
+
+def isPackedArray(obj):
+    """ Check whether the object is a typed binary blob.
+
+        @param obj:             Object which should be checked.
+
+        @rtype:                 bool
+    """
+    return (isinstance(obj, dict) and len(obj) == 3 and _KEYS.issuperset(obj)
+            and _checkIsStringIO(obj['data']))
+
+
+def unpackArray(blob, flat=False):
+    """ Unpack a typed binary blob without copying the data.
+
+        @param blob:            Typed binary blob.
+        @type  blob:            dict
+
+        @param flat:            Flag which is True if the elements should be
+                                returned as a one-dimensional array, i.e. the
+                                shape of the blob is only validated.
+        @type  flat:            bool
+
+        @return:                Read-only array of the blob if numpy is
+                                available; otherwise a flat tuple of the
+                                elements.
+        @rtype:                 numpy.ndarray / tuple
+
+        @raise:                 TypeError, ValueError
+    """
+    try:
+        dtype = str(blob['dtype'])
+        shape = blob['shape']
+        data = getView(blob['data'])
+    except KeyError as e:
+        raise ValueError('Array is missing the key {0}.'.format(e))
+
+    if dtype not in _FORMATS:
+        raise TypeError("Array type '{0}' is not supported.".format(dtype))
+
+    fmt = _FORMATS[dtype]
+    count, rest = divmod(len(data), struct.calcsize(fmt))
+
+    try:
+        shape = [int(dim) for dim in shape]
+    except (TypeError, ValueError):
+        raise ValueError('Array shape is invalid.')
+
+    if rest or reduce(mul, shape, 1) != count or min(shape or [0]) < 0:
+        raise ValueError('Array shape does not match its data.')
+
+    if numpy:
+        array = numpy.frombuffer(data, dtype)
+        return array if flat else array.reshape(shape)
+
+    return struct.unpack_from('<{0}{1}'.format(count, fmt), data)
+
+
+def unpackArrays(msg):
+    """ Replace all typed binary blobs in a message by arrays.
+
+        @param msg:             Message which should be processed.
+        @type  msg:             { str : {} / base_types / StringIO }
+
+        @return:                Processed message.
+        @rtype:                 { str : {} / base_types / numpy.ndarray }
+    """
+    if isinstance(msg, dict):
+        if isPackedArray(msg):
+            return unpackArray(msg)
+
+        for key, value in msg.iteritems():
+            if isinstance(value, (dict, list)):
+                msg[key] = unpackArrays(value)
+    elif isinstance(msg, list):
+        for i, value in enumerate(msg):
+            if isinstance(value, (dict, list)):
+                msg[i] = unpackArrays(value)
+
+    return msg
@@ -32,7 +32,9 @@
 
 # Python specific imports
 import json
-from datetime import datetime, timedelta
+from time import time
+from heapq import heappush, heappop
+from itertools import count, imap
 from uuid import uuid4
 
 try:
@@ -53,6 +55,8 @@ from twisted.internet.task import LoopingCall
 
 # rce specific imports
 from rce.comm.error import InvalidRequest
+from rce.comm.binary import BinaryBuffer
+from rce.comm.envelope import packEnvelope, unpackEnvelope
 
 
 class AssemblerError(Exception):
@@ -60,7 +64,7 @@ class AssemblerError(Exception):
     """
 
 
-def recursiveBinarySearch(multidict):
+def recursiveBinarySearch(multidict, uriGen=None):
     """ Search a JSON message for StringIO instances which should be replaced
         with a reference to a binary message. Returns a list of all binary
         messages and the modified JSON string message.
@@ -70,6 +74,11 @@ def recursiveBinarySearch(multidict):
                                 sending.
         @type  multidict:       { str : ... }
 
+        @param uriGen:          Callable which is used to generate the
+                                references for the binary messages. If None
+                                (default), a random hex-encoded UUID is used.
+        @type  uriGen:          callable / None
+
         @return:                A list of tuples containing the URI and the
                                 matching StringIO instance. Also the modified
                                 JSON message where the StringIO instances have
@@ -79,9 +88,12 @@ def recursiveBinarySearch(multidict):
     uriBinary = []
     keys = []
 
+    if not uriGen:
+        uriGen = lambda: uuid4().hex
+
     for k, v in multidict.iteritems():
         if isinstance(v, dict):
-            uriBinaryPart, multidictPart = recursiveBinarySearch(v)
+            uriBinaryPart, multidictPart = recursiveBinarySearch(v, uriGen)
             uriBinary += uriBinaryPart
             multidict[k] = multidictPart
         elif isinstance(v, (list, tuple)):
@@ -102,13 +114,13 @@ def recursiveBinarySearch(multidict):
             uris = []
 
             for e in ele:
-                tmpURI = uuid4().hex
+                tmpURI = uriGen()
                 uris.append(tmpURI)
                 uriBinary.append((tmpURI, e))
 
             ele = uris
         else:
-            tmpURI = uuid4().hex
+            tmpURI = uriGen()
             uriBinary.append((tmpURI, ele))
             ele = tmpURI
 
@@ -117,70 +129,192 @@ def recursiveBinarySearch(multidict):
     return uriBinary, multidict
 
 
-class _IncompleteMsg(object):
-    """ Class which represents an incomplete class.
+def recursiveURISearch(multidict):
+    """ Search a received JSON message for references to binary messages,
+        i.e. keys ending with '*', and replace the keys with the original
+        key. The references are returned such that the binaries can be
+        inserted into the message.
+
+        @param multidict:       JSON message which was received.
+        @type  multidict:       { str : ... }
+
+        @return:                List of tuples of the forms (uri, dict, key)
+                                or (uri, list, index)
+        @rtype:                 [ (str, dict, str) or (str, list, int) ]
     """
-    def __init__(self, assembler, msg, uris):
-        """ Initialize the incomplete message.
+    valueList = []
+    keys = []
 
-            @param assembler:   Assembler to which the this instance
-                                belongs.
-            @type  assembler:   client.assembler.MessageAssembler
+    for k, v in multidict.iteritems():
+        if isinstance(v, dict):
+            valueList += recursiveURISearch(v)
+        elif k[-1] == '*':
+            keys.append(k)
 
-            @param msg:         Incomplete message as a dictionary.
-            @type  msg:         dict
+    for k in keys:
+        ele = multidict.pop(k)
 
-            @param uris:        Return value of _recursiveURISearch
-            @type  nr:          [ (str, dict, str) ]
-        """
-        self._assembler = assembler
-        self._msg = msg
-        self._uris = {}
+        if isinstance(ele, list):
+            lst = [None] * len(ele)
+            multidict[k[:-1]] = lst
 
-        for uri, msgDict, key in uris:
-            self._uris[uri] = (msgDict, key)
+            for i, uri in enumerate(ele):
+                valueList.append((uri, lst, i))
+        else:
+            valueList.append((ele, multidict, k[:-1]))
 
-        self._added = datetime.now()
+    return valueList
 
-    @property
-    def msg(self):
-        """ Get the represented message. """
-        if self._uris:
-            raise AssemblerError('Message still contains missing references.')
 
-        return self._msg
+def uriGenerator():
+    """ Create a generator for the references of the binaries which are sent
+        using the multi-frame format. The references are unique for the
+        connection for which the generator is used and have the same format
+        as the random UUIDs expected by legacy peers, i.e. 32 hex digits, but
+        are much cheaper to generate.
 
-    def older(self, timestamp):
-        """ Returns True if this incomplete message is older the the given
-            timestamp.
-        """
-        return self._added < timestamp
+        @return:                Callable which returns the next reference.
+        @rtype:                 callable
+    """
+    return imap('{0:032x}'.format, count()).next
+
+
+def disassembleMessage(msg, envelope=False, uriGen=None):
+    """ Prepare a JSON message for sending, i.e. split the message into the
+        frames which have to be sent using the WebSocket connection.
+
+        @param msg:             JSON message which might contain StringIO
+                                instances and which should be prepared for
+                                sending.
+        @type  msg:             { str : ... }
+
+        @param envelope:        Flag which is True if the envelope format
+                                (rce.comm.envelope) should be used.
+        @type  envelope:        bool
+
+        @param uriGen:          Callable which is used to generate the
+                                references for the multi-frame format, refer
+                                to uriGenerator. If None (default), random
+                                UUIDs are used.
+        @type  uriGen:          callable / None
+
+        @return:                List of tuples containing the frame and a flag
+                                indicating whether the frame is binary.
+        @rtype:                 [ (str, bool) ]
+    """
+    if envelope:
+        uriBinary, msg = recursiveBinarySearch(msg, count().next)
+        msg = json.dumps(msg)
+
+        if not uriBinary:
+            return [(msg, False)]
+
+        return [(packEnvelope(msg, [binary for _, binary in uriBinary]), True)]
 
-    def addBinary(self, uri, binaryData):
-        """ Add the binary data with the given uri.
+    uriBinary, msg = recursiveBinarySearch(msg, uriGen)
+    frames = [(json.dumps(msg), False)]
+    frames.extend((uri + binary.getvalue(), True) for uri, binary in uriBinary)
+    return frames
 
-            @return:    True if the binary was used; False otherwise.
+
+def assembleEnvelope(frame):
+    """ Assemble a message from a received envelope, i.e. a binary frame
+        which contains a complete message including all binaries (refer to
+        rce.comm.envelope).
+
+        @param frame:           Envelope which was received.
+        @type  frame:           str
+
+        @return:                Received message where the references have
+                                been replaced with StringIO instances.
+        @rtype:                 { str : ... }
+
+        @raise:                 rce.comm.error.InvalidRequest
+    """
+    header, binaries = unpackEnvelope(frame)
+
+    try:
+        msg = json.loads(header)
+    except ValueError:
+        raise InvalidRequest('Message is not in valid JSON format.')
+
+    for index, parent, key in recursiveURISearch(msg):
+        if not isinstance(index, int) or not 0 <= index < len(binaries):
+            raise InvalidRequest('Message contains an invalid reference to a '
+                                 'binary.')
+
+        parent[key] = BinaryBuffer(binaries[index])
+
+    return msg
+
+
+class _IncompleteMsg(object):
+    """ Class which represents an incomplete message.
+    """
+    __slots__ = ['msg', 'uris', 'size', 'entry']
+
+    def __init__(self, msg, uris, size):
+        """ Initialize the incomplete message.
+
+            @param msg:         Incomplete message as a dictionary.
+            @type  msg:         dict
+
+            @param uris:        URIs of the binaries which are still missing
+                                in the message.
+            @type  uris:        set
+
+            @param size:        Number of bytes which are used by the message
+                                and the binaries which are already assembled.
+            @type  size:        int
         """
-        ref = self._uris.pop(uri, None)
+        self.msg = msg
+        self.uris = uris
+        self.size = size
 
-        if ref:
-            parent, key = ref
-            parent[key] = binaryData
+        # Entry in the deadline heap of the assembler
+        self.entry = None
 
-            if self._uris:
-                self._added = datetime.now()
-            else:
-                self._assembler.forwardCompleteMessage(self)
 
-            return True
-        else:
-            return False
+class _ProcessAccount(object):
+    """ Byte accounting of all message assemblers of the process.
+    """
+    def __init__(self):
+        self.bytes = 0
+
+        # Assemblers which are running
+        self.assemblers = set()
+
+        # Assemblers which paused their connection because the process has
+        # exceeded its high-water mark
+        self.paused = set()
+
+
+_process = _ProcessAccount()
 
 
 class MessageAssembler(object):
     """ Class which is used to store incomplete messages for a certain time
         and which is used to assemble them when possible.
+
+        All pending binary references are stored in an index which maps the
+        URI of the binary to the slot in the incomplete message where the
+        binary has to be inserted. Expiry is handled using a heap of deadlines
+        such that neither the matching of a binary nor the clean up of stale
+        entries depends on the number of messages in flight.
+
+        The bytes held by the assembler are accounted for per connection and
+        per process. If the connection exceeds HIGH_WATER bytes, the least
+        recently active entries are evicted. If the process exceeds
+        PROCESS_HIGH_WATER bytes, the entries of the connections which hold
+        the most bytes are evicted and these connections stop reading from
+        their transport until the process is below PROCESS_LOW_WATER bytes
+        again.
     """
+    # CONFIG
+    HIGH_WATER = 16 * 1024 * 1024
+    PROCESS_HIGH_WATER = 128 * 1024 * 1024
+    PROCESS_LOW_WATER = 96 * 1024 * 1024
+
     def __init__(self, protocol, timeout):
         """ Initialize the binary assembler.
 
@@ -194,23 +328,179 @@ class MessageAssembler(object):
         self._protocol = protocol
         self._timeout = timeout
 
-        # Set of _IncompleteMessage instances
-        self._incompleteMsgs = set()
+        # Dictionary with binary UID as key and a tuple of the form
+        # (incomplete message, parent, key) as value
+        self._pending = {}
 
-        # Dictionary with binary UID as key and the binary as value
+        # Dictionary with binary UID as key and a tuple of the form
+        # (binary, heap entry) as value
         self._binaries = {}
 
+        # Heap of lists of the form [deadline, sequence number, reference];
+        # reference is either a binary UID or an incomplete message and is set
+        # to None if the entry is no longer valid
+        self._deadlines = []
+        self._counter = count()
+
+        # Byte accounting and counters
+        self._bytes = 0
+        self._paused = False
+        self._completed = 0
+        self._expired = 0
+        self._evicted = 0
+        self._evictedBytes = 0
+
         # Setup repeated calling of the clean up method
         self._cleaner = LoopingCall(self._cleanUp)
 
-    def forwardCompleteMessage(self, msgRepr):
-        """ Callback for rce.comm.assembler._IncompleteMsg to send a completed
-            message to the correct handler.
+    @property
+    def stats(self):
+        """ Statistics of the assembler as a dictionary:
+                bytes           Bytes currently held by the assembler
+                processBytes    Bytes currently held by all assemblers of the
+                                process
+                completed       Number of assembled messages
+                expired         Number of messages and binaries which have
+                                been dropped because of the timeout
+                evicted         Number of messages and binaries which have
+                                been dropped because of the high-water mark
+                evictedBytes    Number of bytes which have been evicted
+                paused          Flag which is True if reading from the
+                                connection is paused
+        """
+        return {'bytes' : self._bytes, 'processBytes' : _process.bytes,
+                'completed' : self._completed, 'expired' : self._expired,
+                'evicted' : self._evicted, 'evictedBytes' : self._evictedBytes,
+                'paused' : self._paused}
+
+    def _account(self, size):
+        """ Internally used method to account for bytes which are added to
+            (positive size) or removed from (negative size) the assembler.
+        """
+        self._bytes += size
+        _process.bytes += size
+
+        if size > 0:
+            self._checkHighWater()
+        elif (_process.paused and
+              _process.bytes < self.PROCESS_LOW_WATER):
+            for assembler in _process.paused.copy():
+                assembler._resume()
+
+    def _checkHighWater(self):
+        """ Internally used method to enforce the high-water marks after new
+            data has been added to the assembler.
+        """
+        while self._bytes > self.HIGH_WATER and self._evictOldest():
+            pass
+
+        if _process.bytes > self.PROCESS_HIGH_WATER:
+            assemblers = _process.assemblers | set((self,))
+
+            while _process.bytes > self.PROCESS_HIGH_WATER:
+                holder = max(assemblers, key=lambda a: a._bytes)
+
+                if not holder._bytes:
+                    break
+
+                holder._pause()
+
+                if not holder._evictOldest():
+                    break
+
+    def _pause(self):
+        """ Internally used method to stop reading from the connection.
         """
-        self._incompleteMsgs.remove(msgRepr)
-        self._protocol.processCompleteMessage(msgRepr.msg)
+        if self._paused:
+            return
+
+        transport = getattr(self._protocol, 'transport', None)
+
+        if transport:
+            transport.pauseProducing()
+
+        self._paused = True
+        _process.paused.add(self)
+        log.msg('Assembler memory exceeds high-water mark of the process; '
+                'stop reading from connection.')
+
+    def _resume(self):
+        """ Internally used method to resume reading from the connection.
+        """
+        if not self._paused:
+            return
+
+        _process.paused.discard(self)
+        self._paused = False
+
+        transport = getattr(self._protocol, 'transport', None)
+
+        if transport:
+            transport.resumeProducing()
+
+    def _addDeadline(self, ref):
+        """ Internally used method to add a new deadline for the given
+            reference to the heap.
+
+            @return:        Entry which was added to the heap.
+            @rtype:         list
+        """
+        entry = [time() + self._timeout, self._counter.next(), ref]
+        heappush(self._deadlines, entry)
+        return entry
+
+    def _drop(self, ref):
+        """ Internally used method to drop the given reference of a heap entry.
+
+            @return:        Number of bytes which have been freed.
+            @rtype:         int
+        """
+        if isinstance(ref, _IncompleteMsg):
+            pending = self._pending
+
+            for uri in ref.uris:
+                if pending.get(uri, (None,))[0] is ref:
+                    del pending[uri]
+
+            size = ref.size
+        else:
+            binaryData = self._binaries.pop(ref, None)
+
+            if not binaryData:
+                return 0
+
+            size = len(binaryData[0])
 
-    def _handleString(self, msg, uris):
+        self._account(-size)
+        return size
+
+    def _evictOldest(self):
+        """ Internally used method to evict the least recently active message
+            or binary.
+
+            @return:        True if an entry has been evicted; False if the
+                            assembler is empty.
+            @rtype:         bool
+        """
+        deadlines = self._deadlines
+
+        while deadlines:
+            ref = heappop(deadlines)[2]
+
+            if ref is not None:
+                self._evictedBytes += self._drop(ref)
+                self._evicted += 1
+                return True
+
+        return False
+
+    def _complete(self, msg):
+        """ Internally used method to forward a completed message.
+        """
+        self._completed += 1
+        self._protocol.processCompleteMessage(msg)
+
+    def _handleString(self, msg, uris, size):
         """ Try to process the received incomplete string message, i.e.
             assemble the message with the waiting binary data. Forward the
             message if it can be completed and store the incomplete message
@@ -219,10 +509,22 @@ class MessageAssembler(object):
             @param msg:     Received string message.
             @type  msg:     str
 
-            @param uris:    Return value of self._recursiveURISearch
+            @param uris:    Return value of recursiveURISearch
             @type  uris:    [ (str, dict, str) or (str, list, int) ]
+
+            @param size:    Size of the received frame in bytes.
+            @type  size:    int
         """
+        pending = self._pending
+
+        for uri, _, _ in uris:
+            if uri in pending:
+                raise InvalidRequest('Message contains a reference to a binary '
+                                     'which is already used by another '
+                                     'message.')
+
         missing = []
+        freed = 0
 
         for ref in uris:
             uri, parent, key = ref
@@ -230,13 +532,24 @@ class MessageAssembler(object):
 
             if binaryData:
                 parent[key] = binaryData[0]
+                binaryData[1][2] = None
+                freed += len(binaryData[0])
             else:
                 missing.append(ref)
 
         if missing:
-            self._incompleteMsgs.add(_IncompleteMsg(self, msg, missing))
+            incomplete = _IncompleteMsg(msg, set(ref[0] for ref in missing),
+                                        size + freed)
+            incomplete.entry = self._addDeadline(incomplete)
+
+            for uri, parent, key in missing:
+                self._pending[uri] = (incomplete, parent, key)
+
+            # The matched binaries are now part of the incomplete message
+            self._account(size)
         else:
-            self._protocol.processCompleteMessage(msg)
+            self._account(-freed)
+            self._complete(msg)
 
     def _handleBinary(self, msg):
         """ Try to process a received binary message, i.e. assemble the waiting
@@ -248,43 +561,37 @@ class MessageAssembler(object):
             @type  msg:     str
         """
         uri = msg[:32]
-        binaryData = StringIO()
-        binaryData.write(msg[32:])
-
-        for msg in self._incompleteMsgs:
-            if msg.addBinary(uri, binaryData):
-                break
-        else:
-            self._binaries[uri] = (binaryData, datetime.now())
-
-    def _recursiveURISearch(self, multidict):
-        """ Internally used method to find binary data in incoming messages.
-
-            @return:    List of tuples of the forms (uri, dict, key) or
-                        (uri, list, index)
-        """
-        valueList = []
-        keys = []
+        binaryData = BinaryBuffer(msg, 32)
 
-        for k, v in multidict.iteritems():
-            if isinstance(v, dict):
-                valueList += self._recursiveURISearch(v)
-            elif k[-1] == '*':
-                keys.append(k)
+        ref = self._pending.pop(uri, None)
 
-        for k in keys:
-            ele = multidict.pop(k)
+        if ref:
+            incomplete, parent, key = ref
+            parent[key] = binaryData
+            incomplete.uris.discard(uri)
 
-            if isinstance(ele, list):
-                lst = [None] * len(ele)
-                multidict[k[:-1]] = lst
+            # Invalidate the old deadline of the message
+            incomplete.entry[2] = None
 
-                for i, uri in enumerate(ele):
-                    valueList.append((uri, lst, i))
+            if incomplete.uris:
+                incomplete.entry = self._addDeadline(incomplete)
+                incomplete.size += len(binaryData)
+                self._account(len(binaryData))
             else:
-                valueList.append((ele, multidict, k[:-1]))
+                incomplete.entry = None
+                self._account(-incomplete.size)
+                self._complete(incomplete.msg)
+        else:
+            replaced = self._binaries.get(uri)
 
-        return valueList
+            if replaced:
+                # Invalidate the deadline of the replaced binary and release
+                # its bytes before the new binary is stored
+                replaced[1][2] = None
+                self._account(-len(replaced[0]))
+
+            self._binaries[uri] = (binaryData, self._addDeadline(uri))
+            self._account(len(binaryData))
 
     def processMessage(self, msg, binary):
         """ This method is used to process any messages which should pass
@@ -293,28 +600,38 @@ class MessageAssembler(object):
         if binary:
             self._handleBinary(msg)
         else:
+            size = len(msg)
+
             try:
                 msg = json.loads(msg)
             except ValueError:
                 raise InvalidRequest('Message is not in valid JSON format.')
 
-            uris = self._recursiveURISearch(msg)
+            uris = recursiveURISearch(msg)
 
             if uris:
-                self._handleString(msg, uris)
+                self._handleString(msg, uris, size)
             else:
-                self._protocol.processCompleteMessage(msg)
+                self._complete(msg)
 
     def start(self):
         """ Start the cleaner of the assembler.
         """
+        _process.assemblers.add(self)
         self._cleaner.start(self._timeout / 4)
 
     def stop(self):
         """ Stop the cleaner of the assembler and remove any circular
             references.
         """
-        self._incompleteMsgs = set()
+        self._pending = {}
+        self._binaries = {}
+        self._deadlines = []
+
+        _process.assemblers.discard(self)
+        _process.paused.discard(self)
+        self._paused = False
+        self._account(-self._bytes)
 
         if self._cleaner.running:
             self._cleaner.stop()
@@ -322,23 +639,29 @@ class MessageAssembler(object):
     def _cleanUp(self):
         """ Internally used method to remove old incomplete messages.
         """
-        limit = datetime.now() - timedelta(seconds=self._timeout)
+        now = time()
+        deadlines = self._deadlines
+        droppedMsgs = 0
+        droppedBinaries = 0
+
+        while deadlines and deadlines[0][0] < now:
+            ref = heappop(deadlines)[2]
+
+            if ref is None:
+                continue
+            elif isinstance(ref, _IncompleteMsg):
+                droppedMsgs += 1
+            else:
+                droppedBinaries += 1
 
-        toClean = [msg for msg in self._incompleteMsgs if msg.older(limit)]
+            self._drop(ref)
 
-        if toClean:
-            for msg in toClean:
-                self._incompleteMsgs.remove(msg)
+        self._expired += droppedMsgs + droppedBinaries
 
+        if droppedMsgs:
             log.msg('{0} incomplete messages have been dropped '
-                    'from assembler.'.format(len(toClean)))
-
-        toClean = [uri for uri, (_, timestamp) in self._binaries.iteritems()
-                   if timestamp < limit]
-
-        if toClean:
-            for uri in toClean:
-                del self._binaries[uri]
+                    'from assembler.'.format(droppedMsgs))
 
+        if droppedBinaries:
             log.msg('{0} unused binaries have been dropped '
-                    'from assembler.'.format(len(toClean)))
+                    'from assembler.'.format(droppedBinaries))
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     rce-comm/rce/comm/batch.py
+#
+#     This file is part of the RoboEarth Cloud Engine framework.
+#
+#     This file was originally created for RoboEearth
+#     http://www.roboearth.org/
+#
+#     The research leading to these results has received funding from
+#     the European Union Seventh Framework Programme FP7/2007-2013 under
+#     grant agreement no248942 RoboEarth.
+#
+#     Copyright 2013 RoboEarth
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+#     \author/s: Dominique Hunziker
+#
+#
+
+""" Batching of data messages.
+
+    Small data messages are collected and sent as a single batch message
+    ('DB') whose data is the list of the data parts of the collected data
+    messages ('DM'). A batch is sent as soon as it reaches BATCH_SIZE bytes or
+    BATCH_DELAY seconds after its first message has been added, whichever
+    comes first.
+
+    Only messages without binary parts are batched; messages with binary parts
+    are in general large enough to be sent on their own.
+"""
+
+# Python specific imports
+from numbers import Number
+
+
+def estimateSize(msg, limit):
+    """ Estimate the size of the serialized message.
+
+        @param msg:             Message whose size should be estimated.
+        @type  msg:             { str : {} / base_types }
+
+        @param limit:           Size in bytes after which the estimation is
+                                aborted.
+        @type  limit:           int
+
+        @return:                Estimated size in bytes or None, if the message
+                                contains binary parts or exceeds the limit.
+        @rtype:                 int / None
+    """
+    size = 0
+    stack = [msg]
+
+    while stack:
+        obj = stack.pop()
+
+        if isinstance(obj, basestring):
+            size += len(obj) + 2
+        elif isinstance(obj, dict):
+            size += 2 * len(obj) + 2
+            stack.extend(obj.iterkeys())
+            stack.extend(obj.itervalues())
+        elif isinstance(obj, (list, tuple)):
+            size += len(obj) + 2
+            stack.extend(obj)
+        elif isinstance(obj, Number) or obj is None:
+            size += 8
+        else:
+            # Binary part of the message
+            return None
+
+        if size > limit:
+            return None
+
+    return size
+
+
+class MessageBatcher(object):
+    """ Collects the data parts of data messages and hands them on as a batch.
+    """
+    # CONFIG
+    BATCH_DELAY = 0.005
+    BATCH_SIZE = 65536
+
+    def __init__(self, send, clock=None):
+        """ Initialize the batcher.
+
+            @param send:        Callable which is used to send a batch. The
+                                callable takes the list of data parts as
+                                single argument; the list might contain a
+                                single data part only.
+            @type  send:        callable
+
+            @param clock:       Provider of 'callLater' used to schedule the
+                                sending of a batch. If None (default), the
+                                global reactor is used.
+            @type  clock:       twisted.internet.interfaces.IReactorTime
+        """
+        if clock is None:
+            from twisted.internet import reactor as clock
+
+        self._send = send
+        self._clock = clock
+
+        self._batch = []
+        self._size = 0
+        self._call = None
+
+    def add(self, data, size=None):
+        """ Add the data part of a data message to the batch.
+
+            @param data:        Data part of the data message, i.e. the
+                                dictionary with the keys 'iTag', 'type',
+                                'msgID' and 'msg'.
+            @type  data:        dict
+
+            @param size:        Size of the data part as returned by
+                                estimateSize with the limit BATCH_SIZE, if
+                                it has already been estimated, e.g. by the
+                                thread which produced the message.
+            @type  size:        int / None
+
+            @return:            True if the message has been added to the
+                                batch; False if the message is not suited to
+                                be sent in a batch, in which case the caller
+                                has to send it on its own after the pending
+                                batch has been flushed.
+            @rtype:             bool
+        """
+        if size is None:
+            size = estimateSize(data, self.BATCH_SIZE)
+
+            if size is None:
+                return False
+
+        if self._size + size > self.BATCH_SIZE:
+            self.flush()
+
+        self._batch.append(data)
+        self._size += size
+
+        if self._call is None:
+            self._call = self._clock.callLater(self.BATCH_DELAY, self.flush)
+
+        return True
+
+    def flush(self):
+        """ Send the pending batch, if there is one.
+        """
+        if self._call:
+            if self._call.active():
+                self._call.cancel()
+
+            self._call = None
+
+        if not self._batch:
+            return
+
+        batch = self._batch
+        self._batch = []
+        self._size = 0
+        self._send(batch)
+
+    def stop(self):
+        """ Discard the pending batch and cancel the scheduled send.
+        """
+        if self._call and self._call.active():
+            self._call.cancel()
+
+        self._call = None
+        self._batch = []
+        self._size = 0
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     rce-comm/rce/comm/binary.py
+#
+#     This file is part of the RoboEarth Cloud Engine framework.
+#
+#     This file was originally created for RoboEearth
+#     http://www.roboearth.org/
+#
+#     The research leading to these results has received funding from
+#     the European Union Seventh Framework Programme FP7/2007-2013 under
+#     grant agreement no248942 RoboEarth.
+#
+#     Copyright 2013 RoboEarth
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+#     \author/s: Dominique Hunziker
+#
+#
+
+# Python specific imports
+from StringIO import StringIO as pyStringIO
+
+
+class BinaryBuffer(pyStringIO):
+    """ File-like object which is used for the binary parts of a message.
+
+        The binary data is referenced using a buffer into the received frame
+        instead of copying it; the data is only copied if it is accessed as a
+        string or file for the first time. Use 'view' to get access to the data
+        without copying it.
+
+        The class inherits from StringIO.StringIO such that it can be used
+        wherever a StringIO instance is expected.
+    """
+    def __init__(self, data, offset=0, size=None):
+        """ Initialize the binary buffer.
+
+            @param data:        Object which supports the buffer interface,
+                                e.g. the received frame, and which contains
+                                the binary data.
+            @type  data:        str / buffer
+
+            @param offset:      Offset in bytes where the binary data starts.
+            @type  offset:      int
+
+            @param size:        Size in bytes of the binary data. If None
+                                (default), the binary data extends to the end
+                                of the given data.
+            @type  size:        int / None
+        """
+        pyStringIO.__init__(self)
+
+        if (isinstance(data, str) and not offset and
+            (size is None or size == len(data))):
+            self._view = data
+        elif size is None:
+            self._view = buffer(data, offset)
+        else:
+            self._view = buffer(data, offset, size)
+
+        self._loaded = False
+
+    def __len__(self):
+        if self._loaded:
+            return self.len
+
+        return len(self._view)
+
+    def __nonzero__(self):
+        # Like a StringIO, the buffer is true even if it is empty
+        return True
+
+    def _load(self):
+        """ Internally used method to copy the binary data into the StringIO
+            before it is accessed the first time.
+        """
+        if not self._loaded:
+            # str() does not copy the data if the view is already a string
+            self.buf = str(self._view)
+            self.len = len(self.buf)
+            self._loaded = True
+
+    def view(self):
+        """ Get the binary data without copying it.
+
+            @return:            Read-only view of the binary data.
+            @rtype:             str / buffer
+        """
+        if self._loaded:
+            return self.getvalue()
+
+        return self._view
+
+    def getvalue(self):
+        self._load()
+        return pyStringIO.getvalue(self)
+
+    getvalue.__doc__ = pyStringIO.getvalue.__doc__
+
+    def read(self, n=-1):
+        self._load()
+        return pyStringIO.read(self, n)
+
+    read.__doc__ = pyStringIO.read.__doc__
+
+    def readline(self, length=None):
+        self._load()
+        return pyStringIO.readline(self, length)
+
+    readline.__doc__ = pyStringIO.readline.__doc__
+
+    def readlines(self, sizehint=0):
+        self._load()
+        return pyStringIO.readlines(self, sizehint)
+
+    readlines.__doc__ = pyStringIO.readlines.__doc__
+
+    def seek(self, pos, mode=0):
+        self._load()
+        pyStringIO.seek(self, pos, mode)
+
+    seek.__doc__ = pyStringIO.seek.__doc__
+
+    def truncate(self, size=None):
+        self._load()
+        pyStringIO.truncate(self, size)
+
+    truncate.__doc__ = pyStringIO.truncate.__doc__
+
+    def write(self, s):
+        self._load()
+        pyStringIO.write(self, s)
+
+    write.__doc__ = pyStringIO.write.__doc__
+
+
+def getView(binary):
+    """ Get the data of the binary part of a message with as few copies as
+        possible.
+
+        @param binary:          Binary part of a message.
+        @type  binary:          StringIO / rce.comm.binary.BinaryBuffer
+
+        @return:                Data of the binary which can be passed to
+                                functions which accept a read-only buffer,
+                                e.g. zlib.decompress.
+        @rtype:                 str / buffer
+    """
+    if isinstance(binary, BinaryBuffer):
+        return binary.view()
+
+    return binary.getvalue()
@@ -33,6 +33,8 @@
 # Python specific imports
 import json
 import itertools
+from collections import deque
+from threading import Lock
 from urllib import urlencode
 from urllib2 import urlopen, HTTPError
 from hashlib import sha256
@@ -51,8 +53,13 @@ from autobahn.websocket import connectWS, WebSocketClientFactory, \
 # rce specific imports
 from rce.comm import types
 from rce.comm._version import CURRENT_VERSION
+from rce.comm.arrays import unpackArrays
 from rce.comm.interfaces import IRobot, IClient
-from rce.comm.assembler import recursiveBinarySearch, MessageAssembler
+from rce.comm.assembler import disassembleMessage, uriGenerator, \
+    MessageAssembler
+from rce.comm.batch import MessageBatcher, estimateSize
+from rce.comm.delta import DeltaDecoder
+from rce.comm.codec import PROTOCOLS, getCodec
 from rce.util.interface import verifyObject
 
 
@@ -60,6 +67,10 @@ class RCERobotProtocol(WebSocketClientProtocol):
     """ WebSocket client protocol which is used to communicate with the Robot
         Manager.
     """
+    # CONFIG
+    ENCODE_IN_POOL = False  # Encode messages in reactor's thread pool such
+                            # that the reactor thread only writes frames
+
     def __init__(self, conn):
         """ Initialize the protocol.
 
@@ -70,12 +81,32 @@ class RCERobotProtocol(WebSocketClientProtocol):
         self._connection = conn
         self._assembler = MessageAssembler(self, 60)
         self._registered = False
+        self._codec = None
+        self._uriGen = uriGenerator()
+        self._batcher = None
+
+        # Outbound ring which is filled by arbitrary threads and drained by
+        # the reactor thread; one wakeup is scheduled per batch of messages
+        self._ring = deque()
+        self._ringLock = Lock()
+        self._wakeup = False
+
+        # Frames (or None while still being encoded) in the order in which
+        # they have to be written; only used by the reactor thread
+        self._pending = deque()
+        self._encoding = False
 
     def onOpen(self):
         """ This method is called by twisted as soon as the WebSocket
             connection has been successfully established.
         """
+        self._codec = getCodec(self.websocket_protocol_in_use)
         self._assembler.start()
+
+        # Only servers which support a codec know about batch messages
+        if self._codec:
+            self._batcher = MessageBatcher(self._sendBatch,
+                                           self._connection.reactor)
         self._connection.registerConnection(self)
         self._registered = True
 
@@ -83,7 +114,13 @@ class RCERobotProtocol(WebSocketClientProtocol):
         """ This method is called by twisted when a new message has been
             received.
         """
-        self._assembler.processMessage(msg, binary)
+        if self._codec:
+            msg = self._codec.decode(msg, binary)
+
+            if msg is not None:
+                self.processCompleteMessage(msg)
+        else:
+            self._assembler.processMessage(msg, binary)
 
     def processCompleteMessage(self, msg):
         """ Callback for MessageAssembler which will be called as soon as a
@@ -95,26 +132,160 @@ class RCERobotProtocol(WebSocketClientProtocol):
         """ Internally used method to send messages via WebSocket connection.
             Thread-safe implementation.
 
+            Messages sent from other threads are appended to an outbound ring
+            which is drained by a single reactor wakeup per batch of messages.
+
             @param msg:         Message which should be sent.
         """
-        binaries, msg = recursiveBinarySearch(msg)
-        msg = json.dumps(msg)
+        # Small data messages are only added to a batch by the reactor
+        # thread; everything else is encoded here unless the encoding is done
+        # in the thread pool
+        frames = size = None
+
+        if self._batcher and msg['type'] == types.DATA_MESSAGE:
+            size = estimateSize(msg['data'], MessageBatcher.BATCH_SIZE)
+
+        if size is None and not self.ENCODE_IN_POOL:
+            frames = self._encode(msg)
 
         if isInIOThread():
-            self._send(msg, binaries)
+            # Messages queued by other threads have to be sent first
+            self._drain()
+            self._dispatch(msg, frames, size)
+            return
+
+        self._ring.append((msg, frames, size))
+
+        with self._ringLock:
+            if self._wakeup:
+                return
+
+            self._wakeup = True
+
+        self._connection.reactor.callFromThread(self._drain)
+
+    def _drain(self):
+        """ Internally used method to dispatch all messages which have been
+            queued in the outbound ring. (Not thread-safe; use sendMessage
+            instead.)
+        """
+        # Reset the flag before draining such that a message which is added
+        # after the ring has been emptied schedules a new wakeup
+        with self._ringLock:
+            self._wakeup = False
+
+        ring = self._ring
+
+        while ring:
+            self._dispatch(*ring.popleft())
+
+    def _dispatch(self, msg, frames, size):
+        """ Internally used method to send a message which has been taken from
+            the outbound ring. (Not thread-safe; use sendMessage instead.)
+        """
+        if frames is not None:
+            self._send(frames)
+        elif size is not None and self._batcher:
+            self._batcher.add(msg['data'], size)
         else:
-            self._connection.reactor.callFromThread(self._send, msg, binaries)
+            self._send(msg=msg, inPool=size is not None)
 
-    def _send(self, msg, binaries):
+    def _encode(self, msg):
+        """ Internally used method to encode a message into frames.
+        """
+        if self._codec:
+            return self._codec.encode(msg)
+        else:
+            return disassembleMessage(msg, uriGen=self._uriGen)
+
+    def _sendBatch(self, batch):
+        """ Internally used method to send a batch of data messages.
+            (Called by rce.comm.batch.MessageBatcher)
+        """
+        if len(batch) == 1:
+            msg = {'type':types.DATA_MESSAGE, 'data':batch[0]}
+        else:
+            msg = {'type':types.DATA_BATCH, 'data':batch}
+
+        # The reactor thread only writes frames
+        self._send(msg=msg, inPool=True)
+
+    def _send(self, frames=None, msg=None, inPool=False):
         """ Internally used method to send messages via WebSocket connection.
-            Handles the actual sending of the message. (Not thread-safe; use
+            Handles the actual sending of the message. Either the encoded
+            frames or the message which still has to be encoded have to be
+            given. The message is encoded in the thread pool of the reactor
+            if the flag inPool or ENCODE_IN_POOL is set. (Not thread-safe; use
             sendMessage instead.)
         """
-        WebSocketClientProtocol.sendMessage(self, msg)
+        if self._batcher:
+            # Pending batch has to be sent first to keep the order
+            self._batcher.flush()
+
+        if frames is None:
+            if inPool or self.ENCODE_IN_POOL:
+                self._pending.append([msg, None])
+                self._encodeNext()
+                return
+
+            frames = self._encode(msg)
+
+        if self._pending:
+            # Frames have to wait for the messages which are still encoded
+            self._pending.append([None, frames])
+        else:
+            self._write(frames)
+
+    def _encodeNext(self):
+        """ Internally used method to encode all pending messages in the
+            thread pool of the reactor.
+        """
+        if self._encoding:
+            return
+
+        entries = [entry for entry in self._pending if entry[1] is None]
+
+        if not entries:
+            return
+
+        reactor = self._connection.reactor
+        self._encoding = True
+        d = deferToThreadPool(reactor, reactor.getThreadPool(),
+                              map, self._encode, [msg for msg, _ in entries])
+        d.addCallback(self._encoded, entries)
+        d.addErrback(self._encodeFailed, entries)
+
+    def _encoded(self, encoded, entries):
+        """ Internally used method as callback for the thread pool as soon as
+            a group of messages has been encoded.
+        """
+        self._encoding = False
+
+        for entry, frames in zip(entries, encoded):
+            entry[0] = None
+            entry[1] = frames
+
+        pending = self._pending
 
-        for data in binaries:
-            binMsg = data[0] + data[1].getvalue()
-            WebSocketClientProtocol.sendMessage(self, binMsg, binary=True)
+        while pending and pending[0][1] is not None:
+            self._write(pending.popleft()[1])
+
+        self._encodeNext()
+
+    def _encodeFailed(self, failure, entries):
+        """ Internally used method as errback for the thread pool if a group
+            of messages could not be encoded.
+        """
+        print('Could not encode messages: {0}'.format(
+                                                failure.getErrorMessage()))
+        self._encoded([()] * len(entries), entries)
+
+    def _write(self, frames):
+        """ Internally used method to write the frames of an encoded message
+            to the WebSocket connection.
+        """
+        for data, binary in frames:
+            WebSocketClientProtocol.sendMessage(self, data, binary=binary)
 
     def onClose(self, *args):
         """ This method is called by twisted when the connection has been
@@ -125,6 +296,13 @@ class RCERobotProtocol(WebSocketClientProtocol):
             self._assembler.stop()
             self._registered = False
 
+        if self._batcher:
+            self._batcher.stop()
+            self._batcher = None
+
+        self._ring.clear()
+        self._pending.clear()
+
     def failHandshake(self, reason):
         """ This method is called by twisted when the connection could not be
             initialized.
@@ -137,7 +315,7 @@ class RCERobotFactory(WebSocketClientFactory):
     """ WebSocket protocol factory which is used for the communication with the
         Robot Manager.
     """
-    def __init__(self, url, conn):
+    def __init__(self, url, conn, protocols=PROTOCOLS):
         """ Initialize the factory.
 
             @param url:         URL of the Robot process.
@@ -146,8 +324,13 @@ class RCERobotFactory(WebSocketClientFactory):
             @param conn:        Connection instance which provides callback
                                 functions.
             @type  conn:        rce.comm.client.RCE
+
+            @param protocols:   Subprotocols which are offered to the Robot
+                                process in the order of preference.
+            @type  protocols:   [str]
         """
-        WebSocketClientFactory.__init__(self, url)
+        WebSocketClientFactory.__init__(self, url,
+                                        protocols=protocols)
         self._connection = conn
 
     def buildProtocol(self, addr):
@@ -174,7 +357,8 @@ class RCE(object):
     _SUFFIXES = ['Interface', 'Converter', 'Forwarder']
     _INTERFACES = [''.join(t) for t in itertools.product(_PREFIXES, _SUFFIXES)]
 
-    def __init__(self, receiver, userID, robotID, password, reactor):
+    def __init__(self, receiver, userID, robotID, password, reactor,
+                 protocols=None):
         """ Initialize the Connection.
 
             @param receiver:    Object which is responsible for the processing
@@ -196,17 +380,38 @@ class RCE(object):
             @param reactor:     Reference to reactor which is used for this
                                 connection.
             @type  reactor:     twisted::reactor
+
+            @param protocols:   Subprotocols which are offered to the Robot
+                                process in the order of preference, e.g.
+                                ['rce.sequence'] to use the codec which
+                                sends the binaries as separate frames. If
+                                None (default), all available codecs are
+                                offered (refer to rce.comm.codec).
+            @type  protocols:   [str] / None
         """
         verifyObject(IClient, receiver)
 
+        if protocols is None:
+            protocols = PROTOCOLS
+        else:
+            for protocol in protocols:
+                if protocol not in PROTOCOLS:
+                    raise ValueError("Subprotocol '{0}' is not "
+                                     'available.'.format(protocol))
+
         self._receiver = receiver
         self._userID = userID
         self._robotID = robotID
         self._password = sha256(password).hexdigest()
         self._reactor = reactor
+        self._protocols = list(protocols)
         self._conn = None
         self._connectedDeferred = None
 
+        # Tags of the interfaces which use the array mode
+        self._arrays = set()
+        self._deltas = {}
+
     @property
     def reactor(self):
         """ Reference to twisted::reactor. """
@@ -281,7 +486,8 @@ class RCE(object):
         # Make WebSocket connection to Robot Manager
         args = urlencode((('userID', self._userID), ('robotID', self._robotID),
                           ('password', self._password)))
-        factory = RCERobotFactory('{0}?{1}'.format(url, args), self)
+        factory = RCERobotFactory('{0}?{1}'.format(url, args), self,
+                                  self._protocols)
         connectWS(factory)
 
     def connect(self, masterUrl, deferred):
@@ -527,7 +733,8 @@ class RCE(object):
         param = {'containerTag':cTag, 'name':name}
         self._sendMessage(types.CONFIGURE_COMPONENT, {'deleteParam':[param]})
 
-    def addInterface(self, eTag, iTag, iType, iCls, addr=''):
+    def addInterface(self, eTag, iTag, iType, iCls, addr='', policy=None,
+                     compression=None, arrays=False, settings=None, delta=0):
         """ Add an interface.
 
             @param eTag:        Tag of endpoint to which the interface should
@@ -555,6 +762,49 @@ class RCE(object):
                                 the name under which the interface will be
                                 available in the local ROS environment.
             @type  addr:        str
+
+            @param policy:      Optional argument which defines how messages
+                                from the interface to the robot are handled
+                                while the connection is congested:
+                                    'latest', 'fifo' or 'reliable'
+                                By default Subscribers keep only the latest
+                                message and Services never drop a message.
+            @type  policy:      str
+
+            @param compression: Optional argument which defines how the
+                                binary messages of Forwarders are compressed:
+                                    'none', 'stream' or 'gzip'
+                                The mode 'stream' is only available for
+                                topics and requires the policy 'reliable'.
+                                The same mode has to be used for the local
+                                ROS interface.
+            @type  compression: str
+
+            @param arrays:      Optional argument which defines whether
+                                Converters send numeric arrays as typed binary
+                                blobs, which are received as numpy arrays,
+                                instead of lists (array mode).
+            @type  arrays:      bool
+
+            @param settings:    Optional argument which defines the settings
+                                of the custom Converters used by a Converter
+                                by message type, e.g.
+                                    { 'sensor_msgs/Image' : { 'format' : 'jpeg',
+                                                              'quality' : 80,
+                                                              'scale' : 0.5 } }
+            @type  settings:    { str : { str : value } }
+
+            @param delta:       Optional argument which defines the keyframe
+                                interval of the delta mode of Converters
+                                which send messages to the robot, i.e. a
+                                complete message is sent only every n-th
+                                message and else only the changed fields.
+                                The messages are restored before they are
+                                passed on. The default send policy becomes
+                                'reliable'; with another policy messages are
+                                dropped after a lost message until the next
+                                keyframe. (default: 0, i.e. disabled)
+            @type  delta:       int
         """
         print("Request addition of interface '{0}' of type '{1}' to endpoint "
               "'{2}'.".format(iTag, iType, eTag))
@@ -567,6 +817,27 @@ class RCE(object):
         if addr:
             iface['addr'] = addr
 
+        if policy:
+            iface['sendPolicy'] = policy
+
+        if compression:
+            iface['compression'] = compression
+
+        if arrays:
+            iface['arrays'] = True
+            self._arrays.add(iTag)
+        else:
+            self._arrays.discard(iTag)
+
+        if settings:
+            iface['converterSettings'] = settings
+
+        if delta:
+            iface['delta'] = int(delta)
+            self._deltas[iTag] = DeltaDecoder()
+        else:
+            self._deltas.pop(iTag, None)
+
         self._sendMessage(types.CONFIGURE_COMPONENT, {'addInterfaces':[iface]})
 
     def removeInterface(self, eTag, iTag):
@@ -582,6 +853,8 @@ class RCE(object):
         """
         print("Request removal of interface '{0}'.".format(iTag))
         iface = {'endpointTag':eTag, 'interfaceTag':iTag}
+        self._arrays.discard(iTag)
+        self._deltas.pop(iTag, None)
         self._sendMessage(types.CONFIGURE_COMPONENT,
                           {'removeInterfaces':[iface]})
 
@@ -611,6 +884,32 @@ class RCE(object):
         conn = {'tagA':tagA, 'tagB':tagB}
         self._sendMessage(types.CONFIGURE_CONNECTION, {'disconnect':[conn]})
 
+    def _processDataMessage(self, data):
+        """ Internally used method to process a received data message.
+        """
+        try:
+            iTag = data['iTag']
+            clsName = data['type']
+            rosMsg = data['msg']
+            msgID = data['msgID']
+        except KeyError as e:
+            raise ValueError('Received DATA message from robot process '
+                             'is missing the key {0}.'.format(e))
+
+        decoder = self._deltas.get(iTag)
+
+        if decoder:
+            rosMsg = decoder.decode(rosMsg)
+
+            if rosMsg is None:
+                # Diffs can not be applied until the next keyframe
+                return
+
+        if iTag in self._arrays:
+            rosMsg = unpackArrays(rosMsg)
+
+        self._receiver.processReceivedMessage(iTag, clsName, msgID, rosMsg)
+
     def receivedMessage(self, msg):
         """ Callback from RCERobotProtocol.
 
@@ -647,16 +946,10 @@ class RCE(object):
                 print('Received STATUS message with unknown content type: '
                       '{0}'.format(topic))
         elif msgType == types.DATA_MESSAGE:
-            try:
-                iTag = data['iTag']
-                clsName = data['type']
-                rosMsg = data['msg']
-                msgID = data['msgID']
-            except KeyError as e:
-                raise ValueError('Received DATA message from robot process '
-                                 'is missing the key {0}.'.format(e))
-
-            self._receiver.processReceivedMessage(iTag, clsName, msgID, rosMsg)
+            self._processDataMessage(data)
+        elif msgType == types.DATA_BATCH:
+            for dataMsg in data:
+                self._processDataMessage(dataMsg)
         else:
             print('Received message with unknown message type: '
                   '{0}'.format(msgType))
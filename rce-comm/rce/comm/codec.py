@@ -0,0 +1,321 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     rce-comm/rce/comm/codec.py
+#
+#     This file is part of the RoboEarth Cloud Engine framework.
+#
+#     This file was originally created for RoboEearth
+#     http://www.roboearth.org/
+#
+#     The research leading to these results has received funding from
+#     the European Union Seventh Framework Programme FP7/2007-2013 under
+#     grant agreement no248942 RoboEarth.
+#
+#     Copyright 2013 RoboEarth
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+#     \author/s: Dominique Hunziker
+#
+#
+
+""" Codecs which can be negotiated for the RCE Client Protocol:
+
+        rce.msgpack     MessagePack encoded messages; each message is sent as
+                        a single binary frame and binaries are embedded
+                        natively as MessagePack extension type.
+                        (only available if 'msgpack' is installed)
+
+        rce.envelope    JSON encoded messages; messages with binaries are sent
+                        as an envelope (refer to rce.comm.envelope).
+
+        rce.sequence    JSON encoded messages; binaries are sent as separate
+                        frames directly after the message, which references
+                        them using sequence numbers. Every binary frame
+                        starts with its sequence number as a 4 byte unsigned
+                        integer in network byte order.
+
+    If no codec can be negotiated, the JSON encoded multi-frame format is used,
+    where the binaries are sent as separate frames and have to be matched using
+    the rce.comm.assembler.MessageAssembler.
+"""
+
+# Python specific imports
+import json
+import struct
+from collections import deque
+
+try:
+    from cStringIO import StringIO, InputType, OutputType
+    from StringIO import StringIO as pyStringIO
+
+    def _checkIsStringIO(obj):
+        return isinstance(obj, (InputType, OutputType, pyStringIO))
+except ImportError:
+    from StringIO import StringIO
+
+    def _checkIsStringIO(obj):
+        return isinstance(obj, StringIO)
+
+try:
+    from msgpack import packb, unpackb, ExtType
+    HAS_MSGPACK = True
+except ImportError:
+    HAS_MSGPACK = False
+
+# zope specific imports
+from zope.interface import implements
+
+# rce specific imports
+from rce.comm.error import InvalidRequest
+from rce.comm.binary import BinaryBuffer
+from rce.comm.envelope import PROTOCOL as ENVELOPE_PROTOCOL
+from rce.comm.assembler import disassembleMessage, assembleEnvelope, \
+    recursiveBinarySearch, recursiveURISearch
+from rce.comm.interfaces import ICodec
+from rce.util.interface import verifyClass
+
+
+class JSONEnvelopeCodec(object):
+    """ Codec which uses JSON and the envelope format to send messages.
+    """
+    implements(ICodec)
+
+    PROTOCOL = ENVELOPE_PROTOCOL
+
+    def encode(self, msg):
+        return disassembleMessage(msg, True)
+
+    encode.__doc__ = ICodec.get('encode').getDoc()
+
+    def decode(self, data, binary):
+        if binary:
+            return assembleEnvelope(data)
+
+        try:
+            return json.loads(data)
+        except ValueError:
+            raise InvalidRequest('Message is not in valid JSON format.')
+
+    decode.__doc__ = ICodec.get('decode').getDoc()
+
+
+verifyClass(ICodec, JSONEnvelopeCodec)
+
+
+class SequencedCodec(object):
+    """ Codec which uses JSON and sends the binaries as separate frames which
+        are referenced using sequence numbers.
+
+        As the frames are delivered in order, the binaries are matched with
+        the references of the preceding message by position; the sequence
+        number is only used to verify the match.
+    """
+    implements(ICodec)
+
+    PROTOCOL = 'rce.sequence'
+
+    _HEADER = struct.Struct('!I')
+    _HALF = 0x7fffffff
+
+    def __init__(self):
+        self._seq = 0
+
+        # Message which waits for its binaries and the missing references
+        self._msg = None
+        self._refs = deque()
+
+    def _nextSeq(self):
+        """ Internally used method to generate the next sequence number.
+        """
+        seq = self._seq
+        self._seq = (seq + 1) & 0xffffffff
+        return seq
+
+    def encode(self, msg):
+        uriBinary, msg = recursiveBinarySearch(msg, self._nextSeq)
+        frames = [(json.dumps(msg), False)]
+        pack = self._HEADER.pack
+        frames.extend((pack(seq) + binary.getvalue(), True)
+                      for seq, binary in uriBinary)
+        return frames
+
+    encode.__doc__ = ICodec.get('encode').getDoc()
+
+    def decode(self, data, binary):
+        if binary:
+            if not self._refs:
+                raise InvalidRequest('Received binary which is not '
+                                     'referenced by a message.')
+
+            if len(data) < self._HEADER.size:
+                raise InvalidRequest('Binary message is truncated.')
+
+            seq, parent, key = self._refs.popleft()
+
+            if self._HEADER.unpack_from(data)[0] != seq:
+                self._msg = None
+                self._refs.clear()
+                raise InvalidRequest('Received binary does not match the '
+                                     'expected sequence number.')
+
+            parent[key] = BinaryBuffer(data, self._HEADER.size)
+
+            if self._refs:
+                return None
+
+            msg = self._msg
+            self._msg = None
+            return msg
+
+        if self._refs:
+            self._msg = None
+            self._refs.clear()
+            raise InvalidRequest('Received message before all binaries of '
+                                 'the previous message.')
+
+        try:
+            msg = json.loads(data)
+        except ValueError:
+            raise InvalidRequest('Message is not in valid JSON format.')
+
+        refs = recursiveURISearch(msg)
+
+        if not refs:
+            return msg
+
+        for seq, _, _ in refs:
+            if not isinstance(seq, (int, long)):
+                raise InvalidRequest('Message contains an invalid reference '
+                                     'to a binary.')
+
+        # The binaries are sent in the order of their sequence numbers, which
+        # might wrap around within the message
+        base = min(seq for seq, _, _ in refs)
+
+        if max(seq for seq, _, _ in refs) - base > self._HALF:
+            base = min(seq for seq, _, _ in refs if seq > self._HALF)
+
+        refs.sort(key=lambda ref: (ref[0] - base) & 0xffffffff)
+        self._msg = msg
+        self._refs.extend(refs)
+        return None
+
+    decode.__doc__ = ICodec.get('decode').getDoc()
+
+
+verifyClass(ICodec, SequencedCodec)
+
+
+if HAS_MSGPACK:
+    class MsgPackCodec(object):
+        """ Codec which uses MessagePack to send messages.
+        """
+        implements(ICodec)
+
+        PROTOCOL = 'rce.msgpack'
+
+        # MessagePack extension type code used for binaries
+        _BINARY_EXT = 1
+
+        @staticmethod
+        def _packBinary(obj):
+            """ Internally used method to pack StringIO instances.
+            """
+            if _checkIsStringIO(obj):
+                return ExtType(MsgPackCodec._BINARY_EXT, obj.getvalue())
+
+            raise TypeError('Object of type {0} can not be '
+                            'serialized.'.format(type(obj).__name__))
+
+        @staticmethod
+        def _unpackBinary(code, data):
+            """ Internally used method to unpack binaries into StringIO
+                instances.
+            """
+            if code != MsgPackCodec._BINARY_EXT:
+                raise InvalidRequest('Message contains an unknown extension '
+                                     'type.')
+
+            return BinaryBuffer(data)
+
+        def encode(self, msg):
+            return [(packb(msg, default=self._packBinary), True)]
+
+        encode.__doc__ = ICodec.get('encode').getDoc()
+
+        def decode(self, data, binary):
+            if not binary:
+                try:
+                    return json.loads(data)
+                except ValueError:
+                    raise InvalidRequest('Message is not in valid JSON '
+                                         'format.')
+
+            try:
+                return unpackb(data, ext_hook=self._unpackBinary)
+            except InvalidRequest:
+                raise
+            except Exception:
+                raise InvalidRequest('Message is not in valid MessagePack '
+                                     'format.')
+
+        decode.__doc__ = ICodec.get('decode').getDoc()
+
+
+    verifyClass(ICodec, MsgPackCodec)
+
+    _CODECS = (MsgPackCodec, JSONEnvelopeCodec, SequencedCodec)
+else:
+    _CODECS = (JSONEnvelopeCodec, SequencedCodec)
+
+
+# Subprotocols of all available codecs in the order of preference
+PROTOCOLS = [codec.PROTOCOL for codec in _CODECS]
+
+
+def selectProtocol(protocols):
+    """ Select the subprotocol which should be used for a connection.
+
+        @param protocols:       Subprotocols offered by the client in the
+                                order of preference.
+        @type  protocols:       [str]
+
+        @return:                First offered subprotocol for which a codec is
+                                available or None, if there is no match.
+        @rtype:                 str / None
+    """
+    for protocol in protocols:
+        if protocol in PROTOCOLS:
+            return protocol
+
+    return None
+
+
+def getCodec(protocol):
+    """ Get a new codec instance for the negotiated subprotocol.
+
+        @param protocol:        Subprotocol which has been negotiated for the
+                                connection.
+        @type  protocol:        str / None
+
+        @return:                New codec instance or None, if the legacy
+                                multi-frame format should be used.
+        @rtype:                 rce.comm.interfaces.ICodec / None
+    """
+    for codec in _CODECS:
+        if codec.PROTOCOL == protocol:
+            return codec()
+
+    return None
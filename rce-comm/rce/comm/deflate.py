@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     rce-comm/rce/comm/deflate.py
+#
+#     This file is part of the RoboEarth Cloud Engine framework.
+#
+#     This file was originally created for RoboEearth
+#     http://www.roboearth.org/
+#
+#     The research leading to these results has received funding from
+#     the European Union Seventh Framework Programme FP7/2007-2013 under
+#     grant agreement no248942 RoboEarth.
+#
+#     Copyright 2013 RoboEarth
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+#     \author/s: Dominique Hunziker
+#
+#
+
+""" Compression of the binary messages of the Forwarders.
+
+    Each Forwarder selects one of the following compression modes:
+
+        none        The serialized ROS message is sent as it is. This should be
+                    used for already compressed data, e.g. JPEG images.
+        stream      The messages of an interface form a single deflate stream,
+                    where every message is terminated with a sync flush. The
+                    sliding window is shared across messages, which improves
+                    the ratio for small and repetitive messages. The messages
+                    have to be delivered in order and without loss; therefore,
+                    the mode can only be used for topics.
+        gzip        Every message is compressed on its own.
+
+    Both sides of an interface have to use the same mode and have to reset
+    the stream whenever the interface is (re-)started.
+"""
+
+# Python specific imports
+import time
+import zlib
+
+# rce specific imports
+from rce.comm import types
+
+
+COMPRESSIONS = (types.COMPRESSION_NONE, types.COMPRESSION_STREAM,
+                types.COMPRESSION_GZIP)
+
+
+class _Statistics(object):
+    """ Base class which keeps track of the compression ratio and the used CPU
+        time.
+    """
+    def __init__(self, mode):
+        """ Initialize the statistics.
+
+            @param mode:        Compression mode.
+            @type  mode:        str
+        """
+        if mode not in COMPRESSIONS:
+            raise ValueError("Compression mode '{0}' is not "
+                             'supported.'.format(mode))
+
+        self._mode = mode
+        self._rawBytes = 0
+        self._compressedBytes = 0
+        self._cpuTime = 0.0
+
+    @property
+    def mode(self):
+        """ Compression mode. """
+        return self._mode
+
+    @property
+    def rawBytes(self):
+        """ Number of uncompressed bytes. """
+        return self._rawBytes
+
+    @property
+    def compressedBytes(self):
+        """ Number of compressed bytes. """
+        return self._compressedBytes
+
+    @property
+    def cpuTime(self):
+        """ CPU time in seconds used for the compression/decompression. """
+        return self._cpuTime
+
+    @property
+    def ratio(self):
+        """ Compression ratio, i.e. uncompressed bytes per compressed byte. """
+        if not self._compressedBytes:
+            return 1.0
+
+        return float(self._rawBytes) / self._compressedBytes
+
+    def __str__(self):
+        return ('{0}: {1} -> {2} bytes (ratio {3:.2f}), {4:.3f} s '
+                'CPU'.format(self._mode, self._rawBytes, self._compressedBytes,
+                             self.ratio, self._cpuTime))
+
+
+class Compressor(_Statistics):
+    """ Compressor for the outgoing messages of an interface.
+    """
+    def __init__(self, mode, level):
+        """ Initialize the compressor.
+
+            @param mode:        Compression mode.
+            @type  mode:        str
+
+            @param level:       Compression level (1: fastest; 9: slowest, best
+                                compression)
+            @type  level:       int
+        """
+        _Statistics.__init__(self, mode)
+
+        self._level = level
+        self._stream = None
+        self.reset()
+
+    def reset(self):
+        """ Reset the deflate stream.
+        """
+        if self._mode == types.COMPRESSION_STREAM:
+            self._stream = zlib.compressobj(self._level)
+
+    def compress(self, data):
+        """ Compress a message.
+
+            @param data:        Serialized message.
+            @type  data:        str
+
+            @return:            Compressed message.
+            @rtype:             str
+        """
+        if self._mode == types.COMPRESSION_NONE:
+            return data
+
+        start = time.clock()
+
+        if self._mode == types.COMPRESSION_STREAM:
+            compressed = (self._stream.compress(data) +
+                          self._stream.flush(zlib.Z_SYNC_FLUSH))
+        else:
+            compressed = zlib.compress(data, self._level)
+
+        self._cpuTime += time.clock() - start
+        self._rawBytes += len(data)
+        self._compressedBytes += len(compressed)
+
+        return compressed
+
+
+class Decompressor(_Statistics):
+    """ Decompressor for the incoming messages of an interface.
+    """
+    def __init__(self, mode):
+        """ Initialize the decompressor.
+
+            @param mode:        Compression mode.
+            @type  mode:        str
+        """
+        _Statistics.__init__(self, mode)
+
+        self._stream = None
+        self.reset()
+
+    def reset(self):
+        """ Reset the deflate stream.
+        """
+        if self._mode == types.COMPRESSION_STREAM:
+            self._stream = zlib.decompressobj()
+
+    def decompress(self, data):
+        """ Decompress a message.
+
+            @param data:        Compressed message.
+            @type  data:        str / buffer
+
+            @return:            Serialized message.
+            @rtype:             str
+        """
+        if self._mode == types.COMPRESSION_NONE:
+            return str(data)
+
+        start = time.clock()
+
+        if self._mode == types.COMPRESSION_STREAM:
+            raw = self._stream.decompress(data)
+        else:
+            raw = zlib.decompress(data)
+
+        self._cpuTime += time.clock() - start
+        self._rawBytes += len(raw)
+        self._compressedBytes += len(data)
+
+        return raw
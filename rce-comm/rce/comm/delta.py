@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     rce-comm/rce/comm/delta.py
+#
+#     This file is part of the RoboEarth Cloud Engine framework.
+#
+#     This file was originally created for RoboEearth
+#     http://www.roboearth.org/
+#
+#     The research leading to these results has received funding from
+#     the European Union Seventh Framework Programme FP7/2007-2013 under
+#     grant agreement no248942 RoboEarth.
+#
+#     Copyright 2013 RoboEarth
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+#     \author/s: Dominique Hunziker
+#
+#
+
+""" Delta encoding of the messages which are sent from the Converters to the
+    robot.
+
+    In delta mode an interface sends a keyframe, i.e. the complete message,
+    every n-th message and else only the fields which changed compared to
+    the previous message:
+
+        { 'seq' : int, 'key'  : message }
+        { 'seq' : int, 'diff' : { path : value } }
+
+    The path of a field consists of the keys of the nested dictionaries and
+    the indices of lists of dictionaries joined by '.', e.g.
+    'pose.pose.position.x' or 'status.2.level'. Binaries are always sent.
+
+    The sequence number is incremented for every message. If a message is
+    missing, the receiver drops the diffs until the next keyframe. Both
+    sides have to reset their state whenever the connection is
+    (re-)established.
+"""
+
+try:
+    from cStringIO import InputType, OutputType
+    from StringIO import StringIO as pyStringIO
+
+    def _checkIsStringIO(obj):
+        return isinstance(obj, (InputType, OutputType, pyStringIO))
+except ImportError:
+    from StringIO import StringIO
+
+    def _checkIsStringIO(obj):
+        return isinstance(obj, StringIO)
+
+
+class _Mismatch(Exception):
+    """ Internally used exception to signal that the structure of a message
+        changed and a keyframe has to be sent.
+    """
+
+
+def _copy(obj):
+    """ Internally used function to copy the dictionaries and lists of a
+        message; all other values are shared.
+    """
+    if isinstance(obj, dict):
+        return dict((key, _copy(value)) for key, value in obj.iteritems())
+
+    if isinstance(obj, list):
+        if obj and isinstance(obj[0], (dict, list)):
+            return [_copy(value) for value in obj]
+
+        return list(obj)
+
+    return obj
+
+
+def _diff(old, new, prefix, out):
+    """ Internally used function to collect the fields of the dictionary
+        'new' which differ from the dictionary 'old'.
+    """
+    if len(old) != len(new):
+        raise _Mismatch()
+
+    for key, value in new.iteritems():
+        try:
+            prev = old[key]
+        except KeyError:
+            raise _Mismatch()
+
+        path = prefix + key
+
+        if isinstance(value, dict):
+            if not isinstance(prev, dict):
+                raise _Mismatch()
+
+            _diff(prev, value, path + '.', out)
+        elif (isinstance(value, list) and value and
+              isinstance(value[0], dict) and isinstance(prev, list) and
+              len(prev) == len(value)):
+            for i, (p, v) in enumerate(zip(prev, value)):
+                if isinstance(v, dict) and isinstance(p, dict):
+                    _diff(p, v, '{0}.{1}.'.format(path, i), out)
+                elif p != v:
+                    out['{0}.{1}'.format(path, i)] = v
+        elif _checkIsStringIO(value) or value != prev:
+            out[path] = value
+
+
+class DeltaEncoder(object):
+    """ Encoder for the outgoing messages of an interface.
+    """
+    def __init__(self, interval):
+        """ Initialize the encoder.
+
+            @param interval:    Number of messages after which a keyframe is
+                                sent.
+            @type  interval:    int
+        """
+        if interval < 1:
+            raise ValueError('Keyframe interval has to be at least 1.')
+
+        self._interval = interval
+        self.reset()
+
+    def reset(self):
+        """ Reset the encoder such that the next message is a keyframe.
+        """
+        self._seq = 0
+        self._prev = None
+
+    def encode(self, msg):
+        """ Encode a message.
+
+            @param msg:         JSON compatible message.
+            @type  msg:         { str : {} / base_types / StringIO } / StringIO
+
+            @return:            Keyframe or diff.
+            @rtype:             dict
+        """
+        seq = self._seq
+        self._seq += 1
+
+        if (self._prev is not None and seq % self._interval and
+                isinstance(msg, dict)):
+            diff = {}
+
+            try:
+                _diff(self._prev, msg, '', diff)
+            except _Mismatch:
+                pass
+            else:
+                self._prev = _copy(msg)
+                return {'seq':seq, 'diff':diff}
+
+        # The message is modified while it is sent; keep a copy
+        self._prev = _copy(msg) if isinstance(msg, dict) else None
+        return {'seq':seq, 'key':msg}
+
+
+class DeltaDecoder(object):
+    """ Decoder for the incoming messages of an interface.
+    """
+    def __init__(self):
+        """ Initialize the decoder.
+        """
+        self.reset()
+
+    def reset(self):
+        """ Reset the decoder such that diffs are dropped until the next
+            keyframe.
+        """
+        self._seq = None
+        self._msg = None
+
+    def decode(self, data):
+        """ Decode a message.
+
+            @param data:        Keyframe or diff.
+            @type  data:        dict
+
+            @return:            Complete message or None, if the message can
+                                not be restored, i.e. a previous message is
+                                missing. The containers of the message are
+                                not shared with other messages.
+            @rtype:             { str : {} / base_types / StringIO } / StringIO
+                                / None
+
+            @raise:             ValueError
+        """
+        try:
+            seq = data['seq']
+        except (KeyError, TypeError):
+            raise ValueError('Message is not delta encoded.')
+
+        if 'key' in data:
+            msg = data['key']
+
+            if not isinstance(msg, dict):
+                self.reset()
+                return msg
+
+            self._msg = msg
+        elif 'diff' in data:
+            if self._msg is None or seq != self._seq + 1:
+                self.reset()
+                return None
+
+            try:
+                for path, value in data['diff'].iteritems():
+                    keys = path.split('.')
+                    node = self._msg
+
+                    for key in keys[:-1]:
+                        node = node[int(key) if isinstance(node, list)
+                                    else key]
+
+                    key = keys[-1]
+                    node[int(key) if isinstance(node, list) else key] = value
+            except (KeyError, IndexError, ValueError, TypeError):
+                self.reset()
+                raise ValueError('Diff does not match the previous message.')
+        else:
+            raise ValueError('Message is not delta encoded.')
+
+        self._seq = seq
+        return _copy(self._msg)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     rce-comm/rce/comm/envelope.py
+#
+#     This file is part of the RoboEarth Cloud Engine framework.
+#
+#     This file was originally created for RoboEearth
+#     http://www.roboearth.org/
+#
+#     The research leading to these results has received funding from
+#     the European Union Seventh Framework Programme FP7/2007-2013 under
+#     grant agreement no248942 RoboEarth.
+#
+#     Copyright 2013 RoboEarth
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+#     \author/s: Dominique Hunziker
+#
+#
+
+""" Envelope wire format of the RCE Client Protocol:
+
+        The envelope format is used if the WebSocket subprotocol 'rce.envelope'
+        has been negotiated during the handshake. Messages without any binary
+        parts are still sent as JSON encoded text frames; messages with binary
+        parts are packed together with all their binaries into a single binary
+        frame:
+
+            flags           1 byte      (unsigned char, reserved; 0)
+            header length   4 bytes     (unsigned int, network byte order)
+            header          n bytes     (JSON encoded message)
+
+        followed by each binary as
+
+            length          4 bytes     (unsigned int, network byte order)
+            data            n bytes
+
+        In the header the binaries are referenced by their position in the
+        frame, i.e. a StringIO instance stored under the key 'key' is replaced
+        by the key/value pair 'key*' : index.
+"""
+
+# Python specific imports
+import struct
+
+# rce specific imports
+from rce.comm.error import InvalidRequest
+
+
+PROTOCOL = 'rce.envelope'
+
+_HEADER = struct.Struct('!BI')
+_BLOB = struct.Struct('!I')
+
+
+def packEnvelope(header, binaries):
+    """ Pack a JSON encoded message and its binaries into an envelope.
+
+        @param header:          JSON encoded message where the binaries have
+                                been replaced by their index.
+        @type  header:          str
+
+        @param binaries:        Binaries which are referenced in the message
+                                in the order matching the indices.
+        @type  binaries:        [ StringIO ]
+
+        @return:                Envelope which can be sent as a single binary
+                                frame.
+        @rtype:                 str
+    """
+    parts = [_HEADER.pack(0, len(header)), header]
+
+    for binary in binaries:
+        data = binary.getvalue()
+        parts.append(_BLOB.pack(len(data)))
+        parts.append(data)
+
+    return ''.join(parts)
+
+
+def unpackEnvelope(frame):
+    """ Unpack an envelope into the JSON encoded message and its binaries.
+
+        @param frame:           Envelope which was received as a binary frame.
+        @type  frame:           str
+
+        @return:                JSON encoded message and the list of binaries
+                                in the order of their indices. The binaries
+                                are returned as read-only buffers into the
+                                frame to avoid copying the data.
+        @rtype:                 (str, [buffer])
+
+        @raise:                 rce.comm.error.InvalidRequest
+    """
+    size = len(frame)
+
+    try:
+        _, length = _HEADER.unpack_from(frame, 0)
+    except struct.error:
+        raise InvalidRequest('Envelope is missing the header.')
+
+    offset = _HEADER.size + length
+
+    if offset > size:
+        raise InvalidRequest('Envelope header is truncated.')
+
+    header = frame[_HEADER.size:offset]
+    binaries = []
+
+    while offset < size:
+        try:
+            length, = _BLOB.unpack_from(frame, offset)
+        except struct.error:
+            raise InvalidRequest('Envelope binary is missing the length.')
+
+        offset += _BLOB.size
+
+        if offset + length > size:
+            raise InvalidRequest('Envelope binary is truncated.')
+
+        binaries.append(buffer(frame, offset, length))
+        offset += length
+
+    return header, binaries
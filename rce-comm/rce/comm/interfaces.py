@@ -31,7 +31,7 @@
 #
 
 # zope specific imports
-from zope.interface import Interface
+from zope.interface import Interface, Attribute
 
 
 class IMasterRealm(Interface):
@@ -151,6 +151,14 @@ class IProtocol(Interface):
         """ Request that the protocol drops the connection to the client.
         """
 
+    def getStats():  #@NoSelf
+        """ Get the statistics of the connection to the client.
+
+            @return:            Statistics of the message assembler and the
+                                outbound scheduler of the connection.
+            @rtype:             { str : { str : int } }
+        """
+
 
 class IRobot(Interface):
     """ Interface which the Robot Avatar has to implement.
@@ -371,3 +379,43 @@ class IClient(IMessageReceiver):
                                 be active or not.
             @type  status:      bool
         """
+
+
+class ICodec(Interface):
+    """ Interface which a codec has to implement which is used to serialize
+        the messages of the RCE client protocol.
+    """
+    PROTOCOL = Attribute("""
+    Name of the WebSocket subprotocol which is used to negotiate the codec.
+    """)
+
+    def encode(msg):  #@NoSelf
+        """ Serialize a message such that it can be sent using the WebSocket
+            connection.
+
+            @param msg:         Message which should be sent. Binary parts of
+                                the message are given as StringIO instances.
+            @type  msg:         { str : {} / base_types / StringIO }
+
+            @return:            List of tuples containing the frame and a flag
+                                indicating whether the frame is binary.
+            @rtype:             [ (str, bool) ]
+        """
+
+    def decode(data, binary):  #@NoSelf
+        """ Deserialize a frame which was received using the WebSocket
+            connection.
+
+            @param data:        Frame which was received.
+            @type  data:        str
+
+            @param binary:      Flag which is True if the frame is binary.
+            @type  binary:      bool
+
+            @return:            Received message where binary parts are
+                                given as StringIO instances or None, if the
+                                frame does not yet complete a message.
+            @rtype:             { str : {} / base_types / StringIO } / None
+
+            @raise:             rce.comm.error.InvalidRequest
+        """
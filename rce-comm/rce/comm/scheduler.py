@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     rce-comm/rce/comm/scheduler.py
+#
+#     This file is part of the RoboEarth Cloud Engine framework.
+#
+#     This file was originally created for RoboEearth
+#     http://www.roboearth.org/
+#
+#     The research leading to these results has received funding from
+#     the European Union Seventh Framework Programme FP7/2007-2013 under
+#     grant agreement no248942 RoboEarth.
+#
+#     Copyright 2013 RoboEarth
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+#     \author/s: Dominique Hunziker
+#
+#
+
+""" Outbound scheduler of the robot WebSocket connection.
+
+    The scheduler is registered as a streaming producer with the transport of
+    the connection. As long as the transport accepts data, messages are written
+    straight away. Once the transport buffer is full, the transport pauses the
+    scheduler and the messages are queued until the transport resumes it. While
+    the messages are queued, the send policy of the interface, from which a
+    message originates, decides which messages are dropped:
+
+        latest      Only the most recent message of the interface is kept.
+        fifo        At most FIFO_SIZE messages of the interface are kept; the
+                    oldest message is dropped.
+        reliable    Messages are never dropped.
+"""
+
+# Python specific imports
+from collections import deque
+
+# zope specific imports
+from zope.interface import implements
+
+# twisted specific imports
+from twisted.python import log
+from twisted.internet.interfaces import IPushProducer
+
+# rce specific imports
+from rce.comm import types
+from rce.comm.error import InvalidRequest
+
+
+POLICIES = (types.SEND_POLICY_LATEST, types.SEND_POLICY_FIFO,
+            types.SEND_POLICY_RELIABLE)
+
+
+def defaultPolicy(iType):
+    """ Get the send policy which is used for an interface if the robot did not
+        specify one.
+
+        @param iType:           Type of the interface,
+                                e.g. 'SubscriberConverter'
+        @type  iType:           str
+
+        @return:                Send policy; topics keep only the latest
+                                message, services never drop messages.
+        @rtype:                 str
+    """
+    if iType.startswith('Subscriber'):
+        return types.SEND_POLICY_LATEST
+
+    return types.SEND_POLICY_RELIABLE
+
+
+class _Entry(object):
+    """ Queued message. The frames are set to None if the message is dropped
+        while it is still in the queue.
+    """
+    __slots__ = ['iTag', 'frames', 'size']
+
+    def __init__(self, iTag, frames):
+        self.iTag = iTag
+        self.frames = frames
+        self.size = sum(len(data) for data, _ in frames)
+
+
+class OutboundScheduler(object):
+    """ Scheduler for all messages which are sent over a WebSocket connection.
+    """
+    implements(IPushProducer)
+
+    # CONFIG
+    FIFO_SIZE = 10
+
+    def __init__(self, write):
+        """ Initialize the scheduler.
+
+            @param write:       Callable which is used to write a single frame
+                                to the connection. The callable has to take
+                                the two arguments 'data' and 'binary'.
+            @type  write:       callable
+        """
+        self._write = write
+        self._paused = False
+        self._stopped = False
+
+        self._queue = deque()
+        self._queued = {}
+        self._policies = {}
+
+        self._queuedBytes = 0
+        self._droppedBytes = 0
+        self._droppedMsgs = 0
+
+    @property
+    def congested(self):
+        """ Flag which is True if messages are currently queued. """
+        return self._paused or bool(self._queue)
+
+    @property
+    def queuedBytes(self):
+        """ Number of bytes which are currently queued. """
+        return self._queuedBytes
+
+    @property
+    def droppedBytes(self):
+        """ Number of bytes which have been dropped since the connection has
+            been established.
+        """
+        return self._droppedBytes
+
+    @property
+    def droppedMessages(self):
+        """ Number of messages which have been dropped since the connection has
+            been established.
+        """
+        return self._droppedMsgs
+
+    @property
+    def stats(self):
+        """ Statistics of the scheduler as a dictionary:
+                queuedBytes     Bytes which are currently queued
+                droppedBytes    Bytes which have been dropped
+                droppedMessages Number of messages which have been dropped
+        """
+        return {'queuedBytes' : self._queuedBytes,
+                'droppedBytes' : self._droppedBytes,
+                'droppedMessages' : self._droppedMsgs}
+
+    def setPolicy(self, iTag, policy):
+        """ Set the send policy of an interface.
+
+            @param iTag:        Tag of the interface.
+            @type  iTag:        str
+
+            @param policy:      Send policy; one of 'latest', 'fifo' or
+                                'reliable'.
+            @type  policy:      str
+        """
+        if policy not in POLICIES:
+            raise InvalidRequest("Send policy '{0}' is not "
+                                 'supported.'.format(policy))
+
+        self._policies[iTag] = policy
+
+    def removePolicy(self, iTag):
+        """ Remove the send policy of an interface. Already queued messages
+            of the interface are still sent.
+
+            @param iTag:        Tag of the interface.
+            @type  iTag:        str
+        """
+        self._policies.pop(iTag, None)
+
+    def send(self, frames, iTag=None):
+        """ Send a message or queue it if the connection is congested.
+
+            @param frames:      Frames of the message as returned by the
+                                codec, i.e. a list of tuples (data, binary).
+            @type  frames:      [(str, bool)]
+
+            @param iTag:        Tag of the interface from which the message
+                                originates or None, if the message is not a
+                                data message. Messages without interface are
+                                never dropped.
+            @type  iTag:        str / None
+        """
+        if self._stopped:
+            return
+
+        if not (self._paused or self._queue):
+            self._writeFrames(frames)
+            return
+
+        entry = _Entry(iTag, frames)
+        policy = self._policies.get(iTag, types.SEND_POLICY_RELIABLE)
+
+        if policy != types.SEND_POLICY_RELIABLE:
+            queued = self._queued.setdefault(iTag, deque())
+
+            if policy == types.SEND_POLICY_LATEST:
+                limit = 1
+            else:
+                limit = self.FIFO_SIZE
+
+            while len(queued) >= limit:
+                self._drop(queued.popleft())
+
+            queued.append(entry)
+
+        self._queue.append(entry)
+        self._queuedBytes += entry.size
+
+    def _drop(self, entry):
+        """ Internally used method to drop a queued message.
+        """
+        entry.frames = None
+        self._queuedBytes -= entry.size
+        self._droppedBytes += entry.size
+        self._droppedMsgs += 1
+
+    def _writeFrames(self, frames):
+        """ Internally used method to write the frames of a message.
+        """
+        for data, binary in frames:
+            self._write(data, binary)
+
+    def _flush(self):
+        """ Internally used method to write queued messages until the
+            transport is congested again or the queue is empty.
+        """
+        while self._queue and not (self._paused or self._stopped):
+            entry = self._queue.popleft()
+
+            if entry.frames is None:
+                continue
+
+            if entry.iTag in self._queued:
+                queued = self._queued[entry.iTag]
+                queued.remove(entry)
+
+                if not queued:
+                    del self._queued[entry.iTag]
+
+            self._queuedBytes -= entry.size
+            self._writeFrames(entry.frames)
+
+    def pauseProducing(self):
+        """ Called by the transport when its buffer is full.
+        """
+        self._paused = True
+
+    def resumeProducing(self):
+        """ Called by the transport when its buffer has been drained.
+        """
+        self._paused = False
+        self._flush()
+
+    def stopProducing(self):
+        """ Called by the transport when the connection is lost; all queued
+            messages are discarded.
+        """
+        self._stopped = True
+
+        if self._droppedMsgs or self._queuedBytes:
+            log.msg('Outbound scheduler dropped {0} messages ({1} bytes); '
+                    '{2} bytes were still queued.'.format(self._droppedMsgs,
+                                                         self._droppedBytes,
+                                                         self._queuedBytes))
+
+        self._queue.clear()
+        self._queued.clear()
+        self._queuedBytes = 0
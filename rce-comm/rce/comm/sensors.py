@@ -0,0 +1,500 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     rce-comm/rce/comm/sensors.py
+#
+#     This file is part of the RoboEarth Cloud Engine framework.
+#
+#     This file was originally created for RoboEearth
+#     http://www.roboearth.org/
+#
+#     The research leading to these results has received funding from
+#     the European Union Seventh Framework Programme FP7/2007-2013 under
+#     grant agreement no248942 RoboEarth.
+#
+#     Copyright 2013 RoboEarth
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+#     \author/s: Dominique Hunziker
+#
+#
+
+""" Point clouds and laser scans are sent as packed binary blobs instead of
+    JSON messages. A blob starts with
+
+        magic (4 bytes), version (uint8), flags (uint8)
+
+    followed by the body, which is compressed using deflate if the flag
+    FLAG_DEFLATE is set. The body starts with the ROS header
+
+        seq, secs, nsecs (uint32), frame_id (uint16 length + bytes)
+
+    followed by the message specific part. All values are little endian.
+
+    Point cloud (magic 'RCEC'):
+        height, width (uint32), is_dense (uint8), number of fields (uint8)
+        for each field:
+            name (uint8 length + bytes), datatype (uint8), storage type
+            (uint8), count (uint32), scale (float64)
+        for each field:
+            elements of all points in the storage type
+
+        The types are the datatype constants of sensor_msgs/PointField. If
+        the scale is not 0 the elements are fixed-point values, i.e. the
+        value is element * scale, and the smallest value of the storage
+        type marks non-finite values.
+
+    Laser scan (magic 'RCES'):
+        angle_min, angle_max, angle_increment, time_increment, scan_time,
+        range_min, range_max (float32), number of ranges and of intensities
+        (uint32), scale (float64)
+        ranges (float32 or, if the scale is not 0, uint16 fixed-point values
+        where RANGE_INVALID marks non-finite ranges), intensities (float32)
+
+    Packing requires numpy; unpacking falls back to tuples without numpy.
+"""
+
+# Python specific imports
+import zlib
+import struct
+
+# numpy specific imports; if available
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# rce specific imports
+from rce.comm.binary import BinaryBuffer, getView
+
+
+VERSION = 1
+FLAG_DEFLATE = 0x01
+
+MAGIC_CLOUD = 'RCEC'
+MAGIC_SCAN = 'RCES'
+
+# Datatype constants of sensor_msgs/PointField
+INT8 = 1
+UINT8 = 2
+INT16 = 3
+UINT16 = 4
+INT32 = 5
+UINT32 = 6
+FLOAT32 = 7
+FLOAT64 = 8
+
+# Mapping from the datatype constants to the numpy type strings
+DTYPES = { INT8    : '|i1',
+           UINT8   : '|u1',
+           INT16   : '<i2',
+           UINT16  : '<u2',
+           INT32   : '<i4',
+           UINT32  : '<u4',
+           FLOAT32 : '<f4',
+           FLOAT64 : '<f8' }
+
+# struct format characters which are used if numpy is not available
+_FORMATS = { INT8 : 'b', UINT8 : 'B', INT16 : 'h', UINT16 : 'H', INT32 : 'i',
+             UINT32 : 'I', FLOAT32 : 'f', FLOAT64 : 'd' }
+
+# Fixed-point range which marks a non-finite range of a laser scan
+RANGE_INVALID = 0xffff
+
+_PREFIX = struct.Struct('<4sBB')
+_HEADER = struct.Struct('<IIIH')
+_CLOUD = struct.Struct('<IIBB')
+_FIELD = struct.Struct('<BBId')
+_SCAN = struct.Struct('<7fIId')
+
+
+def _requireNumpy():
+    if not numpy:
+        raise ValueError('Packing of sensor messages requires numpy.')
+
+
+def _pack(magic, parts, level):
+    """ Internally used function to assemble a blob.
+    """
+    body = ''.join(parts)
+    flags = 0
+
+    if level:
+        body = zlib.compress(body, level)
+        flags |= FLAG_DEFLATE
+
+    return BinaryBuffer(_PREFIX.pack(magic, VERSION, flags) + body)
+
+
+def _unpack(magic, blob):
+    """ Internally used function to get the body of a blob.
+    """
+    data = getView(blob)
+
+    if len(data) < _PREFIX.size:
+        raise ValueError('Blob is too short.')
+
+    blobMagic, version, flags = _PREFIX.unpack_from(data)
+
+    if blobMagic != magic:
+        raise ValueError('Blob does not contain the expected message type.')
+
+    if version != VERSION:
+        raise ValueError('Blob version {0} is not supported.'.format(version))
+
+    if flags & FLAG_DEFLATE:
+        try:
+            return zlib.decompress(buffer(data, _PREFIX.size))
+        except zlib.error as e:
+            raise ValueError('Blob could not be decompressed: {0}'.format(e))
+
+    return buffer(data, _PREFIX.size)
+
+
+def _packHeader(header):
+    seq, secs, nsecs, frameID = header
+    frameID = str(frameID)
+    return _HEADER.pack(seq, secs, nsecs, len(frameID)) + frameID
+
+
+def _unpackHeader(data, offset):
+    seq, secs, nsecs, size = _HEADER.unpack_from(data, offset)
+    offset += _HEADER.size
+    return (seq, secs, nsecs, str(data[offset:offset + size])), offset + size
+
+
+def _readArray(data, offset, datatype, count):
+    """ Internally used function to read an array of the given datatype.
+
+        @return:                Array and the offset after the array.
+        @rtype:                 (numpy.ndarray / tuple, int)
+    """
+    size = count * struct.calcsize(_FORMATS[datatype])
+
+    if offset + size > len(data):
+        raise ValueError('Blob is too short.')
+
+    if numpy:
+        values = numpy.frombuffer(data, DTYPES[datatype], count, offset)
+    else:
+        values = struct.unpack_from('<{0}{1}'.format(count,
+                                                    _FORMATS[datatype]),
+                                    data, offset)
+
+    return values, offset + size
+
+
+def quantize(values, scale):
+    """ Convert floating point values to fixed-point values.
+
+        @param values:          Values which should be converted.
+        @type  values:          numpy.ndarray
+
+        @param scale:           Resolution of the fixed-point values.
+        @type  scale:           float
+
+        @return:                Datatype of the fixed-point values (INT16 or
+                                INT32) and the fixed-point values. The
+                                smallest value of the datatype marks
+                                non-finite values.
+        @rtype:                 (int, numpy.ndarray)
+    """
+    _requireNumpy()
+
+    scaled = numpy.asarray(values, numpy.float64) / scale
+    finite = numpy.isfinite(scaled)
+    extreme = numpy.abs(scaled[finite]).max() if finite.any() else 0
+
+    datatype = INT16 if extreme < 0x7fff else INT32
+    info = numpy.iinfo(DTYPES[datatype])
+
+    fixed = numpy.empty(scaled.shape, DTYPES[datatype])
+
+    with numpy.errstate(invalid='ignore'):
+        numpy.rint(numpy.clip(scaled, info.min + 1, info.max), out=fixed,
+                   casting='unsafe', where=finite)
+
+    fixed[~finite] = info.min
+    return datatype, fixed
+
+
+def dequantize(values, datatype, scale):
+    """ Convert fixed-point values to floating point values.
+
+        @return:                Floating point values; non-finite values
+                                are NaN.
+        @rtype:                 numpy.ndarray / tuple
+    """
+    invalid = -(1 << (struct.calcsize(_FORMATS[datatype]) * 8 - 1))
+
+    if numpy:
+        result = values * scale
+        result[values == invalid] = numpy.nan
+        return result
+
+    nan = float('nan')
+    return tuple(nan if v == invalid else v * scale for v in values)
+
+
+def packPointCloud(header, height, width, isDense, fields, resolution=0.0,
+                   quantized=('x', 'y', 'z'), level=0):
+    """ Pack a point cloud into a blob.
+
+        @param header:          ROS header as a tuple of the form
+                                (seq, secs, nsecs, frame_id).
+        @type  header:          (int, int, int, str)
+
+        @param height:          Height of the point cloud.
+        @type  height:          int
+
+        @param width:           Width of the point cloud.
+        @type  width:           int
+
+        @param isDense:         Flag whether the point cloud contains only
+                                finite points.
+        @type  isDense:         bool
+
+        @param fields:          Fields of the point cloud as a list of tuples
+                                of the form (name, datatype, values), where
+                                'values' has the shape (points,) or
+                                (points, count).
+        @type  fields:          [(str, int, numpy.ndarray)]
+
+        @param resolution:      Resolution of the fixed-point values of the
+                                quantized fields; 0 disables quantization.
+        @type  resolution:      float
+
+        @param quantized:       Names of the floating point fields which are
+                                quantized.
+        @type  quantized:       [str]
+
+        @param level:           Deflate compression level; 0 disables the
+                                compression.
+        @type  level:           int
+
+        @return:                Blob.
+        @rtype:                 rce.comm.binary.BinaryBuffer
+
+        @raise:                 ValueError
+    """
+    _requireNumpy()
+
+    if len(fields) > 0xff:
+        raise ValueError('Point cloud has too many fields.')
+
+    desc = [_packHeader(header),
+            _CLOUD.pack(height, width, bool(isDense), len(fields))]
+    data = []
+
+    for name, datatype, values in fields:
+        values = numpy.asarray(values)
+        count = values.shape[1] if values.ndim > 1 else 1
+        scale = 0.0
+        storage = datatype
+
+        if (resolution and name in quantized and
+                datatype in (FLOAT32, FLOAT64)):
+            scale = float(resolution)
+            storage, values = quantize(values, scale)
+        else:
+            values = values.astype(DTYPES[datatype], copy=False)
+
+        if len(values) != height * width:
+            raise ValueError("Field '{0}' does not match the size of the "
+                             'point cloud.'.format(name))
+
+        name = str(name)
+        desc.append(struct.pack('<B', len(name)) + name)
+        desc.append(_FIELD.pack(datatype, storage, count, scale))
+        data.append(numpy.ascontiguousarray(values).tostring())
+
+    return _pack(MAGIC_CLOUD, desc + data, level)
+
+
+def unpackPointCloud(blob):
+    """ Unpack a blob which contains a point cloud.
+
+        @param blob:            Blob.
+        @type  blob:            StringIO / rce.comm.binary.BinaryBuffer
+
+        @return:                Point cloud as a dictionary of the form
+                                    { 'header'   : (seq, secs, nsecs,
+                                                    frame_id),
+                                      'height'   : int,
+                                      'width'    : int,
+                                      'is_dense' : bool,
+                                      'fields'   : [(name, datatype,
+                                                     values)] }
+                                where 'values' has the shape (points,) or
+                                (points, count). Quantized fields are
+                                returned as floating point values.
+        @rtype:                 dict
+
+        @raise:                 ValueError
+    """
+    data = _unpack(MAGIC_CLOUD, blob)
+
+    try:
+        header, offset = _unpackHeader(data, 0)
+        height, width, isDense, n = _CLOUD.unpack_from(data, offset)
+        offset += _CLOUD.size
+
+        desc = []
+
+        for _ in xrange(n):
+            size = ord(data[offset])
+            name = str(data[offset + 1:offset + 1 + size])
+            offset += 1 + size
+            datatype, storage, count, scale = _FIELD.unpack_from(data, offset)
+            offset += _FIELD.size
+
+            if datatype not in DTYPES or storage not in DTYPES:
+                raise ValueError("Field '{0}' has an unknown "
+                                 'datatype.'.format(name))
+
+            desc.append((name, datatype, storage, count, scale))
+    except struct.error:
+        raise ValueError('Blob is too short.')
+
+    points = height * width
+    fields = []
+
+    for name, datatype, storage, count, scale in desc:
+        values, offset = _readArray(data, offset, storage, points * count)
+
+        if scale:
+            values = dequantize(values, storage, scale)
+
+            if numpy:
+                values = values.astype(DTYPES[datatype])
+
+        if numpy and count > 1:
+            values = values.reshape(points, count)
+
+        fields.append((name, datatype, values))
+
+    return {'header':header, 'height':height, 'width':width,
+            'is_dense':bool(isDense), 'fields':fields}
+
+
+def packLaserScan(header, params, ranges, intensities, resolution=0.0,
+                  level=0):
+    """ Pack a laser scan into a blob.
+
+        @param header:          ROS header as a tuple of the form
+                                (seq, secs, nsecs, frame_id).
+        @type  header:          (int, int, int, str)
+
+        @param params:          Parameters of the laser scan, i.e.
+                                (angle_min, angle_max, angle_increment,
+                                 time_increment, scan_time, range_min,
+                                 range_max).
+        @type  params:          (float, ) * 7
+
+        @param ranges:          Ranges of the laser scan.
+        @type  ranges:          numpy.ndarray / [float]
+
+        @param intensities:     Intensities of the laser scan.
+        @type  intensities:     numpy.ndarray / [float]
+
+        @param resolution:      Resolution of the fixed-point ranges; 0
+                                disables quantization.
+        @type  resolution:      float
+
+        @param level:           Deflate compression level; 0 disables the
+                                compression.
+        @type  level:           int
+
+        @return:                Blob.
+        @rtype:                 rce.comm.binary.BinaryBuffer
+
+        @raise:                 ValueError
+    """
+    _requireNumpy()
+
+    ranges = numpy.asarray(ranges, numpy.float64)
+    intensities = numpy.asarray(intensities, '<f4')
+
+    if resolution:
+        scaled = ranges / resolution
+        valid = numpy.isfinite(scaled)
+        fixed = numpy.empty(ranges.shape, '<u2')
+
+        with numpy.errstate(invalid='ignore'):
+            numpy.rint(numpy.clip(scaled, 0, RANGE_INVALID - 1), out=fixed,
+                       casting='unsafe', where=valid)
+
+        fixed[~valid] = RANGE_INVALID
+    else:
+        fixed = ranges.astype('<f4')
+
+    return _pack(MAGIC_SCAN, [_packHeader(header),
+                              _SCAN.pack(*(tuple(params) +
+                                           (len(ranges), len(intensities),
+                                            float(resolution)))),
+                              fixed.tostring(), intensities.tostring()],
+                 level)
+
+
+def unpackLaserScan(blob):
+    """ Unpack a blob which contains a laser scan.
+
+        @param blob:            Blob.
+        @type  blob:            StringIO / rce.comm.binary.BinaryBuffer
+
+        @return:                Laser scan as a dictionary with the keys
+                                'header' (seq, secs, nsecs, frame_id),
+                                'angle_min', 'angle_max', 'angle_increment',
+                                'time_increment', 'scan_time', 'range_min',
+                                'range_max', 'ranges' and 'intensities'.
+                                Quantized ranges are returned as floating
+                                point values; non-finite ranges are inf.
+        @rtype:                 dict
+
+        @raise:                 ValueError
+    """
+    data = _unpack(MAGIC_SCAN, blob)
+
+    try:
+        header, offset = _unpackHeader(data, 0)
+        values = _SCAN.unpack_from(data, offset)
+        offset += _SCAN.size
+    except struct.error:
+        raise ValueError('Blob is too short.')
+
+    nRanges, nIntensities, scale = values[7:]
+
+    if scale:
+        ranges, offset = _readArray(data, offset, UINT16, nRanges)
+
+        if numpy:
+            fixed = ranges
+            ranges = fixed * numpy.float32(scale)
+            ranges[fixed == RANGE_INVALID] = numpy.inf
+        else:
+            inf = float('inf')
+            ranges = tuple(inf if r == RANGE_INVALID else r * scale
+                           for r in ranges)
+    else:
+        ranges, offset = _readArray(data, offset, FLOAT32, nRanges)
+
+    intensities, _ = _readArray(data, offset, FLOAT32, nIntensities)
+
+    scan = dict(zip(('angle_min', 'angle_max', 'angle_increment',
+                     'time_increment', 'scan_time', 'range_min', 'range_max'),
+                    values[:7]))
+    scan['header'] = header
+    scan['ranges'] = ranges
+    scan['intensities'] = intensities
+    return scan
@@ -57,7 +57,12 @@ from autobahn.websocket import HttpException, \
 from rce.comm import types
 from rce.comm._version import MINIMAL_VERSION, CURRENT_VERSION
 from rce.comm.error import InvalidRequest, DeadConnection
-from rce.comm.assembler import recursiveBinarySearch, MessageAssembler
+from rce.comm.assembler import disassembleMessage, uriGenerator, \
+    MessageAssembler
+from rce.comm.batch import MessageBatcher
+from rce.comm.codec import selectProtocol, getCodec
+from rce.comm.deflate import COMPRESSIONS
+from rce.comm.scheduler import OutboundScheduler, defaultPolicy
 from rce.comm.interfaces import IMasterRealm, IRobotRealm, \
     IProtocol, IRobot, IMessageReceiver
 from rce.util.interface import verifyObject
@@ -199,6 +204,10 @@ class RobotWebSocketProtocol(WebSocketServerProtocol):
         self._realm = realm
         self._assembler = MessageAssembler(self, self.MSG_QUEUE_TIMEOUT)
         self._avatar = None
+        self._codec = None
+        self._uriGen = uriGenerator()
+        self._scheduler = OutboundScheduler(self._writeFrame)
+        self._batcher = None
 
     def onConnect(self, req):
         """ Method is called by the Autobahn engine when a request to establish
@@ -227,22 +236,35 @@ class RobotWebSocketProtocol(WebSocketServerProtocol):
                                     "Parameter '{0}' has to be unique in "
                                     'request.'.format(name))
 
+        protocol = selectProtocol(req.protocols)
+
         d = self._realm.login(userID[0], robotID[0], password[0])
-        d.addCallback(self._authenticate_success)
+        d.addCallback(self._authenticate_success, protocol)
         d.addErrback(self._authenticate_failed)
         return d
 
-    def _authenticate_success(self, avatar):
+    def _authenticate_success(self, avatar, protocol):
         """ Method is called by deferred when the connection has been
             successfully authenticated while being in 'onConnect'.
+
+            @return:        Subprotocol which has been selected for the
+                            connection or None, if the client does not
+                            support any of the available subprotocols.
         """
         verifyObject(IRobot, avatar)
         verifyObject(IMessageReceiver, avatar)
 
         self._realm.registerWebsocketProtocol(avatar, self)
         self._avatar = avatar
+        self._codec = getCodec(protocol)
         self._assembler.start()
 
+        # Only robots which negotiated a codec know about batch messages
+        if self._codec:
+            self._batcher = MessageBatcher(self._sendBatch)
+
+        return protocol
+
     def _authenticate_failed(self, e):
         """ Method is called by deferred when the connection could not been
             authenticated while being in 'onConnect'.
@@ -260,6 +282,12 @@ class RobotWebSocketProtocol(WebSocketServerProtocol):
 
         return Failure(HttpException(code, msg))
 
+    def onOpen(self):
+        """ Method is called by the Autobahn engine when the connection has
+            been established.
+        """
+        self.transport.registerProducer(self._scheduler, True)
+
     def processCompleteMessage(self, msg):
         """ Process complete messages by calling the appropriate handler for
             the manager. (Called by rce.comm.assembler.MessageAssembler)
@@ -272,6 +300,8 @@ class RobotWebSocketProtocol(WebSocketServerProtocol):
 
         if msgType == types.DATA_MESSAGE:
             self._process_DataMessage(data)
+        elif msgType == types.DATA_BATCH:
+            self._process_DataBatch(data)
         elif msgType == types.CONFIGURE_COMPONENT:
             self._process_configureComponent(data)
         elif msgType == types.CONFIGURE_CONNECTION:
@@ -331,11 +361,59 @@ class RobotWebSocketProtocol(WebSocketServerProtocol):
 
         for conf in data.pop('addInterfaces', []):
             try:
+                iType = conf['interfaceType']
+                compression = conf.get('compression')
+
+                try:
+                    delta = int(conf.get('delta', 0))
+                except (TypeError, ValueError):
+                    raise InvalidRequest('Keyframe interval of the delta mode '
+                                         'has to be an integer.')
+
+                if delta < 0:
+                    raise InvalidRequest('Keyframe interval of the delta mode '
+                                         'can not be negative.')
+
+                if delta and not iType.endswith('Converter'):
+                    raise InvalidRequest('Delta mode can only be used for '
+                                         'Converters.')
+
+                if compression == types.COMPRESSION_STREAM or delta:
+                    # A deflate stream breaks if a message is dropped; in
+                    # delta mode the robot has to wait for the next keyframe
+                    policy = conf.get('sendPolicy',
+                                      types.SEND_POLICY_RELIABLE)
+                else:
+                    policy = conf.get('sendPolicy', defaultPolicy(iType))
+
+                arrays = bool(conf.get('arrays', False))
+
+                if arrays and not iType.endswith('Converter'):
+                    raise InvalidRequest('Array mode can only be used for '
+                                         'Converters.')
+
+                settings = conf.get('converterSettings')
+
+                if settings:
+                    if not iType.endswith('Converter'):
+                        raise InvalidRequest('Converter settings can only be '
+                                             'used for Converters.')
+
+                    if not isinstance(settings, dict):
+                        raise InvalidRequest('Converter settings have to be '
+                                             'a dictionary.')
+
+                self._checkCompression(iType, compression, policy)
+                self._scheduler.setPolicy(conf['interfaceTag'], policy)
                 self._avatar.addInterface(conf['endpointTag'],
                                           conf['interfaceTag'],
-                                          conf['interfaceType'],
+                                          iType,
                                           conf['className'],
-                                          conf.get('addr', ''))
+                                          conf.get('addr', ''),
+                                          compression,
+                                          arrays,
+                                          settings,
+                                          delta)
             except KeyError as e:
                 raise InvalidRequest("Can not process 'ConfigureComponent' "
                                      "request. 'addInterfaces' is missing "
@@ -345,6 +423,7 @@ class RobotWebSocketProtocol(WebSocketServerProtocol):
             try:
                 self._avatar.removeInterface(conf['endpointTag'],
                                              conf['interfaceTag'])
+                self._scheduler.removePolicy(conf['interfaceTag'])
             except KeyError as e:
                 raise InvalidRequest("Can not process 'ConfigureComponent' "
                                      "request. 'removeInterfaces' is missing "
@@ -369,6 +448,27 @@ class RobotWebSocketProtocol(WebSocketServerProtocol):
                                      "request. 'deleteParam' is missing key: "
                                      '{0}'.format(e))
 
+    @staticmethod
+    def _checkCompression(iType, compression, policy):
+        """ Internally used method to check whether the compression mode which
+            has been requested for an interface can be used.
+        """
+        if not compression:
+            return
+
+        if compression not in COMPRESSIONS:
+            raise InvalidRequest("Compression mode '{0}' is not "
+                                 'supported.'.format(compression))
+
+        if compression == types.COMPRESSION_STREAM:
+            if not iType.startswith(('Publisher', 'Subscriber')):
+                raise InvalidRequest("Compression mode 'stream' can only be "
+                                     'used for topics.')
+
+            if policy != types.SEND_POLICY_RELIABLE:
+                raise InvalidRequest("Compression mode 'stream' requires the "
+                                     "send policy 'reliable'.")
+
     def _process_configureConnection(self, data):
         """ Internally used method to process a request to configure
             connections.
@@ -407,6 +507,16 @@ class RobotWebSocketProtocol(WebSocketServerProtocol):
 
         self._avatar.processReceivedMessage(iTag, mType, msgID, msg)
 
+    def _process_DataBatch(self, data):
+        """ Internally used method to process a batch of data messages.
+        """
+        if not isinstance(data, list):
+            raise InvalidRequest("Can not process 'DataBatch' request. "
+                                 'Data has to be a list.')
+
+        for dataMsg in data:
+            self._process_DataMessage(dataMsg)
+
     def onMessage(self, msg, binary):
         """ Method is called by the Autobahn engine when a message has been
             received from the client.
@@ -422,7 +532,13 @@ class RobotWebSocketProtocol(WebSocketServerProtocol):
 #              '(binary={0})'.format(binary))
 
         try:
-            self._assembler.processMessage(msg, binary)
+            if self._codec:
+                msg = self._codec.decode(msg, binary)
+
+                if msg is not None:
+                    self.processCompleteMessage(msg)
+            else:
+                self._assembler.processMessage(msg, binary)
         except InvalidRequest as e:
             self.sendErrorMessage('Invalid Request: {0}'.format(e))
         except DeadConnection:
@@ -433,7 +549,13 @@ class RobotWebSocketProtocol(WebSocketServerProtocol):
             traceback.print_exc()
             self.sendErrorMessage('Fatal Error')
 
-    def sendMessage(self, msg):
+    def _writeFrame(self, data, binary):
+        """ Internally used method to write a single frame to the connection.
+            (Called by rce.comm.scheduler.OutboundScheduler)
+        """
+        WebSocketServerProtocol.sendMessage(self, data, binary=binary)
+
+    def sendMessage(self, msg, iTag=None):
         """ Internally used method to send a message to the robot.
 
             Should not be used from outside the Protocol; instead use the
@@ -442,14 +564,33 @@ class RobotWebSocketProtocol(WebSocketServerProtocol):
             (Overwrites method from autobahn.websocket.WebSocketServerProtocol)
 
             @param msg:     Message which should be sent.
+
+            @param iTag:    Tag of the interface from which the message
+                            originates, which selects the send policy used
+                            while the connection is congested.
+            @type  iTag:    str / None
         """
-        uriBinary, msgURI = recursiveBinarySearch(msg)
+        if self._batcher:
+            # Pending batch has to be sent first to keep the order
+            self._batcher.flush()
 
-        WebSocketServerProtocol.sendMessage(self, json.dumps(msgURI))
+        if self._codec:
+            frames = self._codec.encode(msg)
+        else:
+            frames = disassembleMessage(msg, uriGen=self._uriGen)
+
+        self._scheduler.send(frames, iTag)
 
-        for binData in uriBinary:
-            WebSocketServerProtocol.sendMessage(self,
-                binData[0] + binData[1].getvalue(), binary=True)
+    def _sendBatch(self, batch):
+        """ Internally used method to send a batch of data messages.
+            (Called by rce.comm.batch.MessageBatcher)
+        """
+        if len(batch) == 1:
+            data = batch[0]
+            self.sendMessage({'type' : types.DATA_MESSAGE, 'data' : data},
+                             data['iTag'])
+        else:
+            self.sendMessage({'type' : types.DATA_BATCH, 'data' : batch})
 
     def sendDataMessage(self, iTag, clsName, msgID, msg):
         """ Callback for Connection object to send a data message to the robot
@@ -475,9 +616,15 @@ class RobotWebSocketProtocol(WebSocketServerProtocol):
                                 instance which is interpreted as binary data.
             @type  msg:         {str : {} / base_types / StringIO} / StringIO
         """
-        self.sendMessage({'type' : types.DATA_MESSAGE,
-                          'data' : {'iTag' : iTag, 'type' : clsName,
-                                    'msgID' : msgID, 'msg' : msg}})
+        data = {'iTag' : iTag, 'type' : clsName, 'msgID' : msgID, 'msg' : msg}
+
+        # While the connection is congested the messages are queued
+        # individually such that the send policies can be applied
+        if (self._batcher and not self._scheduler.congested and
+            self._batcher.add(data)):
+            return
+
+        self.sendMessage({'type' : types.DATA_MESSAGE, 'data' : data}, iTag)
 
     def sendInterfaceStatusUpdateMessage(self, iTag, status):
         """ Callback for Connection object to send a interface status message to
@@ -504,6 +651,16 @@ class RobotWebSocketProtocol(WebSocketServerProtocol):
         """
         self.sendMessage({'type' : types.ERROR, 'data' : msg})
 
+    def getStats(self):
+        stats = {'sendQueue' : self._scheduler.stats}
+
+        if self._assembler:
+            stats['assembler'] = self._assembler.stats
+
+        return stats
+
+    getStats.__doc__ = IProtocol.get('getStats').getDoc()
+
     def onClose(self, wasClean, code, reason):
         """ Method is called by the Autobahn engine when the connection has
             been lost.
@@ -513,8 +670,12 @@ class RobotWebSocketProtocol(WebSocketServerProtocol):
 
         self._assembler.stop()
 
+        if self._batcher:
+            self._batcher.stop()
+
         self._avatar = None
         self._assembler = None
+        self._batcher = None
 
 
 class CloudEngineWebSocketFactory(WebSocketServerFactory):
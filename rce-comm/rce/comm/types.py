@@ -39,6 +39,7 @@
         CX      Change connections between Interfaces
 
         DM      ROS Message
+        DB      Batch of ROS Messages
 
         ST      Status message
         ER      Error message
@@ -47,6 +48,22 @@
     Content Types of RCE Client Status Messages (ST):
 
         iu      Interface status update
+
+
+    Send Policies of RCE Client Interfaces, which define how messages are
+    handled while the connection to the robot is congested:
+
+        latest      Only the most recent message is kept
+        fifo        Bounded queue where the oldest message is dropped
+        reliable    Messages are never dropped
+
+
+    Compression Modes of the binary messages of RCE Client Forwarders:
+
+        none        Messages are not compressed
+        stream      Messages are compressed using one deflate stream per
+                    interface, i.e. a sliding window shared across messages
+        gzip        Every message is compressed on its own
 """
 
 CREATE_CONTAINER = 'CC'
@@ -56,8 +73,17 @@ CONFIGURE_COMPONENT = 'CN'
 CONFIGURE_CONNECTION = 'CX'
 
 DATA_MESSAGE = 'DM'
+DATA_BATCH = 'DB'
 
 STATUS = 'ST'
 ERROR = 'ER'
 
 STATUS_INTERFACE = 'iu'
+
+SEND_POLICY_LATEST = 'latest'
+SEND_POLICY_FIFO = 'fifo'
+SEND_POLICY_RELIABLE = 'reliable'
+
+COMPRESSION_NONE = 'none'
+COMPRESSION_STREAM = 'stream'
+COMPRESSION_GZIP = 'gzip'
@@ -358,6 +358,7 @@ class RobotOptions(CustomOptions):
     """
     optParameters = (
         ("username", "u", None, "List Robots by Username"),
+        ("stats", "s", None, "Connection Statistics of Robot by ID"),
     )
     optFlags = (
         ("list", "l", "List all Robots"),
@@ -753,6 +754,9 @@ class ConsoleClient(HistoricRecvLine):
             elif config['username']:
                 self.callToUserAndDisplay('list_robots_by_user', 'admin',
                                           config['username'])
+            elif config['stats']:
+                self.callToUserAndDisplay('stats_robot', 'console',
+                                          config['stats'])
 
     def cmd_MACHINE(self, line):
         """ Handler for machine command.
@@ -63,6 +63,15 @@ class Robot(Namespace):
         """
         return self._endpoint.getWebsocketAddress()
 
+    def getStats(self):
+        """ Get the statistics of the WebSocket connection of the robot.
+
+            @return:            Statistics of the connection.
+                                (type: { str : { str : int } })
+            @rtype:             twisted.internet.defer.Deferred
+        """
+        return self.callRemote('getStats')
+
 
 class RobotEndpoint(Endpoint):
     """ Representation of an endpoint which is a process that acts as a server
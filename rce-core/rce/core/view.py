@@ -407,6 +407,27 @@ class MonitorView(Viewable):
         """
         return user.robots.keys()
 
+    def view_stats_robot(self, user, robotID):
+        """ Remote call to get the statistics of the connection of a robot.
+
+            @param user:        User who owns the robot.
+            @type  user:        rce.core.user.User
+
+            @param robotID:     Robot ID of the robot.
+            @type  robotID:     str
+
+            @return:            Statistics of the message assembler and the
+                                outbound scheduler of the connection.
+                                (type: { str : { str : int } })
+            @rtype:             twisted.internet.defer.Deferred
+        """
+        try:
+            robot = user.robots[robotID]
+        except KeyError:
+            raise InvalidRequest('Robot {0} does not exist.'.format(robotID))
+
+        return robot.getStats()
+
     def view_get_rosapi_connect_info(self, user, tag):
         """ Remote call to get ROSAPI request URL and key for a particular
             container.
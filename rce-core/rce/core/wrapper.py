@@ -123,6 +123,16 @@ class Robot(_Wrapper):
         d.addCallback(lambda addr: addr)
         return d
 
+    def getStats(self):
+        """ Get the statistics of the WebSocket connection of the robot, i.e.
+            of the message assembler and the outbound scheduler.
+
+            @return:            Statistics of the connection.
+                                (type: { str : { str : int } })
+            @rtype:             twisted.internet.defer.Deferred
+        """
+        return self._obj.getStats()
+
     def addInterface(self, iTag, iType, clsName):
         """ Add an interface to the Robot object.
 
@@ -31,6 +31,7 @@
 #
 
 # Python specific imports
+from collections import deque
 from threading import Event, Lock
 from uuid import uuid4
 
@@ -253,10 +254,24 @@ class PublisherInterface(_ROSInterfaceBase):
 
 class SubscriberInterface(_ROSInterfaceBase):
     """ Class which is used as a Subscriber Interface.
+
+        While a connected protocol is congested only the latest received
+        message is kept for this protocol and sent as soon as its congestion
+        is resolved. The other protocols are not held back.
     """
     def __init__(self, owner, uid, clsName, addr):
         _ROSInterfaceBase.__init__(self, owner, uid, clsName, ('TS', addr))
 
+        # Messages received from ROS which have to be sent by the reactor
+        self._queueLock = Lock()
+        self._queue = deque()
+        self._scheduled = False
+
+        # Key:    protocol which is congested
+        # Value:  tuple (message, message ID) of the latest message which
+        #         has to be sent to the protocol
+        self._slots = {}
+
     def _start(self):
         self._subscriber = rospy.Subscriber(self._addr[1], rospy.AnyMsg,
                                             self._callback)
@@ -264,6 +279,57 @@ class SubscriberInterface(_ROSInterfaceBase):
     def _stop(self):
         self._subscriber.unregister()
         self._subscriber = None
+        self._slots = {}
+
+        with self._queueLock:
+            self._queue.clear()
+            self._scheduled = False
+
+    def _resume(self):
+        slots = self._slots
+
+        for protocol in slots.keys():
+            if protocol not in self._protocols:
+                del slots[protocol]
+            elif not protocol.isCongested(self):
+                msg, msgID = slots.pop(protocol)
+                protocol.sendMessage(self, msg, msgID)
 
     def _callback(self, msg):
-        self._reactor.callFromThread(self.received, msg._buff, uuid4().hex)
+        with self._queueLock:
+            self._queue.append(msg._buff)
+
+            # A flush is already scheduled
+            if self._scheduled:
+                return
+
+            self._scheduled = True
+
+        self._reactor.callFromThread(self._flush)
+
+    def _flush(self):
+        """ Internally used method to send the received messages to all
+            protocols which are not congested and to keep only the latest
+            message for the congested protocols.
+        """
+        with self._queueLock:
+            msgs, self._queue = self._queue, deque()
+            self._scheduled = False
+
+        if not self._ready:
+            return
+
+        slots = self._slots
+
+        for msg in msgs:
+            msgID = uuid4().hex
+
+            for protocol in self._protocols:
+                if protocol.isCongested(self):
+                    # Replaces an older message which has not yet been sent
+                    slots[protocol] = (msg, msgID)
+                else:
+                    if protocol in slots:
+                        protocol.sendMessage(self, *slots.pop(protocol))
+
+                    protocol.sendMessage(self, msg, msgID)
@@ -46,8 +46,15 @@ except ImportError:
     def _checkIsStringIO(obj):
         return isinstance(obj, StringIO)
 
+# twisted specific imports
+from twisted.python import log
+
 # rce specific imports
+from rce.comm import types
+from rce.comm.binary import BinaryBuffer, getView
+from rce.comm.deflate import Compressor, Decompressor
 from rce.util.error import InternalError
+from rce.util.executor import QueueFull
 from rce.slave.interface import Interface, InvalidResoureName
 from rce.util.settings import getSettings
 settings = getSettings()
@@ -108,6 +115,19 @@ class _ConverterBase(_AbstractRobotInterface):
         _AbstractRobotInterface.__init__(self, owner, uid, clsName, tag)
 
         self._converter = owner.converter
+        self._arrays = owner.getArrayMode(tag)
+
+        converterSettings = owner.getConverterSettings(tag)
+
+        if converterSettings:
+            try:
+                self._converter = self._converter.configure(converterSettings)
+            except (TypeError, ValueError) as e:
+                raise ConversionError('Invalid converter settings: '
+                                      '{0}'.format(e))
+
+        # Large messages are converted off the reactor thread
+        self._queue = owner.executor.createQueue(tag)
 
         self._inputMsgCls = None
         self._outputMsgCls = None
@@ -154,16 +174,12 @@ class _ConverterBase(_AbstractRobotInterface):
                                      'used message type for this interface.')
 
         try:
-            msg = self._converter.decode(self._inputMsgCls, msg)
-        except (TypeError, ValueError) as e:
+            self._queue.convert(self._converter, 'decodeSerialized',
+                                self._inputMsgCls, (msg,), self._receive,
+                                msgID)
+        except (QueueFull, TypeError, ValueError) as e:
             raise ConversionError(str(e))
 
-        buf = StringIO()
-        msg.serialize(buf)
-        msg = buf.getvalue()
-
-        self._receive(msg, msgID)
-
     def _send(self, msg, msgID, protocol, remoteID):
         """ Convert a ROS message into a JSON encoded message.
 
@@ -185,15 +201,16 @@ class _ConverterBase(_AbstractRobotInterface):
             raise InternalError('This converter can not handle outgoing '
                                 'messages.')
 
-        rosMsg = self._outputMsgCls()
-        rosMsg.deserialize(msg)
-
         try:
-            jsonMsg = self._converter.encode(rosMsg)
-        except (TypeError, ValueError) as e:
+            self._queue.convert(self._converter, 'encodeSerialized',
+                                self._outputMsgCls, (msg, self._arrays),
+                                self._sendToClient, msgID, protocol, remoteID)
+        except (QueueFull, TypeError, ValueError) as e:
             raise ConversionError(str(e))
 
-        self._sendToClient(jsonMsg, msgID, protocol, remoteID)
+    def _stop(self):
+        self._queue.clear()
+        _AbstractRobotInterface._stop(self)
 
 
 class _ForwarderBase(_AbstractRobotInterface):
@@ -203,6 +220,43 @@ class _ForwarderBase(_AbstractRobotInterface):
     """
     _GZIP_LVL = settings.gzip_lvl
 
+    def __init__(self, owner, uid, clsName, tag):
+        _AbstractRobotInterface.__init__(self, owner, uid, clsName, tag)
+
+        mode = owner.getCompression(tag)
+
+        if not mode:
+            if self._GZIP_LVL:
+                mode = types.COMPRESSION_GZIP
+            else:
+                mode = types.COMPRESSION_NONE
+
+        self._compressor = Compressor(mode, self._GZIP_LVL or
+                                            zlib.Z_DEFAULT_COMPRESSION)
+        self._decompressor = Decompressor(mode)
+
+    __init__.__doc__ = _AbstractRobotInterface.__init__.__doc__
+
+    def _start(self):
+        # The robot resets its streams as well when it receives the status
+        # update
+        self._compressor.reset()
+        self._decompressor.reset()
+        _AbstractRobotInterface._start(self)
+
+    def remote_destroy(self):
+        if self._compressor.rawBytes:
+            log.msg("Interface '{0}' sent {1}".format(self._addr,
+                                                      self._compressor))
+
+        if self._decompressor.rawBytes:
+            log.msg("Interface '{0}' received {1}".format(self._addr,
+                                                          self._decompressor))
+
+        _AbstractRobotInterface.remote_destroy(self)
+
+    remote_destroy.__doc__ = _AbstractRobotInterface.remote_destroy.__doc__
+
     def receive(self, clsName, msgID, msg):
         """ Unwrap and inflate a JSON encoded ROS message.
 
@@ -224,10 +278,7 @@ class _ForwarderBase(_AbstractRobotInterface):
         if not _checkIsStringIO(msg):
             raise ConversionError('Sent message is not a binary message.')
 
-        if self._GZIP_LVL:
-            self._receive(zlib.decompress(msg.getvalue()), msgID)
-        else:
-            self._receive(msg.getvalue(), msgID)
+        self._receive(self._decompressor.decompress(getView(msg)), msgID)
 
     def _send(self, msg, msgID, protocol, remoteID):
         """ Wrap and deflate a ROS message in a JSON encoded message.
@@ -246,11 +297,8 @@ class _ForwarderBase(_AbstractRobotInterface):
                                 message.
             @type  remoteID:    uuid.UUID
         """
-        if self._GZIP_LVL:
-            self._sendToClient(StringIO(zlib.compress(msg, self._GZIP_LVL)),
-                               msgID, protocol, remoteID)
-        else:
-            self._sendToClient(StringIO(msg), msgID, protocol, remoteID)
+        self._sendToClient(BinaryBuffer(self._compressor.compress(msg)),
+                           msgID, protocol, remoteID)
 
 
 class _ServiceClient(object):
@@ -41,6 +41,7 @@ from zope.interface import implements
 
 # twisted specific imports
 from twisted.python import log
+from twisted.internet.threads import deferToThread
 from twisted.cred.credentials import UsernamePassword
 from twisted.spread.pb import PBClientFactory, \
     DeadReferenceError, PBConnectionLost
@@ -50,9 +51,11 @@ from autobahn.websocket import listenWS
 
 # rce specific imports
 from rce.util.converter import Converter
+from rce.util.executor import ConversionExecutor
 from rce.util.loader import Loader
 from rce.util.interface import verifyObject
 from rce.comm.error import DeadConnection
+from rce.comm.delta import DeltaEncoder
 from rce.comm.interfaces import IRobotRealm, IProtocol, \
     IRobot, IMessageReceiver
 from rce.comm.server import CloudEngineWebSocketFactory
@@ -96,6 +99,10 @@ class Connection(object):
         self._view = None
         self._namespace = None
         self._protocol = None
+        self._compression = {}
+        self._arrays = set()
+        self._settings = {}
+        self._deltas = {}
 
     @property
     def userID(self):
@@ -160,6 +167,10 @@ class Connection(object):
         verifyObject(IProtocol, protocol)
         self._protocol = protocol
 
+        # The robot has to start again with a keyframe
+        for encoder in self._deltas.itervalues():
+            encoder.reset()
+
     def unregisterProtocol(self, protocol):
         """ Unregister the client protocol.
 
@@ -182,6 +193,11 @@ class Connection(object):
             #       time...
             return
 
+        encoder = self._deltas.get(iTag)
+
+        if encoder:
+            msg = encoder.encode(msg)
+
         self._protocol.sendDataMessage(iTag, clsName, msgID, msg)
 
     sendMessage.__doc__ = IProtocol.get('sendDataMessage').getDoc()
@@ -232,10 +248,27 @@ class Connection(object):
 
     removeNode.__doc__ = IRobot.get('removeNode').getDoc()
 
-    def addInterface(self, eTag, iTag, iType, clsName, addr=''):
+    def addInterface(self, eTag, iTag, iType, clsName, addr='',
+                     compression=None, arrays=False, settings=None, delta=0):
         if not self._view:
             raise ForwardingError('Reference of the view is missing.')
 
+        # The compression mode, the array mode, the converter settings and
+        # the delta mode are only used by the robot-side interfaces, which are
+        # created in this process
+        if eTag == self._robotID:
+            if compression:
+                self._compression[iTag] = compression
+
+            if arrays:
+                self._arrays.add(iTag)
+
+            if settings:
+                self._settings[iTag] = settings
+
+            if delta:
+                self._deltas[iTag] = DeltaEncoder(delta)
+
         self._view.addInterface(eTag, iTag, iType, clsName, addr)
 
     addInterface.__doc__ = IRobot.get('addInterface').getDoc()
@@ -244,6 +277,10 @@ class Connection(object):
         if not self._view:
             raise ForwardingError('Reference of the view is missing.')
 
+        self._compression.pop(iTag, None)
+        self._arrays.discard(iTag)
+        self._settings.pop(iTag, None)
+        self._deltas.pop(iTag, None)
         self._view.removeInterface(eTag, iTag)
 
     removeInterface.__doc__ = IRobot.get('removeInterface').getDoc()
@@ -280,6 +317,55 @@ class Connection(object):
 
     removeConnection.__doc__ = IRobot.get('removeConnection').getDoc()
 
+    def getStats(self):
+        """ Get the statistics of the WebSocket connection to the robot.
+
+            @return:            Statistics of the connection; empty if there
+                                is no connection.
+            @rtype:             { str : { str : int } }
+        """
+        if not self._protocol:
+            return {}
+
+        return self._protocol.getStats()
+
+    def getCompression(self, iTag):
+        """ Get the compression mode which the robot selected for an interface.
+
+            @param iTag:        Tag of the interface.
+            @type  iTag:        str
+
+            @return:            Compression mode or None, if the robot did not
+                                select a compression mode.
+            @rtype:             str / None
+        """
+        return self._compression.get(iTag)
+
+    def getArrayMode(self, iTag):
+        """ Get whether the robot selected the array mode for an interface.
+
+            @param iTag:        Tag of the interface.
+            @type  iTag:        str
+
+            @return:            True if numeric arrays should be sent as typed
+                                binary blobs.
+            @rtype:             bool
+        """
+        return iTag in self._arrays
+
+    def getConverterSettings(self, iTag):
+        """ Get the settings of the custom Converters which the robot selected
+            for an interface.
+
+            @param iTag:        Tag of the interface.
+            @type  iTag:        str
+
+            @return:            Settings by message type or None, if the robot
+                                did not select any settings.
+            @rtype:             { str : { str : value } } / None
+        """
+        return self._settings.get(iTag)
+
     # Forwarding to Namespace
 
     def processReceivedMessage(self, iTag, clsName, msgID, msg):
@@ -464,6 +550,59 @@ class Robot(Namespace):
         """
         return self._endpoint.converter
 
+    @property
+    def executor(self):
+        """ Reference to the executor which runs the conversions of the
+            Converter interfaces.
+        """
+        return self._endpoint.executor
+
+    def getCompression(self, iTag):
+        """ Get the compression mode which should be used by a forwarder.
+
+            @param iTag:        Tag of the interface.
+            @type  iTag:        str
+
+            @return:            Compression mode or None, if the default
+                                should be used.
+            @rtype:             str / None
+        """
+        if not self._connection:
+            return None
+
+        return self._connection.getCompression(iTag)
+
+    def getArrayMode(self, iTag):
+        """ Get whether a converter should send numeric arrays as typed binary
+            blobs.
+
+            @param iTag:        Tag of the interface.
+            @type  iTag:        str
+
+            @return:            True if the array mode should be used.
+            @rtype:             bool
+        """
+        if not self._connection:
+            return False
+
+        return self._connection.getArrayMode(iTag)
+
+    def getConverterSettings(self, iTag):
+        """ Get the settings of the custom Converters which a converter
+            should use.
+
+            @param iTag:        Tag of the interface.
+            @type  iTag:        str
+
+            @return:            Settings by message type or None, if the
+                                defaults should be used.
+            @rtype:             { str : { str : value } } / None
+        """
+        if not self._connection:
+            return None
+
+        return self._connection.getConverterSettings(iTag)
+
     def receivedFromClient(self, iTag, clsName, msgID, msg):
         """ Process a data message which has been received from the robot
             client and send the message to the appropriate interface.
@@ -564,6 +703,18 @@ class Robot(Namespace):
         self._connection = None
         Namespace.remote_destroy(self)
 
+    def remote_getStats(self):
+        """ Get the statistics of the WebSocket connection to the robot.
+
+            @return:            Statistics of the connection; empty if there
+                                is no connection.
+            @rtype:             { str : { str : int } }
+        """
+        if not self._connection:
+            return {}
+
+        return self._connection.getStats()
+
     def remote_destroy(self):
         """ Method should be called to destroy the robot and will take care
             of destroying all objects owned by this robot as well as
@@ -586,7 +737,7 @@ class RobotClient(Endpoint):
     RECONNECT_TIMEOUT = 10
 
     def __init__(self, reactor, masterIP, masterPort, commPort, extIP, extPort,
-                 loader, converter):
+                 loader, converter, executor):
         """ Initialize the Robot Client.
 
             @param reactor:     Reference to the twisted reactor used in this
@@ -622,6 +773,10 @@ class RobotClient(Endpoint):
                                 messages from JSON to ROS message and vice
                                 versa.
             @type  converter:   rce.util.converter.Converter
+
+            @param executor:    Executor which runs the conversions of the
+                                Converter interfaces.
+            @type  executor:    rce.util.executor.ConversionExecutor
         """
         Endpoint.__init__(self, reactor, loader, commPort)
 
@@ -630,6 +785,7 @@ class RobotClient(Endpoint):
         self._extAddress = '{0}:{1}'.format(extIP, extPort)
         self._loader = loader
         self._converter = converter
+        self._executor = executor
 
         self._connections = set()
         self._deathCandidates = {}
@@ -641,6 +797,13 @@ class RobotClient(Endpoint):
         """
         return self._converter
 
+    @property
+    def executor(self):
+        """ Reference to the executor which runs the conversions of the
+            Converter interfaces.
+        """
+        return self._executor
+
     def registerConnection(self, connection):
         assert connection not in self._connections
         self._connections.add(connection)
@@ -809,16 +972,15 @@ class RobotClient(Endpoint):
 
 
 def main(reactor, cred, masterIP, masterPort, consolePort,
-                extIP, extPort, commPort, pkgPath, customConverters):
+                extIP, extPort, commPort, pkgPath, customConverters,
+                convMode='thread', convWorkers=4, convQueue=32,
+                convInline=65536, preloadMsgs=(), preloadSrvs=()):
     log.startLogging(sys.stdout)
 
     def _err(reason):
         print(reason)
         reactor.stop()
 
-    factory = PBClientFactory()
-    reactor.connectTCP(masterIP, masterPort, factory)
-
     rosPath = []
     for path in get_ros_paths() + [p for p, _ in pkgPath]:
         if path not in rosPath:
@@ -827,6 +989,24 @@ def main(reactor, cred, masterIP, masterPort, consolePort,
     loader = Loader(rosPath)
     converter = Converter(loader)
 
+    def _preloaded(failures):
+        for t, msg in failures.iteritems():
+            log.msg("Could not preload '{0}': {1}".format(t, msg))
+
+        times = loader.loadTimes
+        log.msg('Preloaded {0} modules in {1:.3f} s.'.format(
+                    len(times), sum(times.itervalues())))
+
+        for (pkg, clsType, cls), t in sorted(times.iteritems(),
+                                             key=lambda item: -item[1]):
+            log.msg('    {0}/{1}/{2}: {3:.3f} s'.format(pkg, clsType, cls, t))
+
+    # The classes are imported in a thread to not block the reactor
+    if preloadMsgs or preloadSrvs:
+        d = deferToThread(loader.preload, preloadMsgs, preloadSrvs)
+        d.addCallback(_preloaded)
+        d.addErrback(log.err)
+
     for customConverter in customConverters:
         # Get correct path/name of the converter
         module, className = customConverter.rsplit('.', 1)
@@ -835,8 +1015,16 @@ def main(reactor, cred, masterIP, masterPort, consolePort,
         mod = __import__(module, fromlist=[className])
         converter.addCustomConverter(getattr(mod, className))
 
+    # Create the executor before any connection is opened, as the worker
+    # processes would inherit the sockets
+    executor = ConversionExecutor(reactor, convMode, convWorkers, convQueue,
+                                  convInline, rosPath, customConverters)
+
+    factory = PBClientFactory()
+    reactor.connectTCP(masterIP, masterPort, factory)
+
     client = RobotClient(reactor, masterIP, consolePort, commPort, extIP,
-                         extPort, loader, converter)
+                         extPort, loader, converter, executor)
     d = factory.login(cred, client)
     d.addCallback(lambda ref: setattr(client, '_avatar', ref))
     d.addErrback(_err)
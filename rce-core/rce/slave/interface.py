@@ -56,6 +56,19 @@ class Types(object):
     INTERFACE = 2
     _SUFFIX_NAMES = ['Converter', 'Forwarder', 'Interface']
 
+    PRIORITY_HIGH = 0
+    PRIORITY_NORMAL = 1
+    PRIORITY_LEVELS = 2
+
+    # CONFIG
+    # Priorities of the messages of the Interfaces in the internal
+    # communication; messages are sent in between the fragments of large
+    # messages with a lower priority
+    PRIORITIES = { SERVICE_CLIENT   : PRIORITY_HIGH,
+                   SERVICE_PROVIDER : PRIORITY_HIGH,
+                   PUBLISHER        : PRIORITY_NORMAL,
+                   SUBSCRIBER       : PRIORITY_NORMAL }
+
     @staticmethod
     def encode(typename):
         """ Encode an Interface type in string form as as an int.
@@ -114,6 +127,20 @@ class Types(object):
         """
         return (iTypeA % 4) + (iTypeB % 4) == 3
 
+    @staticmethod
+    def priority(typenr):
+        """ Get the priority of the messages of an Interface type in the
+            internal communication.
+
+            @param typenr:      Encoded Interface type.
+            @type  typenr:      int
+
+            @return:            Priority; lower values are sent first.
+            @rtype:             int
+        """
+        assert 0 <= typenr < 12
+        return Types.PRIORITIES[typenr % 4]
+
 
 class InvalidResoureName(Error):
     """ Exception is raised in case the interface resource name is invalid.
@@ -148,6 +175,10 @@ class Interface(Referenceable):
         self._protocols = {}
         self._ready = False
 
+        # Priority of the messages in the internal communication; set by the
+        # namespace according to the Interface type
+        self.priority = Types.PRIORITY_NORMAL
+
     @property
     def UID(self):
         """ Unique ID of the interface (internal communication). """
@@ -158,6 +189,15 @@ class Interface(Referenceable):
         """ Unique ID of the interface (external communication). """
         return self._addr
 
+    def resumeSending(self):
+        """ Callback for a protocol to inform the interface that the protocol
+            is no longer congested.
+
+            Don't overwrite this method; instead overwrite the hook _resume.
+        """
+        if self._ready:
+            self._resume()
+
     def unregisterProtocol(self, protocol):
         """ Callback for the protocol to inform the interface that the
             protocol has died and should no longer be used.
@@ -341,5 +381,8 @@ class Interface(Referenceable):
     def _stop(self):
         pass
 
+    def _resume(self):
+        pass
+
     def _send(self, msg, msgID, protocol, remoteID):
         raise InternalError('Interface does not support sending of a message.')
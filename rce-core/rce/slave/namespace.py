@@ -38,6 +38,7 @@ from twisted.spread.pb import Referenceable
 
 # rce specific imports
 from rce.util.error import InternalError
+from rce.slave.interface import Types
 
 
 class Namespace(Referenceable):
@@ -106,7 +107,9 @@ class Namespace(Referenceable):
             raise InternalError('Interface type is not supported by this '
                                 'namespace.')
 
-        return cls(self, UUID(bytes=uid), msgType, addr)
+        interface = cls(self, UUID(bytes=uid), msgType, addr)
+        interface.priority = Types.priority(iType)
+        return interface
 
     def remote_destroy(self):
         """ Method should be called to destroy the namespace and will take care
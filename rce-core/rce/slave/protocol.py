@@ -33,14 +33,20 @@
 # Python specific imports
 import struct
 from uuid import UUID
+from collections import deque
+
+# zope specific imports
+from zope.interface import implements
 
 # twisted specific imports
 from twisted.python import log
+from twisted.internet.interfaces import IPushProducer
 from twisted.protocols.basic import Int32StringReceiver
 from twisted.spread.pb import Referenceable
 
 # rce specific imports
 from rce.util.error import InternalError
+from rce.slave.interface import Types
 
 
 class _Protocol(Referenceable):
@@ -77,6 +83,21 @@ class _Protocol(Referenceable):
         raise NotImplementedError("Method 'sendMessage' has to be "
                                   'implemented.')
 
+    def isCongested(self, interface):
+        """ Check whether the messages which an Interface sends to all
+            connected Interfaces are currently not consumed fast enough by the
+            other side. If the Protocol is congested, the method
+            'resumeSending' of the Interface is called as soon as the
+            congestion is resolved.
+
+            @param interface:   Interface which wants to send a message.
+            @type  interface:   rce.slave.interface.Interface
+
+            @return:            True if the Protocol is congested.
+            @rtype:             bool
+        """
+        return False
+
     def messageReceived(self, remoteID, msg, msgID, destID=None):
         """ Protocol internal method used to send a received message to the
             stored receivers.
@@ -176,17 +197,114 @@ class Loopback(_Protocol):
     sendMessage.__doc__ = _Protocol.sendMessage.__doc__
 
 
+class _TransportProducer(object):
+    """ Producer which is registered with the transport of a
+        RCEInternalProtocol to get notified when the write buffer of the
+        transport is full.
+    """
+    implements(IPushProducer)
+
+    def __init__(self, protocol):
+        self._protocol = protocol
+
+    def pauseProducing(self):
+        self._protocol.pauseWriting()
+
+    def resumeProducing(self):
+        self._protocol.resumeWriting()
+
+    def stopProducing(self):
+        pass
+
+
 class RCEInternalProtocol(Int32StringReceiver, _Protocol):
     """ Protocol which is used to connect Endpoints such that Interfaces in
         different Endpoint are able to communicate.
+
+        Each side assigns a channel number to every pair (sending interface,
+        destination interface or None for all receivers) and defines it with
+        a control message before the first data message of the channel is
+        sent. A data message then consists of
+
+            channel number (2 or 4 bytes), msgID length (1 byte), msgID, msg
+
+        where channel numbers below 0x8000 are sent as 2 bytes and all others
+        as 4 bytes with the highest bit set. The channel number 0 is reserved
+        for the control messages:
+
+            0 (2 bytes), 'D', channel (4 bytes), flag, [destID], srcID
+            0 (2 bytes), 'C', channel (4 bytes)
+            0 (2 bytes), 'A', channel (4 bytes)
+            0 (2 bytes), 'G', channel (4 bytes), credits (4 bytes)
+            0 (2 bytes), 'F', channel (4 bytes), flags (1 byte),
+                [length (4 bytes), transfer (4 bytes)], fragment
+            0 (2 bytes), 'X', channel (4 bytes), transfer (4 bytes)
+
+        which define respectively close a channel, acknowledge the closing
+        of a channel, grant credits for a channel, contain a fragment of a
+        data message or cancel the transfer of a fragmented message. The
+        number of a closed channel is reused once the other side has
+        acknowledged the closing, such that grants which were still in flight
+        for the closed channel are not added to the credits of a new channel.
+
+        The messages are queued in a lane per priority of the sending
+        Interface (see rce.slave.interface.Types). Messages which are larger
+        than FRAGMENT_SIZE or which have to wait for other messages of their
+        lane are split into fragments. The fragments are written while the
+        write buffer of the transport is not full, where the lane with the
+        highest priority goes first. Hence, a service call has to wait at
+        most for one fragment of a large topic message instead of the whole
+        message. The first fragment of a message has the flag FIRST set and
+        contains the length of the complete message and the number of the
+        transfer after the flags; the last fragment has the flag LAST set.
+
+        MAX_LENGTH limits only the length of the individual messages on the
+        connection, i.e. of the fragments, such that larger messages can be
+        sent in fragments. Instead, the receiver limits the memory of the
+        partially received messages to MAX_PENDING bytes. If the first
+        fragment of a message would exceed the limit, the receiver cancels
+        the transfer, i.e. the message is dropped and the sender stops
+        sending its fragments, while the connection stays open.
+
+        A channel starts with CREDITS credits and every data message uses
+        one. The receiver grants the credits again once it has dispatched
+        or dropped the messages. Interfaces can check with 'isCongested'
+        whether the channel has no credits left or whether the write buffer
+        of the transport is full. Messages are never dropped by the Protocol.
+
+        The header and the payload of a data message are written to the
+        transport as separate buffers and messages which are larger than
+        LARGE_LENGTH are received into a preallocated buffer instead of
+        being concatenated chunk by chunk.
     """
     # CONFIG
-    MAX_LENGTH = 30000000  # Maximal message length in bytes
+    MAX_LENGTH = 30000000  # Maximal length in bytes of an unfragmented message
+    MAX_PENDING = 536870912  # Maximal bytes of partially received messages
+    LARGE_LENGTH = 65536  # Minimal length in bytes of a preallocated message
+    CREDITS = 64  # Messages per channel which can be sent without a grant
+    FRAGMENT_SIZE = 65536  # Maximal size in bytes of a message fragment
 
+    _PREFIX_STRUCT = struct.Struct('!I')
     _MSG_ID_STRUCT = struct.Struct('!B')
+    _SHORT_STRUCT = struct.Struct('!H')
+    _LONG_STRUCT = struct.Struct('!I')
     _TRUE = struct.pack('!?', True)
     _FALSE = struct.pack('!?', False)
 
+    _LONG_FLAG = 0x80000000
+    _MAX_SHORT = 0x7fff
+
+    _CONTROL = struct.pack('!H', 0)
+    _DEFINE = 'D'
+    _CLOSE = 'C'
+    _ACK = 'A'
+    _GRANT = 'G'
+    _FRAGMENT = 'F'
+    _CANCEL = 'X'
+
+    _FIRST = 0x01
+    _LAST = 0x02
+
     def __init__(self, endpoint):
         """ Initialize the Protocol.
 
@@ -195,9 +313,141 @@ class RCEInternalProtocol(Int32StringReceiver, _Protocol):
         """
         _Protocol.__init__(self, endpoint)
 
+        # Key:    tuple (UID of local interface, UID of remote interface or
+        #                None)
+        # Value:  tuple (channel number, packed channel number)
+        self._outgoing = {}
+        self._nextChannel = 1
+        self._freeChannels = []
+
+        # Index:  channel number
+        # Value:  remaining credits of the outgoing channel or None if the
+        #         channel is closed and the closing is not yet acknowledged
+        self._credits = [0]
+
+        # Interfaces which have to be informed when a congestion is resolved
+        self._blocked = set()
+        self._writePaused = False
+
+        # Index:  priority
+        # Value:  queue of lists [channel, header, msg, offset, transfer] of
+        #         the messages which are sent in fragments
+        self._lanes = [deque() for _ in xrange(Types.PRIORITY_LEVELS)]
+        self._nextTransfer = 0
+
+        # Index:  channel number
+        # Value:  tuple (UID of remote interface, UID of local interface or
+        #                None)
+        self._incoming = [None]
+
+        # Index:  channel number
+        # Value:  messages received since the last grant
+        self._consumed = [0]
+
+        # Key:    channel number
+        # Value:  list [buffer, view of buffer, offset] of the message which
+        #         is received in fragments or None if the transfer has been
+        #         cancelled
+        self._partial = {}
+        self._pending = 0
+
+        # Buffer of the large message which is currently received
+        self._large = None
+        self._largeView = None
+        self._largeOffset = 0
+
         self._initialized = False
         self.stringReceived = self._initReceived
 
+    def connectionMade(self):
+        """ Method is called by the twisted framework when the connection is
+            established.
+        """
+        Int32StringReceiver.connectionMade(self)
+        self.transport.registerProducer(_TransportProducer(self), True)
+
+    def pauseWriting(self):
+        """ Callback for the producer of the transport to inform the
+            protocol that the write buffer is full.
+        """
+        self._writePaused = True
+
+    def resumeWriting(self):
+        """ Callback for the producer of the transport to inform the
+            protocol that the write buffer has been flushed.
+        """
+        self._writePaused = False
+        self._writeFragments()
+
+        if not self._writePaused:
+            self._resumeBlocked()
+
+    def _resumeBlocked(self):
+        """ Internally used method to inform the blocked interfaces that
+            they can send again.
+        """
+        blocked, self._blocked = self._blocked, set()
+
+        for interface in blocked:
+            interface.resumeSending()
+
+    def dataReceived(self, data):
+        """ Method is called by the twisted framework when data is received.
+
+            @param data:        Data which was received.
+            @type  data:        str
+        """
+        if self._large is not None:
+            size = len(self._large)
+            start = self._largeOffset
+            n = min(len(data), size - start)
+
+            self._largeView[start:start + n] = buffer(data, 0, n)
+            self._largeOffset += n
+
+            if self._largeOffset < size:
+                return
+
+            msg = self._large
+            self._large = self._largeView = None
+            self.stringReceived(msg)
+
+            # Only the (small) remainder is copied
+            data = data[n:]
+
+        if self._unprocessed:
+            data = self._unprocessed + data
+
+        offset = 0
+        end = len(data)
+        prefixLength = self._PREFIX_STRUCT.size
+
+        while end - offset >= prefixLength and not self.paused:
+            length, = self._PREFIX_STRUCT.unpack_from(data, offset)
+
+            if length > self.MAX_LENGTH:
+                self._unprocessed = ''
+                self.lengthLimitExceeded(length)
+                return
+
+            start = offset + prefixLength
+
+            if end - start >= length:
+                offset = start + length
+                self.stringReceived(data[start:offset])
+            elif length >= self.LARGE_LENGTH:
+                n = end - start
+                self._large = bytearray(length)
+                self._largeView = memoryview(self._large)
+                self._largeView[:n] = buffer(data, start, n)
+                self._largeOffset = n
+                offset = end
+                break
+            else:
+                break
+
+        self._unprocessed = data[offset:]
+
     def _initReceived(self, msg):
         """ Internally used method process a complete string message as long as
             the connection is not yet initialized.
@@ -217,6 +467,12 @@ class RCEInternalProtocol(Int32StringReceiver, _Protocol):
         self.stringReceived = self._messageReceived
         self._initialized = True
 
+        # Define the channels of the connections which have been registered
+        # before the connection was initialized
+        for receivers in self._receivers.itervalues():
+            for interface in receivers:
+                self._getChannel(interface.UID, None)
+
     def _initFailed(self, failure):
         log.msg('Protocol Error: {0}'.format(failure.getErrorMessage()))
         self.transport.loseConnection()
@@ -228,32 +484,375 @@ class RCEInternalProtocol(Int32StringReceiver, _Protocol):
             @param msg:         Message which was received.
             @type  msg:         str
         """
-        if len(msg) < 17:
+        if len(msg) < 3:
+            log.msg('Protocol Error: Message is too short.')
             self.transport.loseConnection()
+            return
 
-        flag = msg[:1]
+        channel, = self._SHORT_STRUCT.unpack_from(msg)
 
-        if flag == self._TRUE:
-            destID = UUID(bytes=msg[1:17])
-            offset = 17
-        elif flag == self._FALSE:
-            destID = None
-            offset = 1
+        if channel > self._MAX_SHORT:
+            channel, = self._LONG_STRUCT.unpack_from(msg)
+            channel &= ~self._LONG_FLAG
+            offset = 4
+        elif channel:
+            offset = 2
         else:
-            log.msg('Protocol Error: Could not identify flag.')
-            self.transport.loseConnection()
+            self._controlReceived(msg)
             return
 
-        remoteID = UUID(bytes=msg[offset:offset + 16])
-        offset += 16
+        self._dispatch(channel, msg, offset)
+
+    def _dispatch(self, channel, msg, offset):
+        """ Internally used method to pass a complete data message on to the
+            receivers.
+
+            @param channel:     Channel number of the message.
+            @type  channel:     int
 
-        idLen, = self._MSG_ID_STRUCT.unpack(msg[offset:offset + 1])
+            @param msg:         Message which was received.
+            @type  msg:         str / bytearray
+
+            @param offset:      Offset of the message ID length in msg.
+            @type  offset:      int
+        """
+        try:
+            remoteID, destID = self._incoming[channel]
+        except (IndexError, TypeError):
+            log.msg('Protocol Error: Channel {0} is not defined.'.format(
+                                                                    channel))
+            self.transport.loseConnection()
+            return
+
+        idLen, = self._MSG_ID_STRUCT.unpack_from(msg, offset)
         offset += 1
 
-        msgID = msg[offset:offset + idLen]
+        # Large messages are received as bytearray
+        msgID = str(msg[offset:offset + idLen])
         offset += idLen
 
         self.messageReceived(remoteID, buffer(msg, offset), msgID, destID)
+        self._consume(channel)
+
+    def _consume(self, channel):
+        """ Internally used method to account for a data message of the
+            channel which has been dispatched or dropped, such that its credit
+            is granted again to the sender.
+
+            @param channel:     Channel number of the message.
+            @type  channel:     int
+        """
+        if not 0 < channel < len(self._consumed):
+            return
+
+        # Grant the credits in batches to limit the number of control messages
+        consumed = self._consumed[channel] + 1
+
+        if consumed >= self.CREDITS // 2:
+            self.sendString(''.join((self._CONTROL, self._GRANT,
+                                     self._LONG_STRUCT.pack(channel),
+                                     self._LONG_STRUCT.pack(consumed))))
+            consumed = 0
+
+        self._consumed[channel] = consumed
+
+    def _controlReceived(self, msg):
+        """ Internally used method to process a control message which
+            defines or closes a channel.
+
+            @param msg:         Message which was received.
+            @type  msg:         str
+        """
+        try:
+            channel, = self._LONG_STRUCT.unpack_from(msg, 3)
+        except struct.error:
+            log.msg('Protocol Error: Control message is too short.')
+            self.transport.loseConnection()
+            return
+
+        incoming = self._incoming
+
+        # Fragments might be received as bytearray
+        cmd = str(msg[2:3])
+
+        if cmd == self._FRAGMENT and len(msg) > 7:
+            self._fragmentReceived(channel, msg)
+            return
+
+        if cmd == self._CANCEL and len(msg) == 11:
+            self._cancelReceived(channel,
+                                 self._LONG_STRUCT.unpack_from(msg, 7)[0])
+            return
+
+        if cmd == self._GRANT and len(msg) == 11:
+            if (0 < channel < len(self._credits) and
+                    self._credits[channel] is not None):
+                credits = self._credits[channel]
+                self._credits[channel] += self._LONG_STRUCT.unpack_from(msg,
+                                                                        7)[0]
+
+                if credits <= 0 < self._credits[channel]:
+                    self._resumeBlocked()
+
+            return
+
+        if cmd == self._CLOSE and 0 < channel < len(incoming):
+            incoming[channel] = None
+            self._dropPartial(channel)
+
+            # All grants for the channel have been sent before
+            self.sendString(''.join((self._CONTROL, self._ACK,
+                                     self._LONG_STRUCT.pack(channel))))
+            return
+
+        if cmd == self._ACK and len(msg) == 7:
+            if (0 < channel < len(self._credits) and
+                    self._credits[channel] is None):
+                self._credits[channel] = 0
+                self._freeChannels.append(channel)
+
+            return
+
+        if cmd != self._DEFINE or not 0 < channel <= len(incoming):
+            log.msg('Protocol Error: Invalid control message.')
+            self.transport.loseConnection()
+            return
+
+        flag = msg[7:8]
+
+        if flag == self._TRUE and len(msg) == 40:
+            destID = UUID(bytes=msg[8:24])
+            remoteID = UUID(bytes=msg[24:40])
+        elif flag == self._FALSE and len(msg) == 24:
+            destID = None
+            remoteID = UUID(bytes=msg[8:24])
+        else:
+            log.msg('Protocol Error: Could not identify flag.')
+            self.transport.loseConnection()
+            return
+
+        if channel == len(incoming):
+            incoming.append((remoteID, destID))
+            self._consumed.append(0)
+        else:
+            incoming[channel] = (remoteID, destID)
+            self._consumed[channel] = 0
+
+    def _fragmentReceived(self, channel, msg):
+        """ Internally used method to process a control message which
+            contains a fragment of a data message.
+
+            @param channel:     Channel number of the message.
+            @type  channel:     int
+
+            @param msg:         Message which was received.
+            @type  msg:         str / bytearray
+        """
+        flags = ord(msg[7:8])
+        offset = 8
+
+        if flags & self._FIRST:
+            try:
+                length, transfer = struct.unpack_from('!II', msg, offset)
+            except struct.error:
+                log.msg('Protocol Error: First fragment is too short.')
+                self.transport.loseConnection()
+                return
+
+            offset += 8
+
+            # A new message replaces an incomplete message of the channel
+            if self._partial.get(channel):
+                self._consume(channel)
+
+            self._dropPartial(channel)
+
+            if self._pending + length > self.MAX_PENDING:
+                log.msg('Received message dropped, because it would exceed '
+                        'the memory limit ({0} bytes).'.format(length))
+                self.sendString(''.join((self._CONTROL, self._CANCEL,
+                                         self._LONG_STRUCT.pack(channel),
+                                         self._LONG_STRUCT.pack(transfer))))
+                self._consume(channel)
+
+                if not flags & self._LAST:
+                    self._partial[channel] = None
+
+                return
+
+            buf = bytearray(length)
+            partial = [buf, memoryview(buf), 0]
+            self._partial[channel] = partial
+            self._pending += length
+        else:
+            try:
+                partial = self._partial[channel]
+            except KeyError:
+                log.msg('Protocol Error: Fragment without first fragment.')
+                self.transport.loseConnection()
+                return
+
+            if partial is None:
+                # The transfer has been cancelled; the sender might have sent
+                # further fragments before it received the cancellation
+                if flags & self._LAST:
+                    del self._partial[channel]
+
+                return
+
+        buf, view, start = partial
+        n = len(msg) - offset
+
+        if start + n > len(buf):
+            log.msg('Protocol Error: Fragment exceeds the message length.')
+            self.transport.loseConnection()
+            return
+
+        view[start:start + n] = buffer(msg, offset, n)
+        partial[2] = start + n
+
+        if flags & self._LAST:
+            self._dropPartial(channel)
+
+            if start + n != len(buf):
+                log.msg('Protocol Error: Message is incomplete.')
+                self.transport.loseConnection()
+                return
+
+            self._dispatch(channel, buf, 0)
+
+    def _dropPartial(self, channel):
+        """ Internally used method to release the memory of the message of a
+            channel which is received in fragments.
+
+            @param channel:     Channel number of the message.
+            @type  channel:     int
+        """
+        partial = self._partial.pop(channel, None)
+
+        if partial:
+            self._pending -= len(partial[0])
+
+    def _cancelReceived(self, channel, transfer):
+        """ Internally used method to stop sending the fragments of a
+            message which the other side cancelled.
+
+            @param channel:     Channel number of the message.
+            @type  channel:     int
+
+            @param transfer:    Number of the transfer of the message.
+            @type  transfer:    int
+        """
+        for lane in self._lanes:
+            for item in lane:
+                if item[0] == channel and item[4] == transfer:
+                    lane.remove(item)
+                    log.msg('Sent message dropped, because the other side '
+                            'cancelled the transfer.')
+                    return
+
+    def _getChannel(self, uid, remoteID):
+        """ Internally used method to get the channel number for the
+            messages from a local interface to a remote interface. A new
+            channel is defined if necessary.
+
+            @param uid:         Unique ID of the local Interface.
+            @type  uid:         uuid.UUID
+
+            @param remoteID:    Unique ID of the remote Interface or None if
+                                the messages are for all remote Interfaces.
+            @type  remoteID:    uuid.UUID / None
+
+            @return:            Channel number and packed channel number.
+            @rtype:             (int, str)
+        """
+        key = (uid, remoteID)
+
+        try:
+            return self._outgoing[key]
+        except KeyError:
+            pass
+
+        if self._freeChannels:
+            channel = self._freeChannels.pop()
+        else:
+            channel = self._nextChannel
+            self._nextChannel += 1
+
+        if channel > self._MAX_SHORT:
+            packed = self._LONG_STRUCT.pack(channel | self._LONG_FLAG)
+        else:
+            packed = self._SHORT_STRUCT.pack(channel)
+
+        if remoteID:
+            rmtID = remoteID.bytes
+            flag = self._TRUE
+        else:
+            rmtID = ''
+            flag = self._FALSE
+
+        self.sendString(''.join((self._CONTROL, self._DEFINE,
+                                 self._LONG_STRUCT.pack(channel), flag, rmtID,
+                                 uid.bytes)))
+        self._outgoing[key] = (channel, packed)
+
+        if channel == len(self._credits):
+            self._credits.append(self.CREDITS)
+        else:
+            self._credits[channel] = self.CREDITS
+
+        return channel, packed
+
+    def _closeChannel(self, uid, remoteID):
+        """ Internally used method to close the channel for the messages
+            from a local interface to a remote interface, if it exists.
+
+            @param uid:         Unique ID of the local Interface.
+            @type  uid:         uuid.UUID
+
+            @param remoteID:    Unique ID of the remote Interface or None if
+                                the messages are for all remote Interfaces.
+            @type  remoteID:    uuid.UUID / None
+        """
+        try:
+            channel, _ = self._outgoing.pop((uid, remoteID))
+        except KeyError:
+            return
+
+        # The pending messages of the channel are dropped; the receiver
+        # drops a partially sent message when the channel is closed
+        for lane in self._lanes:
+            for item in [item for item in lane if item[0] == channel]:
+                lane.remove(item)
+
+        self.sendString(''.join((self._CONTROL, self._CLOSE,
+                                 self._LONG_STRUCT.pack(channel))))
+
+        # The channel is reused once the other side acknowledged the closing
+        self._credits[channel] = None
+
+    def registerConnection(self, interface, remoteID):
+        _Protocol.registerConnection(self, interface, remoteID)
+
+        if self._initialized:
+            self._getChannel(interface.UID, None)
+
+    registerConnection.__doc__ = _Protocol.registerConnection.__doc__
+
+    def unregisterConnection(self, interface, remoteID):
+        _Protocol.unregisterConnection(self, interface, remoteID)
+
+        if not self._initialized:
+            return
+
+        uid = interface.UID
+        self._closeChannel(uid, remoteID)
+
+        if not any(interface in receivers
+                   for receivers in self._receivers.itervalues()):
+            self._closeChannel(uid, None)
+
+    unregisterConnection.__doc__ = _Protocol.unregisterConnection.__doc__
 
     def sendInit(self, connID, key):
         """ Send an init message to the other side.
@@ -274,32 +873,109 @@ class RCEInternalProtocol(Int32StringReceiver, _Protocol):
     def sendMessage(self, interface, msg, msgID, remoteID=None):
         assert self._initialized
 
-        uid = interface.UID.bytes
-        assert len(uid) == 16
-
         try:
             idLen = self._MSG_ID_STRUCT.pack(len(msgID))
         except struct.error:
             raise InternalError('Message ID is too long.')
 
-        if remoteID:
-            flag = self._TRUE
-            rmtID = remoteID.bytes
-            assert len(rmtID) == 16
-        else:
-            flag = self._FALSE
-            rmtID = ''
+        channel, packed = self._getChannel(interface.UID, remoteID)
+        self._credits[channel] -= 1
+
+        header = idLen + msgID
+        length = len(header) + len(msg)
 
-        self.sendString(''.join((flag, rmtID, uid, idLen, msgID, msg)))
+        if length >= 2 ** (8 * self._LONG_STRUCT.size):
+            raise InternalError('Message is too long.')
+
+        lane = self._lanes[interface.priority]
+
+        if lane or length > self.FRAGMENT_SIZE:
+            lane.append([channel, header, msg, 0, self._nextTransfer])
+            self._nextTransfer = (self._nextTransfer + 1) % 2 ** 32
+            self._writeFragments()
+        else:
+            # The payload is not copied to prepend the header
+            prefix = self._PREFIX_STRUCT.pack(len(packed) + length)
+            self.transport.writeSequence((prefix + packed + header, msg))
 
     sendMessage.__doc__ = _Protocol.sendMessage.__doc__
 
+    def _writeFragments(self):
+        """ Internally used method to write the fragments of the queued
+            messages until the write buffer of the transport is full.
+        """
+        while not self._writePaused:
+            for lane in self._lanes:
+                if lane:
+                    break
+            else:
+                return
+
+            item = lane[0]
+            channel, header, msg, start, transfer = item
+            parts = [self._CONTROL, self._FRAGMENT,
+                     self._LONG_STRUCT.pack(channel)]
+            flags = 0
+
+            if header is None:
+                end = start + self.FRAGMENT_SIZE
+            else:
+                flags |= self._FIRST
+                end = start + self.FRAGMENT_SIZE - len(header)
+
+            if end >= len(msg):
+                flags |= self._LAST
+                lane.popleft()
+            else:
+                item[1] = None
+                item[3] = end
+
+            parts.append(chr(flags))
+
+            if header is not None:
+                parts.append(struct.pack('!II', len(header) + len(msg),
+                                         transfer))
+                parts.append(header)
+
+            # The transport has to copy the fragment anyway
+            data = msg[start:end]
+            head = ''.join(parts)
+            prefix = self._PREFIX_STRUCT.pack(len(head) + len(data))
+            self.transport.writeSequence((prefix + head, data))
+
+    def isCongested(self, interface):
+        if self._writePaused:
+            congested = True
+        else:
+            try:
+                channel, _ = self._outgoing[interface.UID, None]
+            except KeyError:
+                return False
+
+            congested = self._credits[channel] <= 0
+
+        if congested:
+            self._blocked.add(interface)
+
+        return congested
+
+    isCongested.__doc__ = _Protocol.isCongested.__doc__
+
     def connectionLost(self, reason):
         """ Method is called by the twisted framework when the connection is
             lost.
         """
         _Protocol.remote_destroy(self)
 
+        for lane in self._lanes:
+            lane.clear()
+
+        self._partial = {}
+        self._pending = 0
+
+        # The interfaces no longer wait for this protocol
+        self._resumeBlocked()
+
     def remote_destroy(self):
         """ Method should be called to destroy the connection and the protocol.
             It also takes care of any circular references.
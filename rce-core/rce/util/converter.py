@@ -32,8 +32,11 @@
 
 # Python specific imports
 import time
+import struct
 from datetime import datetime
 from functools import partial
+from itertools import count, imap
+from weakref import WeakSet
 
 try:
     from cStringIO import StringIO, InputType, OutputType
@@ -61,6 +64,8 @@ except ImportError:
 from zope.interface import implements
 
 # rce specific imports
+from rce.comm.arrays import DTYPES, packArray, packBuffer, packValues, \
+    unpackArray
 from rce.util.error import InternalError
 from rce.util.interface import verifyClass
 from rce.util.converters.interfaces import ICustomROSConverter
@@ -78,6 +83,118 @@ def _stringify(obj):
         raise TypeError('Object is not a string.')
 
 
+def _decodeCustom(customFunc, nestedFunc, field):
+    """ Internally used method to decode a field which has a custom Converter.
+        Only binaries are decoded using the custom Converter; all other data
+        is decoded like a regular nested ROS message.
+    """
+    if _checkIsStringIO(field):
+        return customFunc(field)
+
+    return nestedFunc(field)
+
+
+def _ref(ns, obj):
+    """ Internally used method to add an object to the namespace of generated
+        code.
+
+        @return:        Name under which the object can be referenced.
+        @rtype:         str
+    """
+    name = '_f{0}'.format(len(ns))
+    ns[name] = obj
+    return name
+
+
+def _compile(name, args, lines, ns):
+    """ Internally used method to compile the generated code of a function.
+    """
+    code = 'def {0}({1}):\n{2}\n'.format(name, args,
+                                         '\n'.join('    ' + line
+                                                   for line in lines))
+    exec code in ns
+    return ns[name]
+
+
+# Formats of the primitive ROS types in the serialized form of a ROS message
+_WIRE_FORMATS = { 'bool'    : 'B',
+                  'byte'    : 'b',
+                  'char'    : 'B',
+                  'uint8'   : 'B',
+                  'int8'    : 'b',
+                  'uint16'  : 'H',
+                  'int16'   : 'h',
+                  'uint32'  : 'I',
+                  'int32'   : 'i',
+                  'uint64'  : 'Q',
+                  'int64'   : 'q',
+                  'float32' : 'f',
+                  'float64' : 'd' }
+
+# Arrays of these types are deserialized into strings by genpy
+_BYTE_TYPES = ('uint8', 'char')
+
+_STAMP_TYPES = { 'time' : Time, 'duration' : Duration }
+
+_U32 = struct.Struct('<I')
+
+
+class _Untranscodable(Exception):
+    """ Exception is raised while a transcoder is built for a ROS message class
+        which can not be transcoded directly.
+    """
+
+
+def _arrayLength(slotType):
+    """ Internally used method to get the length of a fixed length array.
+
+        @return:        Length of the array or None, if the type is not a
+                        fixed length array.
+        @rtype:         int / None
+    """
+    if ']' == slotType[-1:]:
+        length = slotType[slotType.index('[') + 1:-1]
+
+        if length:
+            return int(length)
+
+    return None
+
+
+def _encodeStamp(cls, encode, secs, nsecs):
+    """ Internally used method to encode a time or duration which has been
+        read from a serialized ROS message.
+    """
+    return encode(cls(secs, nsecs))
+
+
+def _flushReads(lines, ns, pending):
+    """ Internally used method to generate the code which reads all pending
+        fixed size values with a single struct.
+    """
+    if not pending:
+        return
+
+    fmt = '<' + ''.join(f for _, f in pending)
+    lines.append('{0}, = {1}.unpack_from(_b, _o)'.format(
+        ', '.join(v for v, _ in pending), _ref(ns, struct.Struct(fmt))))
+    lines.append('_o += {0}'.format(struct.calcsize(fmt)))
+    del pending[:]
+
+
+def _flushWrites(lines, ns, pending):
+    """ Internally used method to generate the code which writes all pending
+        fixed size values with a single struct.
+    """
+    if not pending:
+        return
+
+    fmt = '<' + ''.join(f for _, f in pending)
+    lines.append('_p.append({0}.pack({1}))'.format(
+        _ref(ns, struct.Struct(fmt)), ', '.join(v for v, _ in pending)))
+    del pending[:]
+
+
 class _DurationConverter(object):
     """ Convert ROS Duration type to JSON style and back.
     """
@@ -93,7 +210,7 @@ class _DurationConverter(object):
         """ Transform the rospy.rostime.Duration instance to a float.
         """
         try:
-            return (rosMsg.to_sec(), {})
+            return rosMsg.to_sec()
         except AttributeError:
             raise TypeError('Received object is not a Duration instance.')
 
@@ -129,7 +246,7 @@ class _TimeConverter(object):
         except AttributeError:
             raise TypeError('Received object is not a Time instance.')
 
-        return (dt.isoformat(), {})
+        return dt.isoformat()
 
 
 # Check custom time classes whether the interface is correctly implemented
@@ -172,6 +289,21 @@ class Converter(object):
         self._loader = loader
         self._customTypes = {}
 
+        # Settings and instances of the custom Converters
+        self._settings = {}
+        self._customs = {}
+        self._configured = WeakSet()
+        self.threaded = False
+
+        # Compiled encode/decode functions for each ROS message class
+        self._encoders = {}
+        self._decoders = {}
+
+        # Compiled transcoders for serialized ROS messages; None if the class
+        # can not be transcoded directly
+        self._readers = {}
+        self._writers = {}
+
     def addCustomConverter(self, converter):
         """ Register a new custom Converter.
 
@@ -193,6 +325,7 @@ class Converter(object):
 
         self._customTypes[converter.MESSAGE_TYPE] = (converter,
             self._loader.loadMsg(pkg, name))
+        self._invalidate()
 
     def removeCustomConverter(self, msgType):
         """ Unregister a custom Converter.
@@ -208,44 +341,181 @@ class Converter(object):
             InternalError('Tried to remove a custom converter which was '
                           'never added.')
 
-    def _encode(self, rosMsg):
-        """ Internally used method which is responsible for the heavy lifting.
+        self._invalidate()
+
+    def _invalidate(self):
+        """ Internally used method to drop all compiled encode/decode functions
+            after the set of custom Converters has changed.
         """
-        data = {}
+        self._encoders.clear()
+        self._decoders.clear()
+        self._readers.clear()
+        self._writers.clear()
+        self._customs.clear()
 
-        for (slotName, slotType) in zip(rosMsg.__slots__, rosMsg._slot_types):
-            if '[]' == slotType[-2:]:
-                listBool = True
-                slotType = slotType[:-2]
-            else:
-                listBool = False
+        for converter in self._configured:
+            converter._invalidate()
+
+    def _getCustom(self, msgType):
+        """ Internally used method to get the instance of the custom Converter
+            for a message type, which is created with the settings of this
+            Converter.
+        """
+        try:
+            return self._customs[msgType]
+        except KeyError:
+            converter = self._customTypes[msgType][0]
+            instance = converter(**self._settings.get(msgType, {}))
+            self._customs[msgType] = instance
+            return instance
+
+    def configure(self, settings):
+        """ Get a Converter which uses the same custom Converters as this
+            Converter, but which creates them with the given settings, e.g.
+            to select the image format of an interface.
+
+            @param settings:    Keyword arguments for the custom Converters
+                                by message type, i.e.
+                                    { 'sensor_msgs/Image' : { 'format' : 'jpeg',
+                                                              'quality' : 80 } }
+            @type  settings:    { str : { str : value } }
+
+            @return:            Configured Converter. Its attribute 'threaded'
+                                is set if one of its custom Converters should
+                                be used in the thread pool.
+            @rtype:             rce.util.converter.Converter
+
+            @raise:             TypeError, ValueError
+        """
+        converter = Converter(self._loader)
+        converter._customTypes = self._customTypes
+        converter._settings = {}
+
+        for msgType, kw in settings.iteritems():
+            if msgType not in self._customTypes:
+                raise ValueError("There is no custom Converter for message "
+                                 "type '{0}'.".format(msgType))
+
+            if not isinstance(kw, dict):
+                raise TypeError("Settings for message type '{0}' have to be "
+                                'a dictionary.'.format(msgType))
+
+            converter._settings[str(msgType)] = dict((str(k), v)
+                                                     for k, v in kw.iteritems())
+
+            # Create the custom Converter to check the settings
+            if getattr(converter._getCustom(str(msgType)), 'threaded', False):
+                converter.threaded = True
+
+        self._configured.add(converter)
+        return converter
+
+    @property
+    def settings(self):
+        """ Settings of the custom Converters by message type. """
+        return self._settings
+
+    def _splitType(self, slotType):
+        """ Internally used method to split the type of a slot into the type
+            of the elements and a flag whether the slot is an array, i.e.
+            variable ('[]') or fixed length ('[N]').
+        """
+        if ']' == slotType[-1:]:
+            return slotType[:slotType.index('[')], True
+
+        return slotType, False
+
+    def _buildEncoder(self, msgCls, arrays, var, lines, ns):
+        """ Internally used method to generate the code which encodes the ROS
+            message stored in the variable 'var'. Nested ROS messages are
+            inlined. If the flag 'arrays' is set, numeric arrays are encoded as
+            typed binary blobs.
+
+            @return:        Expression which evaluates to the encoded data.
+            @rtype:         str
+        """
+        items = []
+
+        for (slotName, slotType) in zip(msgCls.__slots__, msgCls._slot_types):
+            slotType, listBool = self._splitType(slotType)
+            attr = '{0}.{1}'.format(var, slotName)
 
             if slotType in self._BASE_TYPES:
-                convFunc = self._BASE_TYPES[slotType]
+                convFunc = _ref(ns, self._BASE_TYPES[slotType])
             elif slotType in self._SPECIAL_TYPES:
-                convFunc = self._SPECIAL_TYPES[slotType]().encode
+                convFunc = _ref(ns, self._SPECIAL_TYPES[slotType]().encode)
             elif slotType in self._customTypes:
-                convFunc = self._customTypes[slotType][0]().encode
+                convFunc = _ref(ns, self._getCustom(slotType).encode)
+            elif listBool:
+                convFunc = _ref(ns, partial(self._encode, arrays=arrays))
             else:
-                convFunc = self._encode
+                nested = '_m{0}'.format(len(lines))
+                lines.append('{0} = {1}'.format(nested, attr))
+                items.append('{0!r}: {1}'.format(slotName, self._buildEncoder(
+                    self._loader.loadMsg(*slotType.split('/')), arrays, nested,
+                    lines, ns)))
+                continue
 
-            if listBool:
-                convFunc = partial(map, convFunc)
+            if listBool and arrays and slotType in DTYPES:
+                expr = '{0}({1})'.format(
+                    _ref(ns, partial(packArray, DTYPES[slotType])), attr)
+            elif listBool and slotType in DTYPES:
+                # Numeric arrays deserialized by genpy are tuples which
+                # already contain elements of the correct type
+                value = '_a{0}'.format(len(lines))
+                lines.append('{0} = {1}'.format(value, attr))
+                expr = ('(list({0}) if {0}.__class__ is tuple else '
+                        'map({1}, {0}))'.format(value, convFunc))
+            elif listBool:
+                expr = 'map({0}, {1})'.format(convFunc, attr)
+            else:
+                expr = '{0}({1})'.format(convFunc, attr)
 
-            try:
-                data[slotName] = convFunc(getattr(rosMsg, slotName))
-            except ValueError as e:
-                raise ValueError('{0}.{1}: {2}'.format(
-                                     rosMsg.__class__.__name__, slotName, e))
+            items.append('{0!r}: {1}'.format(slotName, expr))
 
-        return data
+        return '{{{0}}}'.format(', '.join(items))
 
-    def encode(self, rosMsg):
+    def _compileEncoder(self, msgCls, arrays):
+        """ Internally used method to build the encode function for a ROS
+            message class.
+        """
+        for msgType, (_, cls) in self._customTypes.iteritems():
+            if issubclass(msgCls, cls):
+                return self._getCustom(msgType).encode
+
+        ns = {'_name' : msgCls.__name__}
+        lines = []
+        expr = self._buildEncoder(msgCls, arrays, '_m', lines, ns)
+        lines.append('return {0}'.format(expr))
+
+        lines = (['try:'] + ['    ' + line for line in lines] +
+                 ['except ValueError as e:',
+                  "    raise ValueError('{0}: {1}'.format(_name, e))"])
+        return _compile('encode', '_m', lines, ns)
+
+    def _encode(self, rosMsg, arrays=False):
+        """ Internally used method which is responsible for the heavy lifting.
+        """
+        key = (rosMsg.__class__, arrays)
+
+        try:
+            encoder = self._encoders[key]
+        except KeyError:
+            encoder = self._encoders[key] = self._compileEncoder(*key)
+
+        return encoder(rosMsg)
+
+    def encode(self, rosMsg, arrays=False):
         """ Generate JSON compatible data from a ROS message.
 
             @param rosMsg:  The ROS message instance which should be converted.
             @type  rosMsg:  ROS message instance
 
+            @param arrays:  Flag whether numeric arrays should be encoded as
+                            typed binary blobs (array mode) instead of lists;
+                            see rce.comm.arrays.
+            @type  arrays:  bool
+
             @return:        Dictionary containing the parsed message. The basic
                             form does map each field in the ROS message to a
                             key / value pair in the returned data dict. Binaries
@@ -258,51 +528,105 @@ class Converter(object):
             raise TypeError('Given rosMsg object is not an instance of '
                             'genpy.message.Message.')
 
-        for converter, cls in self._customTypes.itervalues():
-            if isinstance(rosMsg, cls):
-                return converter().encode(rosMsg)
+        return self._encode(rosMsg, arrays)
 
-        return self._encode(rosMsg)
-
-    def _decode(self, msgCls, data):
-        """ Internally used method which is responsible for the heavy lifting.
+    def _buildDecoder(self, msgCls, msgVar, dataVar, lines, ns, indent):
+        """ Internally used method to generate the code which fills the data
+            stored in the variable 'dataVar' into the ROS message stored in the
+            variable 'msgVar'. Nested ROS messages are inlined.
         """
-        rosMsg = msgCls()
+        pad = '    ' * indent
 
-        for (slotName, slotType) in zip(rosMsg.__slots__, rosMsg._slot_types):
-            if slotName not in data:
-                continue
-
-            if '[]' == slotType[-2:]:
-                listBool = True
-                slotType = slotType[:-2]
-            else:
-                listBool = False
+        for (slotName, slotType) in zip(msgCls.__slots__, msgCls._slot_types):
+            slotType, listBool = self._splitType(slotType)
+            attr = '{0}.{1}'.format(msgVar, slotName)
+            field = '{0}[{1!r}]'.format(dataVar, slotName)
 
-            field = data[slotName]
-
-            if listBool and not isinstance(field, (list, tuple)):
-                raise TypeError('Given data does not match the definition of '
-                                'the ROS message.')
+            lines.append('{0}if {1!r} in {2}:'.format(pad, slotName, dataVar))
 
             if slotType == 'string':
-                convFunc = _stringify
+                convFunc = _ref(ns, _stringify)
             elif slotType in self._BASE_TYPES:
-                convFunc = self._BASE_TYPES[slotType]
+                convFunc = _ref(ns, self._BASE_TYPES[slotType])
             elif slotType in self._SPECIAL_TYPES:
-                convFunc = self._SPECIAL_TYPES[slotType]().decode
-            elif slotType in self._customTypes and _checkIsStringIO(field):
-                convFunc = self._customTypes[slotType][0]().decode
+                convFunc = _ref(ns, self._SPECIAL_TYPES[slotType]().decode)
             else:
-                convFunc = partial(self._decode,
-                                   self._loader.loadMsg(*slotType.split('/')))
+                nested = self._loader.loadMsg(*slotType.split('/'))
 
-            if listBool:
-                convFunc = partial(map, convFunc)
+                if slotType in self._customTypes:
+                    convFunc = _ref(ns, partial(_decodeCustom,
+                        self._getCustom(slotType).decode,
+                        partial(self._decode, nested)))
+                elif listBool:
+                    convFunc = _ref(ns, partial(self._decode, nested))
+                else:
+                    n = len(lines)
+                    lines.append('{0}    _d{1} = {2}'.format(pad, n, field))
+                    lines.append('{0}    _m{1} = {2}'.format(pad, n, attr))
+                    self._buildDecoder(nested, '_m{0}'.format(n),
+                                       '_d{0}'.format(n), lines, ns, indent + 1)
+                    continue
 
-            setattr(rosMsg, slotName, convFunc(field))
+            if listBool and slotType in DTYPES:
+                # Numeric arrays can be sent as typed binary blobs as well
+                lines.append('{0}    _f = {1}'.format(pad, field))
+                lines.append('{0}    if _f.__class__ is dict:'.format(pad))
+                lines.append('{0}        {1} = _unpack(_f, True)'
+                             ''.format(pad, attr))
+                lines.append('{0}    elif not isinstance(_f, (list, tuple)):'
+                             ''.format(pad))
+                lines.append('{0}        raise TypeError(_listError)'
+                             ''.format(pad))
+                lines.append('{0}    else:'.format(pad))
+                lines.append('{0}        {1} = map({2}, _f)'.format(pad, attr,
+                                                                convFunc))
+            elif listBool and slotType in _BYTE_TYPES:
+                # Byte arrays can be sent as binaries as well
+                lines.append('{0}    _f = {1}'.format(pad, field))
+                lines.append('{0}    if _isBinary(_f):'.format(pad))
+                lines.append('{0}        {1} = _f.getvalue()'.format(pad, attr))
+                lines.append('{0}    elif not isinstance(_f, (list, tuple)):'
+                             ''.format(pad))
+                lines.append('{0}        raise TypeError(_listError)'
+                             ''.format(pad))
+                lines.append('{0}    else:'.format(pad))
+                lines.append('{0}        {1} = map({2}, _f)'.format(pad, attr,
+                                                                convFunc))
+            elif listBool:
+                lines.append('{0}    _f = {1}'.format(pad, field))
+                lines.append('{0}    if not isinstance(_f, (list, tuple)):'
+                             ''.format(pad))
+                lines.append('{0}        raise TypeError(_listError)'
+                             ''.format(pad))
+                lines.append('{0}    {1} = map({2}, _f)'.format(pad, attr,
+                                                            convFunc))
+            else:
+                lines.append('{0}    {1} = {2}({3})'.format(pad, attr,
+                                                          convFunc, field))
 
-        return rosMsg
+    def _compileDecoder(self, msgCls):
+        """ Internally used method to build the decode function for a ROS
+            message class.
+        """
+        ns = {'_cls' : msgCls, '_unpack' : unpackArray,
+              '_isBinary' : _checkIsStringIO,
+              '_listError' : 'Given data does not match the definition of '
+                             'the ROS message.'}
+        lines = ['_m = _cls()']
+        self._buildDecoder(msgCls, '_m', '_d', lines, ns, 0)
+        lines.append('return _m')
+
+        return _compile('decode', '_d', lines, ns)
+
+    def _decode(self, msgCls, data):
+        """ Internally used method which is responsible for the heavy lifting.
+        """
+        try:
+            decoder = self._decoders[msgCls]
+        except KeyError:
+            decoder = self._decoders[msgCls] = self._compileDecoder(msgCls)
+
+        return decoder(data)
 
     def decode(self, msgCls, data):
         """ Generate a ROS message from JSON compatible data.
@@ -323,8 +647,383 @@ class Converter(object):
                             rce.util.loader.ResourceNotFound
         """
         if _checkIsStringIO(data):
-            for converter, cls in self._customTypes.itervalues():
+            for msgType, (_, cls) in self._customTypes.iteritems():
                 if msgCls == cls:
-                    return converter().decode(msgCls, data)
+                    return self._getCustom(msgType).decode(data)
 
         return self._decode(msgCls, data)
+
+    # Transcoding between serialized ROS messages and JSON compatible data
+
+    def _checkTranscodable(self, msgCls):
+        """ Internally used method to check whether a ROS message class can be
+            transcoded directly, i.e. it does not use a custom Converter.
+        """
+        for _, cls in self._customTypes.itervalues():
+            if issubclass(msgCls, cls):
+                raise _Untranscodable()
+
+    def _buildReader(self, msgCls, arrays, lines, ns, pending, names):
+        """ Internally used method to generate the code which reads the ROS
+            message of the given class from the buffer '_b' at the offset '_o'.
+            Nested ROS messages are inlined.
+
+            @return:        Expression which evaluates to the encoded data.
+            @rtype:         str
+        """
+        self._checkTranscodable(msgCls)
+        items = []
+
+        for (slotName, slotType) in zip(msgCls.__slots__, msgCls._slot_types):
+            length = _arrayLength(slotType)
+            slotType, listBool = self._splitType(slotType)
+
+            if slotType in self._customTypes or slotType in _BYTE_TYPES:
+                raise _Untranscodable()
+
+            if not listBool:
+                if slotType in _WIRE_FORMATS:
+                    value = names()
+                    pending.append((value, _WIRE_FORMATS[slotType]))
+
+                    if slotType == 'bool':
+                        value = 'bool({0})'.format(value)
+                elif slotType == 'string':
+                    value = names()
+                    _flushReads(lines, ns, pending)
+                    lines.append('{0}, = _u32.unpack_from(_b, _o)'.format(
+                                                                        value))
+                    lines.append('_o += 4')
+                    lines.append('{0} = _b[_o:_o + {0}]'.format(value))
+                    lines.append('_o += len({0})'.format(value))
+                elif slotType in self._SPECIAL_TYPES:
+                    secs, nsecs = names(), names()
+                    fmt = 'I' if slotType == 'time' else 'i'
+                    pending.extend(((secs, fmt), (nsecs, fmt)))
+                    value = '{0}({1}, {2})'.format(_ref(ns, partial(
+                        _encodeStamp, _STAMP_TYPES[slotType],
+                        self._SPECIAL_TYPES[slotType]().encode)), secs, nsecs)
+                else:
+                    value = self._buildReader(
+                        self._loader.loadMsg(*slotType.split('/')), arrays,
+                        lines, ns, pending, names)
+
+                items.append('{0!r}: {1}'.format(slotName, value))
+                continue
+
+            if slotType in self._SPECIAL_TYPES:
+                raise _Untranscodable()
+
+            _flushReads(lines, ns, pending)
+            value = names()
+
+            if length is None:
+                count = names()
+                lines.append('{0}, = _u32.unpack_from(_b, _o)'.format(count))
+                lines.append('_o += 4')
+            else:
+                count = str(length)
+
+            if slotType in _WIRE_FORMATS:
+                fmt = _WIRE_FORMATS[slotType]
+                size = struct.calcsize(fmt)
+
+                if arrays and slotType in DTYPES:
+                    lines.append('{0} = _packBuffer({1!r}, _b, _o, {2})'
+                                 ''.format(value, DTYPES[slotType], count))
+                else:
+                    lines.append("{0} = _unpack('<%d{1}' % {2}, _b, _o)"
+                                 ''.format(value, fmt, count))
+
+                    if slotType == 'bool':
+                        lines.append('{0} = map(bool, {0})'.format(value))
+                    else:
+                        lines.append('{0} = list({0})'.format(value))
+
+                lines.append('_o += {0} * {1}'.format(count, size))
+            elif slotType == 'string':
+                lines.append('{0} = []'.format(value))
+                lines.append('for _i in xrange({0}):'.format(count))
+                lines.append('    _n, = _u32.unpack_from(_b, _o)')
+                lines.append('    _o += 4')
+                lines.append('    {0}.append(_b[_o:_o + _n])'.format(value))
+                lines.append('    _o += _n')
+            else:
+                reader = self._getReader(
+                    self._loader.loadMsg(*slotType.split('/')), arrays)
+
+                if not reader:
+                    raise _Untranscodable()
+
+                lines.append('{0} = []'.format(value))
+                lines.append('for _i in xrange({0}):'.format(count))
+                lines.append('    _x, _o = {0}(_b, _o)'.format(_ref(ns,
+                                                                    reader)))
+                lines.append('    {0}.append(_x)'.format(value))
+
+            items.append('{0!r}: {1}'.format(slotName, value))
+
+        return '{{{0}}}'.format(', '.join(items))
+
+    def _getReader(self, msgCls, arrays):
+        """ Internally used method to get the function which reads a serialized
+            ROS message of the given class from a buffer at an offset and
+            returns the encoded data and the new offset.
+
+            @return:        Reader function or None, if the class can not be
+                            transcoded directly.
+            @rtype:         callable / None
+        """
+        key = (msgCls, arrays)
+
+        try:
+            return self._readers[key]
+        except KeyError:
+            pass
+
+        ns = {'_u32' : _U32, '_unpack' : struct.unpack_from,
+              '_packBuffer' : packBuffer}
+        lines = []
+        pending = []
+
+        try:
+            expr = self._buildReader(msgCls, arrays, lines, ns, pending,
+                                     imap('_v{0}'.format, count()).next)
+        except _Untranscodable:
+            reader = None
+        else:
+            _flushReads(lines, ns, pending)
+            lines.append('return {0}, _o'.format(expr))
+            reader = _compile('read', '_b, _o', lines, ns)
+
+        self._readers[key] = reader
+        return reader
+
+    def _buildWriter(self, msgCls, dataVar, lines, ns, pending, names):
+        """ Internally used method to generate the code which appends the
+            serialized form of the data stored in the variable 'dataVar' to the
+            list '_p'. Nested ROS messages are inlined.
+        """
+        self._checkTranscodable(msgCls)
+
+        for (slotName, slotType) in zip(msgCls.__slots__, msgCls._slot_types):
+            length = _arrayLength(slotType)
+            slotType, listBool = self._splitType(slotType)
+            field = '{0}[{1!r}]'.format(dataVar, slotName)
+            check = '{0!r} in {1}'.format(slotName, dataVar)
+
+            if slotType in self._customTypes or slotType in _BYTE_TYPES:
+                raise _Untranscodable()
+
+            if not listBool:
+                value = names()
+
+                if slotType in _WIRE_FORMATS:
+                    convFunc = self._BASE_TYPES[slotType]
+                    lines.append('{0} = {1}({2}) if {3} else {4!r}'.format(
+                        value, _ref(ns, convFunc), field, check, convFunc()))
+                    pending.append((value, _WIRE_FORMATS[slotType]))
+                elif slotType == 'string':
+                    lines.append("{0} = {1}({2}) if {3} else ''".format(
+                        value, _ref(ns, _stringify), field, check))
+                    _flushWrites(lines, ns, pending)
+                    lines.append('_p.append(_u32.pack(len({0})))'.format(
+                                                                        value))
+                    lines.append('_p.append({0})'.format(value))
+                elif slotType in self._SPECIAL_TYPES:
+                    lines.append('{0} = {1}({2}) if {3} else {4}'.format(
+                        value,
+                        _ref(ns, self._SPECIAL_TYPES[slotType]().decode),
+                        field, check, _ref(ns, _STAMP_TYPES[slotType]())))
+                    fmt = 'I' if slotType == 'time' else 'i'
+                    pending.append(('{0}.secs'.format(value), fmt))
+                    pending.append(('{0}.nsecs'.format(value), fmt))
+                else:
+                    lines.append('{0} = {1} if {2} else _empty'.format(
+                        value, field, check))
+                    self._buildWriter(
+                        self._loader.loadMsg(*slotType.split('/')), value,
+                        lines, ns, pending, names)
+
+                continue
+
+            if slotType in self._SPECIAL_TYPES:
+                raise _Untranscodable()
+
+            value = names()
+
+            if slotType in _WIRE_FORMATS:
+                default = (self._BASE_TYPES[slotType](),) * (length or 0)
+            elif slotType == 'string':
+                default = ('',) * (length or 0)
+            else:
+                default = ({},) * (length or 0)
+
+            lines.append('if {0}:'.format(check))
+            lines.append('    {0} = {1}'.format(value, field))
+
+            if slotType in DTYPES:
+                # Numeric arrays can be sent as typed binary blobs as well
+                lines.append('    if {0}.__class__ is dict:'.format(value))
+                lines.append('        {0} = _unpackArray({0}, True)'
+                             ''.format(value))
+                lines.append('    elif isinstance({0}, (list, tuple)):'
+                             ''.format(value))
+                lines.append('        {0} = map({1}, {0})'.format(
+                    value, _ref(ns, self._BASE_TYPES[slotType])))
+                lines.append('    else:')
+                lines.append('        raise TypeError(_listError)')
+            else:
+                lines.append('    if not isinstance({0}, (list, tuple)):'
+                             ''.format(value))
+                lines.append('        raise TypeError(_listError)')
+
+                if slotType in _WIRE_FORMATS:
+                    lines.append('    {0} = map({1}, {0})'.format(
+                        value, _ref(ns, self._BASE_TYPES[slotType])))
+
+            lines.append('else:')
+            lines.append('    {0} = {1!r}'.format(value, default))
+
+            _flushWrites(lines, ns, pending)
+
+            if length is None:
+                lines.append('_p.append(_u32.pack(len({0})))'.format(value))
+            else:
+                lines.append('if len({0}) != {1}:'.format(value, length))
+                lines.append('    raise ValueError(_lengthError)')
+
+            if slotType in DTYPES:
+                lines.append('_p.append(_packValues({0!r}, {1}))'.format(
+                                                    DTYPES[slotType], value))
+            elif slotType in _WIRE_FORMATS:
+                lines.append("_p.append(_pack('<%d{0}' % len({1}), *{1}))"
+                             ''.format(_WIRE_FORMATS[slotType], value))
+            elif slotType == 'string':
+                lines.append('for _x in {0}:'.format(value))
+                lines.append('    _x = {0}(_x)'.format(_ref(ns, _stringify)))
+                lines.append('    _p.append(_u32.pack(len(_x)))')
+                lines.append('    _p.append(_x)')
+            else:
+                writer = self._getWriter(
+                    self._loader.loadMsg(*slotType.split('/')))
+
+                if not writer:
+                    raise _Untranscodable()
+
+                lines.append('for _x in {0}:'.format(value))
+                lines.append('    {0}(_x, _p)'.format(_ref(ns, writer)))
+
+    def _getWriter(self, msgCls):
+        """ Internally used method to get the function which appends the
+            serialized form of the data of a ROS message of the given class
+            to a list.
+
+            @return:        Writer function or None, if the class can not be
+                            transcoded directly.
+            @rtype:         callable / None
+        """
+        try:
+            return self._writers[msgCls]
+        except KeyError:
+            pass
+
+        ns = {'_u32' : _U32, '_pack' : struct.pack, '_empty' : {},
+              '_packValues' : packValues, '_unpackArray' : unpackArray,
+              '_listError' : 'Given data does not match the definition of '
+                             'the ROS message.',
+              '_lengthError' : 'Given data does not match the length of a '
+                               'fixed size array.'}
+        lines = []
+        pending = []
+
+        try:
+            self._buildWriter(msgCls, '_d', lines, ns, pending,
+                              imap('_v{0}'.format, count()).next)
+        except _Untranscodable:
+            writer = None
+        else:
+            _flushWrites(lines, ns, pending)
+            lines.append('pass')
+            writer = _compile('write', '_d, _p', lines, ns)
+
+        self._writers[msgCls] = writer
+        return writer
+
+    def encodeSerialized(self, msgCls, msg, arrays=False):
+        """ Generate JSON compatible data directly from a serialized ROS
+            message without creating the ROS message.
+
+            Messages which use a custom Converter or contain byte arrays are
+            deserialized and encoded as usual.
+
+            @param msgCls:  ROS message class of the serialized message.
+            @type  msgCls:  ROS Message class
+
+            @param msg:     Serialized ROS message.
+            @type  msg:     str
+
+            @param arrays:  Flag whether numeric arrays should be encoded as
+                            typed binary blobs (array mode).
+            @type  arrays:  bool
+
+            @return:        Dictionary containing the parsed message; see
+                            encode.
+            @rtype:         {}
+
+            @raise:         TypeError, ValueError
+        """
+        reader = self._getReader(msgCls, arrays)
+
+        if not reader:
+            rosMsg = msgCls()
+            rosMsg.deserialize(msg)
+            return self.encode(rosMsg, arrays)
+
+        try:
+            data, offset = reader(msg, 0)
+        except struct.error as e:
+            raise ValueError('{0}: {1}'.format(msgCls.__name__, e))
+
+        if offset > len(msg):
+            raise ValueError('{0}: Serialized message is too '
+                             'short.'.format(msgCls.__name__))
+
+        return data
+
+    def decodeSerialized(self, msgCls, data):
+        """ Generate a serialized ROS message directly from JSON compatible
+            data without creating the ROS message.
+
+            Messages which use a custom Converter or contain byte arrays are
+            decoded and serialized as usual.
+
+            @param msgCls:  ROS message class into which the decoded data
+                            should filled.
+            @type  msgCls:  ROS Message class
+
+            @param data:    Dictionary with keys matching the fields in the
+                            desired ROS message; see decode.
+            @param data:    { str : {} }
+
+            @return:        Serialized ROS message.
+            @rtype:         str
+
+            @raise:         TypeError, ValueError,
+                            rce.util.loader.ResourceNotFound
+        """
+        writer = self._getWriter(msgCls)
+
+        if not writer or not isinstance(data, dict):
+            buf = StringIO()
+            self.decode(msgCls, data).serialize(buf)
+            return buf.getvalue()
+
+        parts = []
+
+        try:
+            writer(data, parts)
+        except struct.error as e:
+            raise ValueError('{0}: {1}'.format(msgCls.__name__, e))
+
+        return ''.join(parts)
@@ -31,6 +31,8 @@
 #
 
 # Python specific imports
+from array import array
+
 try:
     from cStringIO import StringIO, InputType, OutputType
     from StringIO import StringIO as pyStringIO
@@ -44,10 +46,14 @@ except ImportError:
         return isinstance(obj, StringIO)
 
 try:
-    import Image
+    from PIL import Image, PngImagePlugin
 except ImportError:
-    print('Can not import Python Image Library.')
-    exit(1)
+    try:
+        import Image
+        import PngImagePlugin
+    except ImportError:
+        print('Can not import Python Image Library.')
+        exit(1)
 
 # ROS specific imports
 try:
@@ -61,22 +67,94 @@ except ImportError:
 from zope.interface import implements
 
 # rce specific imports
+from rce.comm.binary import BinaryBuffer
 from rce.util.converters.interfaces import ICustomROSConverter
 
 
+FORMAT_RAW = 'raw'
+FORMAT_PNG = 'png'
+FORMAT_JPEG = 'jpeg'
+
+FORMATS = (FORMAT_RAW, FORMAT_PNG, FORMAT_JPEG)
+
+
+def _toBytes(img, rawMode):
+    """ Internally used method to get the raw pixel data of a PIL image.
+    """
+    try:
+        return img.tobytes('raw', rawMode)
+    except AttributeError:
+        # PIL before Pillow 2.0
+        return img.tostring('raw', rawMode)
+
+
 class ImageConverter(object):
-    """ Convert images from PNG file format to ROS sensor message format and
-        back.
+    """ Convert images from ROS sensor message format to PNG/JPEG file format
+        or raw pixel data and back.
+
+        The converter is instantiated once per interface with the settings
+        which have been given for the interface:
+
+            format      'raw' (pixel data is passed through), 'png' (default)
+                        or 'jpeg'; images which can not be stored as JPEG,
+                        i.e. images with alpha channel, 16 bit images or
+                        bayer patterns, are stored as PNG instead
+            level       PNG compression level (0 - 9; default: 6)
+            quality     JPEG quality (1 - 95; default: 85)
+            scale       Factor (0 - 1] by which the images are downscaled;
+                        bayer patterns are not scaled (default: 1)
+            threaded    Flag whether the images should be converted in the
+                        thread pool instead of the reactor thread
+                        (default: False)
     """
     implements(ICustomROSConverter)
 
     MESSAGE_TYPE = 'sensor_msgs/Image'
 
-    _ENCODINGMAP_PY_TO_ROS = { 'L' : 'mono8', 'RGB' : 'rgb8',
-                               'RGBA' : 'rgba8', 'YCbCr' : 'yuv422' }
-    _ENCODINGMAP_ROS_TO_PY = { 'mono8' : 'L', 'rgb8' : 'RGB',
-                               'rgba8' : 'RGBA', 'yuv422' : 'YCbCr' }
-    _PIL_MODE_CHANNELS = { 'L' : 1, 'RGB' : 3, 'RGBA' : 4, 'YCbCr' : 3 }
+    # Mapping from ROS encoding to (PIL mode, PIL raw mode, bytes per pixel)
+    _ENCODINGS = { 'mono8'       : ('L', 'L', 1),
+                   'rgb8'        : ('RGB', 'RGB', 3),
+                   'bgr8'        : ('RGB', 'BGR', 3),
+                   'rgba8'       : ('RGBA', 'RGBA', 4),
+                   'bgra8'       : ('RGBA', 'BGRA', 4),
+                   'mono16'      : ('I;16', 'I;16', 2),
+                   '16UC1'       : ('I;16', 'I;16', 2),
+                   'bayer_rggb8' : ('L', 'L', 1),
+                   'bayer_bggr8' : ('L', 'L', 1),
+                   'bayer_gbrg8' : ('L', 'L', 1),
+                   'bayer_grbg8' : ('L', 'L', 1) }
+
+    # Encoding which is used for images without (valid) encoding information
+    _DEFAULT_ENCODINGS = { 'L' : 'mono8', 'RGB' : 'rgb8', 'RGBA' : 'rgba8',
+                           'I;16' : 'mono16' }
+
+    _JPEG_MODES = ('L', 'RGB')
+
+    def __init__(self, format=FORMAT_PNG, level=6, quality=85, scale=1.0,
+                 threaded=False):
+        """ Initialize the Image Converter.
+
+            @raise:     TypeError, ValueError
+        """
+        if format not in FORMATS:
+            raise ValueError("Image format '{0}' is not supported.".format(
+                                                                        format))
+
+        if not 0 <= int(level) <= 9:
+            raise ValueError('PNG compression level has to be in the range '
+                             '0 - 9.')
+
+        if not 1 <= int(quality) <= 95:
+            raise ValueError('JPEG quality has to be in the range 1 - 95.')
+
+        if not 0.0 < float(scale) <= 1.0:
+            raise ValueError('Scale has to be in the range (0, 1].')
+
+        self._format = str(format)
+        self._level = int(level)
+        self._quality = int(quality)
+        self._scale = float(scale)
+        self.threaded = bool(threaded)
 
     def decode(self, imgObj):
         """ Convert a image stored (PIL library readable image file format)
@@ -86,49 +164,110 @@ class ImageConverter(object):
         if not _checkIsStringIO(imgObj):
             raise TypeError('Given object is not a StringIO instance.')
 
-        # Checking of image according to django.forms.fields.ImageField
+        # Loading the image decodes it completely, which verifies the content
         try:
             imgObj.seek(0)
             img = Image.open(imgObj)
-            img.verify()
-        except:
+            img.load()
+        except Exception:
             raise ValueError('Content of given image could not be verified.')
 
-        imgObj.seek(0)
-        img = Image.open(imgObj)
-        img.load()
+        # 16 bit images are opened as 32 bit images
+        mode = 'I;16' if img.mode == 'I' else img.mode
 
-        # Everything ok, convert PIL.Image to ROS and return it
-        if img.mode == 'P':
-            img = img.convert('RGB')
+        if mode not in self._DEFAULT_ENCODINGS:
+            img = img.convert('RGBA' if 'A' in img.mode else 'RGB')
+            mode = img.mode
+
+        # PNG images created by this converter store the original encoding
+        encoding = img.info.get('encoding')
+
+        if self._ENCODINGS.get(encoding, (None,))[0] != mode:
+            encoding = self._DEFAULT_ENCODINGS[mode]
+
+        _, rawMode, size = self._ENCODINGS[encoding]
 
         rosimage = sensor_msgs.msg.Image()
-        rosimage.encoding = ImageConverter._ENCODINGMAP_PY_TO_ROS[img.mode]
+        rosimage.encoding = encoding
         (rosimage.width, rosimage.height) = img.size
-        rosimage.step = (ImageConverter._PIL_MODE_CHANNELS[img.mode]
-                         * rosimage.width)
-        rosimage.data = img.tostring()
+        rosimage.step = size * rosimage.width
+
+        if img.mode == 'I':
+            # There is only a big endian packer for 32 bit images
+            data = array('H', _toBytes(img, 'I;16B'))
+            data.byteswap()
+            rosimage.data = data.tostring()
+        else:
+            rosimage.data = _toBytes(img, rawMode)
+
         return rosimage
 
     def encode(self, rosMsg):
-        """ Convert a ROS compatible message (sensor_msgs.Image) to a
-            PNG encoded image stored in a StringIO object.
+        """ Convert a ROS compatible message (sensor_msgs.Image) to a PNG or
+            JPEG encoded image stored in a StringIO object or to a dictionary
+            with the raw pixel data (format 'raw').
         """
         if not isinstance(rosMsg, sensor_msgs.msg.Image):
             raise TypeError('Given object is not a sensor_msgs.msg.Image '
                             'instance.')
 
-        # Convert to PIL Image
-        pil = Image.fromstring(
-                ImageConverter._ENCODINGMAP_ROS_TO_PY[rosMsg.encoding],
-                (rosMsg.width, rosMsg.height),
-                rosMsg.data,
-                'raw',
-                ImageConverter._ENCODINGMAP_ROS_TO_PY[rosMsg.encoding],
-                0,
-                1)
-
-        # Save to StringIO
-        img = StringIO()
-        pil.save(img, 'PNG')
-        return img
+        encoding = rosMsg.encoding
+
+        try:
+            mode, rawMode, size = self._ENCODINGS[encoding]
+        except KeyError:
+            raise ValueError("Image encoding '{0}' is not "
+                             'supported.'.format(encoding))
+
+        bayer = encoding.startswith('bayer')
+        scale = 1.0 if bayer else self._scale
+        data = rosMsg.data
+
+        if self._format == FORMAT_RAW and scale == 1.0:
+            return self._encodeRaw(encoding, rosMsg.width, rosMsg.height,
+                                   rosMsg.step, rosMsg.is_bigendian, data)
+
+        if size == 2 and rosMsg.is_bigendian:
+            # PIL can only handle 16 bit images in little endian byte order
+            data = array('H', data)
+            data.byteswap()
+            data = data.tostring()
+
+        # The image references the data of the message without copying it
+        try:
+            img = Image.frombuffer(mode, (rosMsg.width, rosMsg.height),
+                                   data, 'raw', rawMode, rosMsg.step, 1)
+        except ValueError as e:
+            raise ValueError('Image data does not match the image size: '
+                             '{0}'.format(e))
+
+        if scale < 1.0:
+            width = max(int(rosMsg.width * scale), 1)
+            height = max(int(rosMsg.height * scale), 1)
+            img = img.resize((width, height), Image.NEAREST if size == 2
+                                              else Image.BILINEAR)
+
+        if self._format == FORMAT_RAW:
+            return self._encodeRaw(encoding, img.size[0], img.size[1],
+                                   img.size[0] * size, 0,
+                                   _toBytes(img, rawMode))
+
+        buf = StringIO()
+
+        if (self._format == FORMAT_JPEG and mode in self._JPEG_MODES and
+                not bayer):
+            img.save(buf, 'JPEG', quality=self._quality)
+        else:
+            info = PngImagePlugin.PngInfo()
+            info.add_text('encoding', encoding)
+            img.save(buf, 'PNG', compress_level=self._level, pnginfo=info)
+
+        return buf
+
+    def _encodeRaw(self, encoding, width, height, step, bigendian, data):
+        """ Internally used method to create the dictionary for the format
+            'raw'. The pixel data is sent as a binary without copying it.
+        """
+        return {'encoding':encoding, 'width':width, 'height':height,
+                'step':step, 'is_bigendian':bigendian,
+                'data':BinaryBuffer(data)}
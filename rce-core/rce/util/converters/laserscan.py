@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     rce-core/rce/util/converters/laserscan.py
+#
+#     This file is part of the RoboEarth Cloud Engine framework.
+#
+#     This file was originally created for RoboEearth
+#     http://www.roboearth.org/
+#
+#     The research leading to these results has received funding from
+#     the European Union Seventh Framework Programme FP7/2007-2013 under
+#     grant agreement no248942 RoboEarth.
+#
+#     Copyright 2012 RoboEarth
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+#     \author/s: Dominique Hunziker
+#
+#
+
+# Python specific imports
+try:
+    from cStringIO import InputType, OutputType
+    from StringIO import StringIO as pyStringIO
+
+    def _checkIsStringIO(obj):
+        return isinstance(obj, (InputType, OutputType, pyStringIO))
+except ImportError:
+    from StringIO import StringIO
+
+    def _checkIsStringIO(obj):
+        return isinstance(obj, StringIO)
+
+try:
+    import numpy
+except ImportError:
+    print('Can not import numpy.')
+    exit(1)
+
+# ROS specific imports
+try:
+    import sensor_msgs.msg
+except ImportError:
+    print("Can not import the required ROS Python library 'sensor_msgs'.")
+    print('Make sure they are installed and the ROS Environment is setup.')
+    exit(1)
+
+# zope specific imports
+from zope.interface import implements
+
+# rce specific imports
+from rce.comm.sensors import packLaserScan, unpackLaserScan
+from rce.util.converters.interfaces import ICustomROSConverter
+
+
+class LaserScanConverter(object):
+    """ Convert laser scans from ROS sensor message format to packed binary
+        blobs (see rce.comm.sensors) and back.
+
+        The converter is instantiated once per interface with the settings
+        which have been given for the interface:
+
+            resolution  Resolution in meters of the fixed-point ranges; 0
+                        sends the ranges as floating point values
+                        (default: 0)
+            intensities Flag whether the intensities are sent
+                        (default: True)
+            step        Only every n-th beam is sent (default: 1)
+            level       Deflate compression level (0 - 9); 0 disables the
+                        compression (default: 0)
+            threaded    Flag whether the laser scans should be converted in
+                        the thread pool instead of the reactor thread
+                        (default: False)
+    """
+    implements(ICustomROSConverter)
+
+    MESSAGE_TYPE = 'sensor_msgs/LaserScan'
+
+    def __init__(self, resolution=0.0, intensities=True, step=1, level=0,
+                 threaded=False):
+        """ Initialize the LaserScan Converter.
+
+            @raise:     TypeError, ValueError
+        """
+        if float(resolution) < 0:
+            raise ValueError('Resolution can not be negative.')
+
+        if int(step) < 1:
+            raise ValueError('Step has to be at least 1.')
+
+        if not 0 <= int(level) <= 9:
+            raise ValueError('Compression level has to be in the range '
+                             '0 - 9.')
+
+        self._resolution = float(resolution)
+        self._intensities = bool(intensities)
+        self._step = int(step)
+        self._level = int(level)
+        self.threaded = bool(threaded)
+
+    def decode(self, data):
+        """ Convert a packed laser scan stored in a StringIO object to a ROS
+            compatible message (sensor_msgs.LaserScan).
+        """
+        if not _checkIsStringIO(data):
+            raise TypeError('Given object is not a StringIO instance.')
+
+        scan = unpackLaserScan(data)
+
+        rosMsg = sensor_msgs.msg.LaserScan()
+
+        seq, secs, nsecs, frameID = scan.pop('header')
+        rosMsg.header.seq = seq
+        rosMsg.header.stamp.secs = secs
+        rosMsg.header.stamp.nsecs = nsecs
+        rosMsg.header.frame_id = frameID
+
+        rosMsg.ranges = scan.pop('ranges').tolist()
+        rosMsg.intensities = scan.pop('intensities').tolist()
+
+        for name, value in scan.iteritems():
+            setattr(rosMsg, name, value)
+
+        return rosMsg
+
+    def encode(self, rosMsg):
+        """ Convert a ROS compatible message (sensor_msgs.LaserScan) to a
+            packed laser scan stored in a StringIO object.
+        """
+        if not isinstance(rosMsg, sensor_msgs.msg.LaserScan):
+            raise TypeError('Given object is not a sensor_msgs.msg.LaserScan '
+                            'instance.')
+
+        step = self._step
+        ranges = numpy.asarray(rosMsg.ranges, numpy.float64)[::step]
+
+        if self._intensities:
+            intensities = numpy.asarray(rosMsg.intensities,
+                                        numpy.float32)[::step]
+        else:
+            intensities = ()
+
+        increment = rosMsg.angle_increment * step
+
+        if step > 1:
+            angleMax = rosMsg.angle_min + max(len(ranges) - 1, 0) * increment
+        else:
+            angleMax = rosMsg.angle_max
+
+        header = rosMsg.header
+        return packLaserScan((header.seq, header.stamp.secs,
+                              header.stamp.nsecs, header.frame_id),
+                             (rosMsg.angle_min, angleMax, increment,
+                              rosMsg.time_increment * step, rosMsg.scan_time,
+                              rosMsg.range_min, rosMsg.range_max),
+                             ranges, intensities, self._resolution,
+                             self._level)
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     rce-core/rce/util/converters/pointcloud.py
+#
+#     This file is part of the RoboEarth Cloud Engine framework.
+#
+#     This file was originally created for RoboEearth
+#     http://www.roboearth.org/
+#
+#     The research leading to these results has received funding from
+#     the European Union Seventh Framework Programme FP7/2007-2013 under
+#     grant agreement no248942 RoboEarth.
+#
+#     Copyright 2012 RoboEarth
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+#     \author/s: Dominique Hunziker
+#
+#
+
+# Python specific imports
+try:
+    from cStringIO import InputType, OutputType
+    from StringIO import StringIO as pyStringIO
+
+    def _checkIsStringIO(obj):
+        return isinstance(obj, (InputType, OutputType, pyStringIO))
+except ImportError:
+    from StringIO import StringIO
+
+    def _checkIsStringIO(obj):
+        return isinstance(obj, StringIO)
+
+try:
+    import numpy
+except ImportError:
+    print('Can not import numpy.')
+    exit(1)
+
+# ROS specific imports
+try:
+    import sensor_msgs.msg
+except ImportError:
+    print("Can not import the required ROS Python library 'sensor_msgs'.")
+    print('Make sure they are installed and the ROS Environment is setup.')
+    exit(1)
+
+# zope specific imports
+from zope.interface import implements
+
+# rce specific imports
+from rce.comm.sensors import DTYPES, packPointCloud, unpackPointCloud
+from rce.util.converters.interfaces import ICustomROSConverter
+
+
+class PointCloud2Converter(object):
+    """ Convert point clouds from ROS sensor message format to packed binary
+        blobs (see rce.comm.sensors) and back.
+
+        The converter is instantiated once per interface with the settings
+        which have been given for the interface:
+
+            fields      Names of the fields which are sent, e.g.
+                        ['x', 'y', 'z'] (default: all fields)
+            resolution  Resolution in meters of the fixed-point coordinates
+                        (x, y, z); 0 sends the coordinates as floating point
+                        values (default: 0)
+            voxel       Edge length in meters of the voxels used for the
+                        decimation; only the first point of each voxel is
+                        sent and points with non-finite coordinates are
+                        dropped; 0 disables the decimation (default: 0)
+            level       Deflate compression level (0 - 9); 0 disables the
+                        compression (default: 0)
+            threaded    Flag whether the point clouds should be converted in
+                        the thread pool instead of the reactor thread
+                        (default: False)
+    """
+    implements(ICustomROSConverter)
+
+    MESSAGE_TYPE = 'sensor_msgs/PointCloud2'
+
+    def __init__(self, fields=None, resolution=0.0, voxel=0.0, level=0,
+                 threaded=False):
+        """ Initialize the PointCloud2 Converter.
+
+            @raise:     TypeError, ValueError
+        """
+        if fields is not None:
+            if not isinstance(fields, (list, tuple)):
+                raise TypeError('Fields have to be a list of field names.')
+
+            fields = tuple(str(field) for field in fields)
+
+        if float(resolution) < 0:
+            raise ValueError('Resolution can not be negative.')
+
+        if float(voxel) < 0:
+            raise ValueError('Voxel size can not be negative.')
+
+        if not 0 <= int(level) <= 9:
+            raise ValueError('Compression level has to be in the range '
+                             '0 - 9.')
+
+        self._fields = fields
+        self._resolution = float(resolution)
+        self._voxel = float(voxel)
+        self._level = int(level)
+        self.threaded = bool(threaded)
+
+    def _view(self, rosMsg):
+        """ Internally used method to get a structured array of the points
+            which references the data of the message.
+        """
+        points = rosMsg.height * rosMsg.width
+        pointStep = rosMsg.point_step
+        size = rosMsg.width * pointStep
+        order = '>' if rosMsg.is_bigendian else '<'
+
+        names = []
+        formats = []
+        offsets = []
+
+        for field in rosMsg.fields:
+            if field.datatype not in DTYPES:
+                raise ValueError("Field '{0}' has an unknown "
+                                 'datatype.'.format(field.name))
+
+            if not field.count:
+                continue
+
+            dtype = numpy.dtype(DTYPES[field.datatype]).newbyteorder(order)
+            names.append(field.name)
+            formats.append((dtype, (field.count,)) if field.count > 1
+                           else dtype)
+            offsets.append(field.offset)
+
+        try:
+            dtype = numpy.dtype({'names':names, 'formats':formats,
+                                 'offsets':offsets, 'itemsize':pointStep})
+        except ValueError as e:
+            raise ValueError('Fields do not match the point step: '
+                             '{0}'.format(e))
+
+        data = numpy.frombuffer(rosMsg.data, numpy.uint8)
+
+        if rosMsg.height and len(data) < ((rosMsg.height - 1) *
+                                          rosMsg.row_step + size):
+            raise ValueError('Point cloud data does not match the point '
+                             'cloud size.')
+
+        if rosMsg.row_step == size or rosMsg.height <= 1:
+            data = data[:points * pointStep]
+        else:
+            # Remove the padding at the end of the rows
+            data = numpy.lib.stride_tricks.as_strided(
+                data, (rosMsg.height, size), (rosMsg.row_step, 1))
+            data = numpy.ascontiguousarray(data).reshape(-1)
+
+        return data.view(dtype)
+
+    def _decimate(self, cloud):
+        """ Internally used method to keep only the first point of each voxel.
+        """
+        try:
+            xyz = numpy.column_stack((cloud['x'], cloud['y'], cloud['z']))
+        except ValueError:
+            raise ValueError('Voxel decimation requires the fields x, y '
+                             'and z.')
+
+        indices = numpy.flatnonzero(numpy.isfinite(xyz).all(axis=1))
+        keys = numpy.floor(xyz[indices] / self._voxel).astype(numpy.int64)
+
+        # numpy.unique supports rows only since numpy 1.13; lexsort is stable,
+        # hence the first point of each voxel comes first in its group
+        order = numpy.lexsort(keys.T)
+        keys = keys[order]
+        first = numpy.empty(len(order), bool)
+        first[:1] = True
+        first[1:] = (keys[1:] != keys[:-1]).any(axis=1)
+        return cloud[indices[numpy.sort(order[first])]]
+
+    def decode(self, data):
+        """ Convert a packed point cloud stored in a StringIO object to a ROS
+            compatible message (sensor_msgs.PointCloud2).
+        """
+        if not _checkIsStringIO(data):
+            raise TypeError('Given object is not a StringIO instance.')
+
+        cloud = unpackPointCloud(data)
+        points = cloud['height'] * cloud['width']
+
+        dtype = numpy.dtype([(name, DTYPES[datatype], values.shape[1:])
+                             for name, datatype, values in cloud['fields']])
+        array = numpy.empty(points, dtype)
+
+        rosMsg = sensor_msgs.msg.PointCloud2()
+
+        for name, datatype, values in cloud['fields']:
+            array[name] = values
+
+            field = sensor_msgs.msg.PointField()
+            field.name = name
+            field.offset = dtype.fields[name][1]
+            field.datatype = datatype
+            field.count = values.shape[1] if values.ndim > 1 else 1
+            rosMsg.fields.append(field)
+
+        seq, secs, nsecs, frameID = cloud['header']
+        rosMsg.header.seq = seq
+        rosMsg.header.stamp.secs = secs
+        rosMsg.header.stamp.nsecs = nsecs
+        rosMsg.header.frame_id = frameID
+
+        rosMsg.height = cloud['height']
+        rosMsg.width = cloud['width']
+        rosMsg.is_bigendian = False
+        rosMsg.is_dense = cloud['is_dense']
+        rosMsg.point_step = dtype.itemsize
+        rosMsg.row_step = dtype.itemsize * cloud['width']
+        rosMsg.data = array.tostring()
+        return rosMsg
+
+    def encode(self, rosMsg):
+        """ Convert a ROS compatible message (sensor_msgs.PointCloud2) to a
+            packed point cloud stored in a StringIO object.
+        """
+        if not isinstance(rosMsg, sensor_msgs.msg.PointCloud2):
+            raise TypeError('Given object is not a sensor_msgs.msg.PointCloud2 '
+                            'instance.')
+
+        cloud = self._view(rosMsg)
+        height, width = rosMsg.height, rosMsg.width
+        isDense = rosMsg.is_dense
+
+        if self._voxel:
+            cloud = self._decimate(cloud)
+            height, width = 1, len(cloud)
+            isDense = True
+
+        datatypes = dict((field.name, field.datatype)
+                         for field in rosMsg.fields if field.count)
+        names = self._fields or cloud.dtype.names
+
+        for name in names:
+            if name not in datatypes:
+                raise ValueError("Point cloud has no field '{0}'.".format(name))
+
+        header = rosMsg.header
+        return packPointCloud((header.seq, header.stamp.secs,
+                               header.stamp.nsecs, header.frame_id),
+                              height, width, isDense,
+                              [(name, datatypes[name], cloud[name])
+                               for name in names],
+                              self._resolution, level=self._level)
@@ -0,0 +1,541 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     rce-core/rce/util/executor.py
+#
+#     This file is part of the RoboEarth Cloud Engine framework.
+#
+#     This file was originally created for RoboEearth
+#     http://www.roboearth.org/
+#
+#     The research leading to these results has received funding from
+#     the European Union Seventh Framework Programme FP7/2007-2013 under
+#     grant agreement no248942 RoboEarth.
+#
+#     Copyright 2012 RoboEarth
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+#     \author/s: Dominique Hunziker
+#
+#
+
+# Python specific imports
+from collections import deque
+from functools import partial
+from multiprocessing import Pool, TimeoutError
+from time import time
+
+try:
+    from cStringIO import StringIO, InputType, OutputType
+    from StringIO import StringIO as pyStringIO
+
+    def _checkIsStringIO(obj):
+        return isinstance(obj, (InputType, OutputType, pyStringIO))
+except ImportError:
+    from StringIO import StringIO
+
+    def _checkIsStringIO(obj):
+        return isinstance(obj, StringIO)
+
+# twisted specific imports
+from twisted.python import log
+from twisted.python.failure import Failure
+from twisted.python.threadpool import ThreadPool
+from twisted.internet.task import LoopingCall
+from twisted.internet.threads import deferToThreadPool
+
+# rce specific imports
+from rce.util.loader import Loader
+from rce.util.converter import Converter
+
+
+MODE_INLINE = 'inline'
+MODE_THREAD = 'thread'
+MODE_PROCESS = 'process'
+
+MODES = (MODE_INLINE, MODE_THREAD, MODE_PROCESS)
+
+
+class QueueFull(Exception):
+    """ Exception is raised in case a conversion is submitted to a queue which
+        already holds the maximal number of pending conversions.
+    """
+
+
+def estimateSize(msg, limit):
+    """ Estimate the size of a message in bytes.
+
+        @param msg:         Message in serialized form or JSON compatible
+                            message.
+        @type  msg:         str / dict
+
+        @param limit:       Size in bytes after which the estimation is
+                            aborted.
+        @type  limit:       int
+
+        @return:            Estimated size of the message in bytes; at least
+                            limit if the estimation has been aborted.
+        @rtype:             int
+    """
+    size = 0
+    stack = [msg]
+
+    while stack:
+        obj = stack.pop()
+
+        if isinstance(obj, basestring):
+            size += len(obj)
+        elif isinstance(obj, dict):
+            stack.extend(obj.itervalues())
+        elif isinstance(obj, (list, tuple)):
+            if obj and (isinstance(obj[0], (basestring, dict, list, tuple)) or
+                        _checkIsStringIO(obj[0])):
+                stack.extend(obj)
+            else:
+                # Arrays of numbers are homogeneous; no need to look at the
+                # elements
+                size += 8 * len(obj)
+        elif _checkIsStringIO(obj):
+            pos = obj.tell()
+            obj.seek(0, 2)
+            size += obj.tell()
+            obj.seek(pos)
+        else:
+            size += 8
+
+        if size >= limit:
+            break
+
+    return size
+
+
+class _Binary(str):
+    """ Marker for binaries, i.e. StringIO objects, which are sent between
+        processes.
+    """
+
+
+def _freeze(obj):
+    """ Internally used function to replace all binaries in a message such
+        that the message can be sent to another process.
+    """
+    if _checkIsStringIO(obj):
+        return _Binary(obj.getvalue())
+
+    if isinstance(obj, dict):
+        return dict((key, _freeze(value)) for key, value in obj.iteritems())
+
+    if isinstance(obj, (list, tuple)) and obj:
+        if isinstance(obj[0], (dict, list, tuple)) or _checkIsStringIO(obj[0]):
+            return obj.__class__(_freeze(value) for value in obj)
+
+    return obj
+
+
+def _thaw(obj):
+    """ Internally used function to restore the binaries of a message which
+        was received from another process.
+    """
+    if isinstance(obj, _Binary):
+        return StringIO(str(obj))
+
+    if isinstance(obj, dict):
+        return dict((key, _thaw(value)) for key, value in obj.iteritems())
+
+    if isinstance(obj, (list, tuple)) and obj:
+        if isinstance(obj[0], (_Binary, dict, list, tuple)):
+            return obj.__class__(_thaw(value) for value in obj)
+
+    return obj
+
+
+def _classSpec(msgCls):
+    """ Internally used function to get the description of a ROS message
+        class which is used to load the class in a worker process.
+    """
+    pkg, kind = msgCls.__module__.split('.')[:2]
+    name = msgCls._type.split('/')[1]
+
+    if kind == 'srv':
+        for suffix, attr in (('Request', '_request_class'),
+                             ('Response', '_response_class')):
+            if name.endswith(suffix):
+                return pkg, kind, name[:-len(suffix)], attr
+
+    return pkg, kind, name, None
+
+
+# State of a worker process: loader, converter and configured converters
+_worker = None
+
+
+def _initWorker(rosPath, customConverters):
+    """ Internally used function to initialize a worker process.
+    """
+    global _worker
+
+    loader = Loader(rosPath)
+    converter = Converter(loader)
+
+    for customConverter in customConverters:
+        module, className = customConverter.rsplit('.', 1)
+        mod = __import__(module, fromlist=[className])
+        converter.addCustomConverter(getattr(mod, className))
+
+    _worker = (loader, converter, {})
+
+
+def _convertInProcess(method, spec, settings, args):
+    """ Internally used function to run a conversion in a worker process.
+
+        @return:            Tuple of a flag whether the conversion was
+                            successful and the converted message or the
+                            error message.
+        @rtype:             (bool, str / dict)
+    """
+    loader, converter, configured = _worker
+
+    try:
+        if settings:
+            key = repr(sorted((msgType, sorted(kw.iteritems()))
+                              for msgType, kw in settings.iteritems()))
+
+            try:
+                converter = configured[key]
+            except KeyError:
+                converter = converter.configure(settings)
+                configured[key] = converter
+
+        pkg, kind, name, attr = spec
+
+        if kind == 'srv':
+            msgCls = getattr(loader.loadSrv(pkg, name), attr)
+        else:
+            msgCls = loader.loadMsg(pkg, name)
+
+        msg = getattr(converter, method)(msgCls, *_thaw(args))
+        return True, _freeze(msg)
+    except Exception as e:
+        return False, '{0}: {1}'.format(e.__class__.__name__, e)
+
+
+class ConversionExecutor(object):
+    """ Executor which runs the conversions of the Converter interfaces off
+        the reactor thread such that a large message does not block all other
+        connections of the robot process.
+
+        The executor supports the modes
+            inline      All conversions run in the reactor thread.
+            thread      Conversions run in a thread pool; suited for the
+                        custom Converters which release the GIL, e.g. PIL.
+            process     Conversions run in a pool of worker processes, which
+                        have their own Converter.
+
+        Messages below a size threshold are always converted inline, as the
+        handoff would take longer than the conversion itself, unless the
+        Converter requests to be threaded. Each interface uses its own
+        ConversionQueue, which delivers the messages in order.
+
+        A conversion in a worker process which fails outside of the Converter,
+        e.g. because the message can not be pickled or the worker process
+        dies, or which takes longer than PROCESS_TIMEOUT seconds is reported
+        as failed, such that the queue of the interface is not blocked.
+    """
+    # CONFIG
+    PROCESS_TIMEOUT = 30  # Seconds after which a conversion in a process fails
+    REAP_INTERVAL = 1  # Interval in seconds to check the running conversions
+
+    def __init__(self, reactor, mode=MODE_THREAD, workers=4, queueSize=32,
+                 inlineSize=65536, rosPath=None, customConverters=()):
+        """ Initialize the Conversion Executor.
+
+            @param reactor:     Reference to the twisted reactor.
+            @type  reactor:     twisted::reactor
+
+            @param mode:        Mode of the executor; 'inline', 'thread' or
+                                'process'.
+            @type  mode:        str
+
+            @param workers:     Number of worker threads/processes.
+            @type  workers:     int
+
+            @param queueSize:   Maximal number of pending conversions per
+                                interface.
+            @type  queueSize:   int
+
+            @param inlineSize:  Size in bytes below which messages are
+                                converted in the reactor thread.
+            @type  inlineSize:  int
+
+            @param rosPath:     Ordered list of paths to search for resources
+                                in the worker processes.
+            @type  rosPath:     [str] / None
+
+            @param customConverters:    Full paths of the classes of the
+                                custom Converters which are used in the
+                                worker processes.
+            @type  customConverters:    [str]
+
+            @raise:             ValueError
+        """
+        if mode not in MODES:
+            raise ValueError("Conversion mode '{0}' is not "
+                             'supported.'.format(mode))
+
+        if workers < 1:
+            raise ValueError('Number of conversion workers has to be at '
+                             'least 1.')
+
+        if queueSize < 1:
+            raise ValueError('Size of conversion queue has to be at least 1.')
+
+        self._reactor = reactor
+        self._mode = mode
+        self._queueSize = queueSize
+        self._inlineSize = inlineSize
+        self._specs = {}
+        self._pool = None
+
+        # Conversions which run in a worker process; list of tuples of the form
+        # (deadline, AsyncResult, queue, entry)
+        self._running = []
+        self._reaper = LoopingCall(self._reap)
+
+        if mode == MODE_THREAD:
+            self._pool = ThreadPool(1, workers, 'RCEConversion')
+            reactor.callWhenRunning(self._pool.start)
+            reactor.addSystemEventTrigger('during', 'shutdown',
+                                          self._pool.stop)
+        elif mode == MODE_PROCESS:
+            self._pool = Pool(workers, _initWorker,
+                              (rosPath, tuple(customConverters)))
+            reactor.callWhenRunning(self._reaper.start, self.REAP_INTERVAL)
+            reactor.addSystemEventTrigger('during', 'shutdown',
+                                          self._terminateProcesses)
+
+    @property
+    def mode(self):
+        """ Mode of the executor. """
+        return self._mode
+
+    def createQueue(self, name):
+        """ Create a new queue for an interface.
+
+            @param name:        Name of the interface which is used for the
+                                log messages.
+            @type  name:        str
+
+            @return:            New conversion queue.
+            @rtype:             rce.util.executor.ConversionQueue
+        """
+        return ConversionQueue(self, name, self._queueSize)
+
+    def _isInline(self, converter, msg):
+        """ Internally used method to check whether a conversion should be run
+            in the reactor thread.
+        """
+        if not self._pool:
+            return True
+
+        if getattr(converter, 'threaded', False):
+            return False
+
+        return estimateSize(msg, self._inlineSize) < self._inlineSize
+
+    def _submit(self, converter, method, msgCls, args, queue, entry):
+        """ Internally used method to run a conversion in the pool.
+        """
+        if self._mode == MODE_THREAD:
+            d = deferToThreadPool(self._reactor, self._pool,
+                                  getattr(converter, method), msgCls, *args)
+            d.addCallbacks(queue._converted, queue._failed,
+                           callbackArgs=(entry,), errbackArgs=(entry,))
+        else:
+            try:
+                spec = self._specs[msgCls]
+            except KeyError:
+                spec = self._specs[msgCls] = _classSpec(msgCls)
+
+            try:
+                result = self._pool.apply_async(
+                    _convertInProcess,
+                    (method, spec, converter.settings, _freeze(args)),
+                    callback=partial(self._reactor.callFromThread,
+                                     queue._processed, entry))
+            except Exception:
+                queue._failed(Failure(), entry)
+                return
+
+            self._running.append((time() + self.PROCESS_TIMEOUT, result,
+                                  queue, entry))
+
+    def _reap(self):
+        """ Internally used method to report the conversions in the worker
+            processes which failed or timed out.
+        """
+        now = time()
+        running = []
+
+        for item in self._running:
+            deadline, result, queue, entry = item
+
+            if entry[0]:
+                continue
+
+            if result.ready():
+                # A successful result has already been passed on to the queue
+                if not result.successful():
+                    try:
+                        result.get(0)
+                    except Exception:
+                        queue._failed(Failure(), entry)
+            elif deadline < now:
+                queue._failed(Failure(TimeoutError(
+                    'Conversion did not finish within {0} '
+                    'seconds.'.format(self.PROCESS_TIMEOUT))), entry)
+            else:
+                running.append(item)
+
+        self._running = running
+
+    def _terminateProcesses(self):
+        """ Internally used method to stop the worker processes.
+        """
+        if self._reaper.running:
+            self._reaper.stop()
+
+        self._running = []
+        self._pool.terminate()
+        self._pool.join()
+
+
+class ConversionQueue(object):
+    """ Queue of the conversions of an interface. The converted messages are
+        delivered in the order in which they were submitted.
+    """
+    def __init__(self, executor, name, size):
+        """ Initialize the Conversion Queue.
+
+            @param executor:    Executor which runs the conversions.
+            @type  executor:    rce.util.executor.ConversionExecutor
+
+            @param name:        Name of the interface which is used for the
+                                log messages.
+            @type  name:        str
+
+            @param size:        Maximal number of pending conversions.
+            @type  size:        int
+        """
+        self._executor = executor
+        self._name = name
+        self._size = size
+        self._pending = deque()
+
+    def convert(self, converter, method, msgCls, args, callback, *cbArgs):
+        """ Convert a message.
+
+            @param converter:   Converter which should be used.
+            @type  converter:   rce.util.converter.Converter
+
+            @param method:      Name of the method of the Converter which
+                                should be used; 'encodeSerialized' or
+                                'decodeSerialized'.
+            @type  method:      str
+
+            @param msgCls:      ROS message class of the message.
+            @type  msgCls:      genpy.message.Message
+
+            @param args:        Arguments for the method of the Converter;
+                                the first argument is the message.
+            @type  args:        tuple
+
+            @param callback:    Callable which is called with the converted
+                                message and the additional arguments.
+            @type  callback:    callable
+
+            @raise:             rce.util.executor.QueueFull, TypeError,
+                                ValueError (if converted inline)
+        """
+        pending = self._pending
+
+        if len(pending) >= self._size:
+            raise QueueFull('Conversion queue of interface "{0}" is '
+                            'full.'.format(self._name))
+
+        if self._executor._isInline(converter, args[0]):
+            msg = getattr(converter, method)(msgCls, *args)
+
+            if pending:
+                pending.append([True, msg, callback, cbArgs])
+            else:
+                callback(msg, *cbArgs)
+
+            return
+
+        entry = [False, None, callback, cbArgs]
+        pending.append(entry)
+        self._executor._submit(converter, method, msgCls, args, self, entry)
+
+    def clear(self):
+        """ Drop all pending conversions.
+        """
+        self._pending.clear()
+
+    def _converted(self, msg, entry):
+        entry[0] = True
+        entry[1] = msg
+        self._flush()
+
+    def _failed(self, failure, entry):
+        if failure.check(TypeError, ValueError, TimeoutError):
+            log.msg('Message of interface "{0}" could not be converted: '
+                    '{1}'.format(self._name, failure.getErrorMessage()))
+        else:
+            log.err(failure)
+
+        entry[0] = True
+        self._flush()
+
+    def _processed(self, entry, result):
+        if entry[0]:
+            # The conversion has already been reported as failed
+            return
+
+        success, msg = result
+
+        if success:
+            entry[1] = _thaw(msg)
+        else:
+            log.msg('Message of interface "{0}" could not be converted: '
+                    '{1}'.format(self._name, msg))
+
+        entry[0] = True
+        self._flush()
+
+    def _flush(self):
+        """ Internally used method to deliver all converted messages whose
+            predecessors have been delivered.
+        """
+        pending = self._pending
+
+        while pending and pending[0][0]:
+            _, msg, callback, args = pending.popleft()
+
+            if msg is None:
+                continue
+
+            try:
+                callback(msg, *args)
+            except Exception:
+                log.err()
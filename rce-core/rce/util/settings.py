@@ -210,6 +210,16 @@ class _Settings(object):
         # Converters
         self._converters = None
 
+        # Conversion
+        self._conversion_mode = None
+        self._conversion_workers = None
+        self._conversion_queue = None
+        self._conversion_inline = None
+
+        # Preload
+        self._preload_msgs = None
+        self._preload_srvs = None
+
         # Machine
         self._size = None
         self._cpu = None
@@ -332,6 +342,45 @@ class _Settings(object):
         """
         return self._converters
 
+    @property
+    def conversion_mode(self):
+        """ Mode which is used to run the conversions of the Converter
+            interfaces in the Robot processes; 'inline', 'thread' or
+            'process'.
+        """
+        return self._conversion_mode
+
+    @property
+    def conversion_workers(self):
+        """ Number of threads/processes which run the conversions. """
+        return self._conversion_workers
+
+    @property
+    def conversion_queue(self):
+        """ Maximal number of pending conversions per interface. """
+        return self._conversion_queue
+
+    @property
+    def conversion_inline(self):
+        """ Size in bytes below which messages are converted in the reactor
+            thread.
+        """
+        return self._conversion_inline
+
+    @property
+    def preload_msgs(self):
+        """ List of message types which are loaded in the background when a
+            Robot process is started.
+        """
+        return self._preload_msgs
+
+    @property
+    def preload_srvs(self):
+        """ List of service types which are loaded in the background when a
+            Robot process is started.
+        """
+        return self._preload_srvs
+
     @property
     def size(self):
         """ Maximum number of containers which can run in the machine. """
@@ -432,6 +481,30 @@ class _Settings(object):
         # Converters
         settings._converters = tuple(c for _, c in parser.items('converters'))
 
+        # Conversion (optional section)
+        if parser.has_section('conversion'):
+            settings._conversion_mode = parser.get('conversion', 'mode')
+            settings._conversion_workers = parser.getint('conversion',
+                                                         'workers')
+            settings._conversion_queue = parser.getint('conversion',
+                                                       'queue_size')
+            settings._conversion_inline = parser.getint('conversion',
+                                                        'inline_size')
+        else:
+            settings._conversion_mode = 'thread'
+            settings._conversion_workers = 4
+            settings._conversion_queue = 32
+            settings._conversion_inline = 65536
+
+        # Preload (optional section)
+        for name, option in (('_preload_msgs', 'messages'),
+                             ('_preload_srvs', 'services')):
+            if parser.has_option('preload', option):
+                value = parser.get('preload', option)
+                setattr(settings, name, tuple(t for t in value.split() if t))
+            else:
+                setattr(settings, name, ())
+
         # Machine
         settings._size = parser.getint('machine', 'size')
         settings._cpu = parser.getint('machine', 'cpu')
@@ -28,7 +28,8 @@
 #
 #     \author/s: Dominique Hunziker
 #
-#     This file is based on the module roslib.launcher of the ROS library:
+#     This file is based on the modules roslib.launcher and roslib.packages
+#     of the ROS library:
 #
 #         Licensed under the Software License Agreement (BSD License)
 #
@@ -67,16 +68,59 @@
 # Python specific imports
 import os
 import sys
+import stat
+import json
+import time
+import tempfile
+from hashlib import sha256
+from threading import RLock
 
 # ROS specific imports
 try:
     import rospkg
-    import roslib.packages
 except ImportError:
     print('Can not import ROS Python libraries.')
     print('Make sure they are installed and the ROS Environment is setup.')
     exit(1)
 
+try:
+    from catkin.find_in_workspaces import find_in_workspaces
+except ImportError:
+    # Only the package directories are searched for executables
+    find_in_workspaces = None
+
+
+# Version of the format of the index file
+_INDEX_VERSION = 1
+
+_MANIFEST_FILE = 'manifest.xml'
+_PACKAGE_FILE = 'package.xml'
+
+
+def _isExecutable(path):
+    """ roslib.packages
+
+        Internally used function to check whether a file is executable.
+    """
+    try:
+        mode = os.stat(path).st_mode
+    except OSError:
+        return False
+
+    flags = stat.S_IRUSR | stat.S_IXUSR
+    return stat.S_ISREG(mode) and (mode & flags) == flags
+
+
+def _getMTime(path):
+    """ Internally used function to get the modification time of a file or
+        None if the file does not exist.
+    """
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
 class ResourceNotFound(Exception):
     """ Exception is raised by the Loader when a resource can not be found.
     """
@@ -88,15 +132,52 @@ class Loader(object):
         nodes/executables in packages.
         To increase the speed the Loader has a cache for the classes and the
         paths to the nodes.
+
+        The locations, the dependencies and the Python paths of the packages
+        are stored in an index file, which is shared by all processes using
+        the same ROS path. New entries are written in one go at the end of
+        a lookup or of 'preload'. An entry of the index is valid as long as the
+        manifests of the package and its dependencies are not modified; the
+        whole index is discarded if a directory of the ROS path is modified.
     """
-    def __init__(self, rosPath=None):
+    def __init__(self, rosPath=None, indexPath=None):
         """ Initialize the Loader.
 
             @param rosPath:     Ordered list of paths to search for resources.
                                 If None (default), use environment ROS path.
             @type  rosPath:     [str] / None
+
+            @param indexPath:   Path to the index file. If None (default),
+                                'rce/loader-[hash of ROS path].json' in the
+                                ROS home directory is used.
+            @type  indexPath:   str / None
         """
-        self._rp = rospkg.RosPack(rosPath)
+        self._rosPath = list(rosPath or rospkg.get_ros_paths())
+        self._rp = rospkg.RosPack(self._rosPath)
+
+        if not indexPath:
+            key = sha256(os.pathsep.join(self._rosPath)).hexdigest()[:16]
+            indexPath = os.path.join(rospkg.get_ros_home(), 'rce',
+                                     'loader-{0}.json'.format(key))
+
+        self._indexPath = indexPath
+        self._roots = dict((path, _getMTime(path)) for path in self._rosPath)
+
+        # Key:    package name
+        # Value:  dict with the keys
+        #             'path'        package directory
+        #             'catkin'      flag whether the package is catkin-ized
+        #             'depends'     non catkin-ized dependencies
+        #             'pythonPath'  paths which have to be added to sys.path
+        #             'stamps'      modification times of the manifests of
+        #                           the package and its dependencies
+        self._index = self._loadIndex()
+
+        # Packages whose entries have not yet been written to the index file
+        self._dirty = set()
+
+        # Number of running preloads, which write the index file at the end
+        self._preloading = 0
 
         # List of all packages which are already added to sys.path
         self._packages = set()
@@ -105,6 +186,26 @@ class Loader(object):
         # Value:  msg/srv module
         self._moduleCache = {}
 
+        # Key:    tuple (package name, clsType, cls)
+        # Value:  time in seconds which was used to load the module
+        self._loadTimes = {}
+
+        # Key:    package name
+        # Value:  tuple (dict executable name -> paths,
+        #                dict directory -> modification time)
+        self._nodes = {}
+
+        # The classes can be loaded in a background thread (see preload)
+        self._lock = RLock()
+
+    @property
+    def loadTimes(self):
+        """ Time in seconds which was used to load the msg/srv modules; the
+            keys are tuples of the form (package name, 'msg'/'srv', class
+            name). Classes which were found in the cache are not included.
+        """
+        return self._loadTimes.copy()
+
     def _getDepends(self, pkg):
         """ roslib.launcher
 
@@ -120,6 +221,136 @@ class Loader(object):
         vals = self._rp.get_depends(pkg, implicit=True)
         return [v for v in vals if not self._rp.get_manifest(v).is_catkin]
 
+    def _loadIndex(self):
+        """ Internally used method to read the package entries from the
+            index file. An empty index is returned if the file is missing or
+            was created for another ROS path.
+        """
+        try:
+            with open(self._indexPath, 'r') as f:
+                index = json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+        try:
+            if (index['version'] != _INDEX_VERSION or
+                    index['rosPath'] != self._rosPath or
+                    index['roots'] != self._roots):
+                return {}
+
+            return index['packages']
+        except (KeyError, TypeError):
+            return {}
+
+    def _saveIndex(self, pkgs):
+        """ Internally used method to write the given packages to the index
+            file. The entries which have been added in the meantime by other
+            processes are kept.
+        """
+        packages = self._loadIndex()
+        packages.update((pkg, self._index[pkg]) for pkg in pkgs)
+
+        index = {'version':_INDEX_VERSION, 'rosPath':self._rosPath,
+                 'roots':self._roots, 'packages':packages}
+
+        dirname = os.path.dirname(self._indexPath)
+
+        try:
+            if not os.path.isdir(dirname):
+                os.makedirs(dirname)
+
+            # Replace the file atomically such that readers never see a
+            # partially written index
+            fd, tmp = tempfile.mkstemp(dir=dirname)
+
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(index, f)
+
+                os.rename(tmp, self._indexPath)
+            except:
+                os.remove(tmp)
+                raise
+        except (IOError, OSError) as e:
+            print('Can not write loader index: {0}'.format(e))
+
+    def _isCurrent(self, entry):
+        """ Internally used method to check whether none of the manifests of
+            a package entry has been modified.
+        """
+        return all(_getMTime(manifest) == mtime
+                   for manifest, mtime in entry['stamps'].iteritems())
+
+    def _stamp(self, entry, pkg):
+        """ Internally used method to add the modification time of the
+            manifest of a package to an entry.
+        """
+        pkgDir = self._rp.get_path(pkg)
+
+        # rospkg uses the package.xml, if it exists
+        for name in (_PACKAGE_FILE, _MANIFEST_FILE):
+            manifest = os.path.join(pkgDir, name)
+            mtime = _getMTime(manifest)
+
+            if mtime is not None:
+                entry['stamps'][manifest] = mtime
+                break
+
+        return pkgDir
+
+    def _getPackage(self, pkg):
+        """ Internally used method to get the index entry of a package. The
+            entry is created using rospkg if it is missing or outdated.
+
+            @param pkg:     Name of the package.
+            @type  pkg:     str
+
+            @return:        Index entry of the package.
+            @rtype:         dict
+
+            @raise:         rospkg.ResourceNotFound
+        """
+        with self._lock:
+            entry = self._getPackageEntry(pkg)
+
+            if not self._preloading:
+                self._flushIndex()
+
+            return entry
+
+    def _flushIndex(self):
+        """ Internally used method to write the new package entries to the
+            index file.
+        """
+        if self._dirty:
+            pkgs, self._dirty = self._dirty, set()
+            self._saveIndex(pkgs)
+
+    def _getPackageEntry(self, pkg):
+        """ Internally used method which implements _getPackage.
+        """
+        entry = self._index.get(pkg)
+
+        if entry and self._isCurrent(entry):
+            return entry
+
+        m = self._rp.get_manifest(pkg)
+        entry = {'catkin':m.is_catkin, 'depends':[], 'pythonPath':[],
+                 'stamps':{}}
+        entry['path'] = self._stamp(entry, pkg)
+
+        if not m.is_catkin:
+            entry['depends'] = self._getDepends(pkg)
+
+            for p in entry['depends'] + [pkg]:
+                d = self._stamp(entry, p)
+                self._appendPackagePaths(self._rp.get_manifest(p),
+                                         entry['pythonPath'], d)
+
+        self._index[pkg] = entry
+        self._dirty.add(pkg)
+        return entry
+
     def _appendPackagePaths(self, manifest, paths, pkgDir):
         """ roslib.launcher
 
@@ -156,29 +387,12 @@ class Loader(object):
         if pkg in self._packages:
             return []
 
-        # short-circuit if this is a catkin-ized package
-        m = self._rp.get_manifest(pkg)
-
-        if m.is_catkin:
-            self._packages.add(pkg)
-            return []
-
-        packages = self._getDepends(pkg)
-        packages.append(pkg)
+        entry = self._getPackage(pkg)
 
-        paths = []
-
-        try:
-            for p in packages:
-                m = self._rp.get_manifest(p)
-                d = self._rp.get_path(p)
-                self._appendPackagePaths(m, paths, d)
-                self._packages.add(p)
-        except:
-            self._packages.discard(pkg)
-            raise
-
-        return paths
+        # the index stores no paths for catkin-ized packages
+        self._packages.update(str(p) for p in entry['depends'])
+        self._packages.add(pkg)
+        return [str(p) for p in entry['pythonPath']]
 
     def _loadManifest(self, pkg):
         """ roslib.launcher
@@ -235,10 +449,77 @@ class Loader(object):
                 raise ResourceNotFound('Can not import {0}.{1} of ROS package '
                                        '{2}: There is a module candidate for '
                                        'whose directory I have insufficient '
-                                       'permissions.')
+                                       'permissions.'.format(clsType, cls,
+                                                             pkg))
 
             raise ResourceNotFound('Can not import {0}.{1} of ROS package '
-                                   '{2}: {1}'.format(clsType, cls, pkg, e))
+                                   '{2}: {3}'.format(clsType, cls, pkg, e))
+
+    def _getModule(self, key):
+        """ Internally used method to get a module from the cache or to load
+            it into the cache.
+        """
+        try:
+            return self._moduleCache[key]
+        except KeyError:
+            pass
+
+        with self._lock:
+            # The module might have been loaded while waiting for the lock
+            try:
+                return self._moduleCache[key]
+            except KeyError:
+                pass
+
+            start = time.time()
+            module = self._loadModule(*key)
+            self._loadTimes[key] = time.time() - start
+            self._moduleCache[key] = module
+            return module
+
+    def preload(self, msgs=(), srvs=()):
+        """ Load message and service classes into the cache such that later
+            lookups do not have to import the modules. As the method blocks
+            until all classes are loaded, it can be called in a separate
+            thread.
+
+            @param msgs:    Message types of the form 'package/class'.
+            @type  msgs:    [str]
+
+            @param srvs:    Service types of the form 'package/class'.
+            @type  srvs:    [str]
+
+            @return:        Error messages of the types which could not be
+                            loaded.
+            @rtype:         { str : str }
+        """
+        failures = {}
+
+        with self._lock:
+            self._preloading += 1
+
+        try:
+            for load, types in ((self.loadMsg, msgs), (self.loadSrv, srvs)):
+                for t in types:
+                    try:
+                        pkg, cls = t.split('/')
+                    except ValueError:
+                        failures[t] = ('Type has to be of the form '
+                                       'package/class.')
+                        continue
+
+                    try:
+                        load(pkg, cls)
+                    except (ValueError, ResourceNotFound) as e:
+                        failures[t] = str(e)
+        finally:
+            with self._lock:
+                self._preloading -= 1
+
+                if not self._preloading:
+                    self._flushIndex()
+
+        return failures
 
     def loadMsg(self, pkg, cls):
         """ Get the message class matching the string pair.
@@ -271,11 +552,7 @@ class Loader(object):
 
         key = (pkg, 'msg', cls)
 
-        try:
-            module = self._moduleCache[key]
-        except KeyError:
-            module = self._loadModule(*key)
-            self._moduleCache[key] = module
+        module = self._getModule(key)
 
         try:
             return getattr(module, cls)
@@ -314,11 +591,7 @@ class Loader(object):
 
         key = (pkg, 'srv', cls)
 
-        try:
-            module = self._moduleCache[key]
-        except KeyError:
-            module = self._loadModule(*key)
-            self._moduleCache[key] = module
+        module = self._getModule(key)
 
         try:
             return getattr(module, cls)
@@ -339,7 +612,7 @@ class Loader(object):
             @raise:         rce.util.loader.ResourceNotFound
         """
         try:
-            return self._rp.get_path(pkg)
+            return str(self._getPackage(pkg)['path'])
         except rospkg.ResourceNotFound:
             raise ResourceNotFound('Can not find ROS package '
                                    '"{0}".'.format(pkg))
@@ -360,10 +633,72 @@ class Loader(object):
             @raise:         rce.util.loader.ResourceNotFound
         """
         try:
-            return roslib.packages.find_node(pkg, exe, rospack=self._rp)[0]
-        except rospkg.ResourceNotFound:
-            raise ResourceNotFound('Can not find ROS package '
-                                   '"{0}".'.format(pkg))
-        except IndexError:
+            nodes, dirs = self._nodes[pkg]
+        except KeyError:
+            nodes, dirs = self._indexNodes(pkg)
+
+        # The index is rebuilt if a searched directory has been modified,
+        # e.g. because an executable has been added, or if the executable
+        # of a hit is no longer valid
+        paths = nodes.get(exe)
+
+        if (any(_getMTime(d) != mtime for d, mtime in dirs.iteritems()) or
+                (paths and not _isExecutable(paths[0]))):
+            nodes, _ = self._indexNodes(pkg)
+            paths = nodes.get(exe)
+
+        if not paths:
             raise ResourceNotFound('Can not find executable "{0}" in '
                                    'ROS package "{1}".'.format(exe, pkg))
+
+        return paths[0]
+
+    def _indexNodes(self, pkg):
+        """ roslib.packages
+
+            Internally used method to create the index of the executables of
+            a package. The same directories as in roslib.packages.find_node
+            are searched.
+
+            @param pkg:     Name of the package.
+            @type  pkg:     str
+
+            @return:        Paths of the executables in order of precedence
+                            by name and modification times of the searched
+                            directories.
+            @rtype:         ({ str : [str] }, { str : float })
+
+            @raise:         rce.util.loader.ResourceNotFound
+        """
+        roots = []
+
+        if find_in_workspaces:
+            cache = self._rp.get_custom_cache('source_path_to_packages', {})
+            roots.extend(find_in_workspaces(search_dirs=['libexec', 'share'],
+                                            project=pkg,
+                                            first_matching_workspace_only=True,
+                                            source_path_to_packages=cache))
+
+        roots.append(self.findPkgPath(pkg))
+
+        nodes = {}
+        dirs = {}
+
+        for root in roots:
+            for path, dirnames, filenames in os.walk(root, followlinks=True):
+                dirs[path] = _getMTime(path)
+
+                for name in filenames:
+                    node = os.path.join(path, name)
+
+                    if _isExecutable(node):
+                        paths = nodes.setdefault(name, [])
+
+                        if node not in paths:
+                            paths.append(node)
+
+                # remove .svn/.git/etc
+                dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+
+        self._nodes[pkg] = (nodes, dirs)
+        return nodes, dirs